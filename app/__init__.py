@@ -54,7 +54,8 @@ def create_app(config_name='default'):
     
     db.init_app(app)
     # Force threading async mode to avoid eventlet SSL compatibility issues on some Windows/Python builds
-    socketio.init_app(app, cors_allowed_origins="*", async_mode='threading')
+    socketio.init_app(app, cors_allowed_origins="*", async_mode='threading',
+                      message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE'))
     login_manager.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
@@ -130,5 +131,9 @@ def create_app(config_name='default'):
         if not app.config.get('TESTING', False):
             scheduler.init_app(app)
     
+    if app.config.get('ML_WARMUP_ON_STARTUP'):
+        from app.services.model_registry import start_model_warm_up
+        start_model_warm_up(app)
+    
     return app
 
@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.utils.log import get_task_logger
 from app import create_app
 from app.models import db, Camera, User, Detection
 from app.services.anomaly_service import AnomalyDetectionService
@@ -6,8 +7,13 @@ from app.services.behavior_service import BehaviorLearningService
 from app.services.alert_service import AlertService
 from datetime import datetime, timedelta
 import os
+import time
+
+logger = get_task_logger(__name__)
 
 flask_app = create_app(os.getenv('FLASK_ENV', 'development'))
+# Tasks run in daemonic prefork children, which cannot start the face encoding process pool
+flask_app.config['FACE_ENCODING_POOL_SIZE'] = 0
 
 celery = Celery(
     flask_app.import_name,
@@ -150,11 +156,38 @@ def generate_daily_report(user_id):
 
 @celery.task(name='tasks.check_camera_health')
 def check_camera_health():
+    from app.services.stream_ingestion import STATE_STREAMING, get_stream_health_store
     cameras = Camera.query.filter_by(is_active=True).all()
+    health_store = get_stream_health_store()
+    stale_after = flask_app.config.get('STREAM_STALE_SECONDS', 120)
     
     inactive_cameras = []
     
     for camera in cameras:
+        # Server-pulled streams report their own health; no report means no ingestion worker here
+        health = health_store.get(camera.id) if camera.stream_url else None
+        if health:
+            last_frame_at = health.get('last_frame_at')
+            stale = last_frame_at is None or time.time() - last_frame_at > stale_after
+            if health.get('state') != STATE_STREAMING or stale:
+                alert_service.create_alert(
+                    user_id=camera.user_id,
+                    alert_type='camera_offline',
+                    title='Camera Stream Down',
+                    message=f'Camera "{camera.name}" stream is {health.get("state")}'
+                            f'{": " + health["last_error"] if health.get("last_error") else ""}',
+                    severity='medium',
+                    source=f'camera_{camera.id}'
+                )
+                inactive_cameras.append({
+                    'camera_id': camera.id,
+                    'camera_name': camera.name,
+                    'stream_state': health.get('state'),
+                    'reconnects': health.get('reconnects'),
+                    'last_seen': datetime.utcfromtimestamp(last_frame_at).isoformat() if last_frame_at else None
+                })
+            continue
+        
         last_detection = Detection.query.filter_by(camera_id=camera.id)\
             .order_by(Detection.timestamp.desc())\
             .first()
@@ -182,29 +215,141 @@ def check_camera_health():
 
 @celery.task(name='tasks.process_detection_batch')
 def process_detection_batch(camera_id, frames_data):
-    from app.services.ml_service import MLService
-    ml_service = MLService()
+    from app.services.ml_service import get_ml_service
+    from app.utils.frame_codec import decode_frame
+    from app.services.detection_roi import roi_for
+    ml_service = get_ml_service()
+    camera = Camera.query.get(camera_id)
+    backend = ml_service.detector_for(camera)
+    batch_size = max(1, flask_app.config.get('ML_BATCH_SIZE', 1))
     
-    results = []
+    frames = [decode_frame(frame_data) for frame_data in frames_data]
+    valid = [i for i, frame in enumerate(frames) if frame is not None]
     
-    for frame_data in frames_data:
-        import cv2
-        import numpy as np
-        import base64
-        
-        frame_bytes = base64.b64decode(frame_data.split(',')[1])
-        nparr = np.frombuffer(frame_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        objects = ml_service.detect_objects(frame)
+    # The ROI mask depends on the frame size, so frames are grouped by resolution
+    # (a camera may switch resolution or rotate within a batch)
+    by_shape = {}
+    for i in valid:
+        by_shape.setdefault(frames[i].shape[:2], []).append(i)
+    
+    # One forward pass per ML_BATCH_SIZE frames instead of one per frame
+    objects = {}
+    for (height, width), indices in by_shape.items():
+        roi = roi_for(camera.detection_roi if camera else None, width, height)
+        for start in range(0, len(indices), batch_size):
+            chunk = indices[start:start + batch_size]
+            detected_chunk = ml_service.detect_objects_batch([frames[i] for i in chunk], backend=backend, roi=roi)
+            for i, detected in zip(chunk, detected_chunk):
+                objects[i] = detected
+    
+    results = []
+    for i, frame in enumerate(frames):
+        if frame is None:
+            results.append({'objects': [], 'error': 'Invalid frame data'})
+            continue
         
         results.append({
-            'objects': objects,
+            'objects': objects[i],
             'timestamp': datetime.utcnow().isoformat()
         })
     
     return results
 
+@celery.task(name='tasks.enroll_person', bind=True)
+def enroll_person(self, user_id, person_name, image_paths, relation='family', is_resident=True, job_id=None):
+    from app.services.face_recognition_service import FaceRecognitionService
+    from app.utils.socketio_utils import send_enrollment_progress
+    
+    job_id = job_id or self.request.id
+    
+    def report(stage, **data):
+        self.update_state(state='PROGRESS', meta={'stage': stage, **data})
+        send_enrollment_progress(user_id, job_id, stage, data)
+    
+    try:
+        result = FaceRecognitionService.enroll_person(
+            user_id,
+            person_name,
+            image_paths,
+            relation=relation,
+            is_resident=is_resident,
+            progress_callback=report
+        )
+    except Exception as e:
+        result = {'success': False, 'message': f'Error: {str(e)}'}
+    
+    if not result['success']:
+        # Clean up files if enrollment failed
+        for path in image_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        send_enrollment_progress(user_id, job_id, 'failed', {'message': result['message']})
+    
+    result.update({'user_id': user_id, 'person_name': person_name, 'image_paths': image_paths})
+    return result
+
+@celery.task(name='tasks.sync_enrolled_person')
+def sync_enrolled_person(enroll_result, job_id=None):
+    from app.services.enrollment_pipeline import sync_person_to_firebase
+    from app.utils.socketio_utils import send_enrollment_progress
+    
+    if not enroll_result.get('success'):
+        return enroll_result
+    
+    try:
+        firebase_id = sync_person_to_firebase(enroll_result['person_id'], enroll_result.get('encoding_count', 0))
+        enroll_result['firebase_id'] = firebase_id
+        send_enrollment_progress(enroll_result['user_id'], job_id, 'firebase_synced', {
+            'person_id': enroll_result['person_id'],
+            'firebase_id': firebase_id
+        })
+    except Exception as e:
+        logger.warning(f"Firebase sync failed (non-critical): {e}")
+    
+    return enroll_result
+
+@celery.task(name='tasks.upload_enrolled_profile')
+def upload_enrolled_profile(enroll_result, job_id=None):
+    from app.services.enrollment_pipeline import upload_profile_image
+    from app.utils.socketio_utils import send_enrollment_progress
+    
+    if not enroll_result.get('success'):
+        return enroll_result
+    
+    user_id = enroll_result['user_id']
+    image_paths = enroll_result.get('image_paths') or []
+    
+    try:
+        profile_url = upload_profile_image(enroll_result['person_id'], image_paths[0] if image_paths else None)
+        enroll_result['profile_url'] = profile_url
+        send_enrollment_progress(user_id, job_id, 'profile_uploaded', {
+            'person_id': enroll_result['person_id'],
+            'profile_url': profile_url
+        })
+    except Exception as e:
+        logger.warning(f"Firebase upload failed (non-critical): {e}")
+    
+    send_enrollment_progress(user_id, job_id, 'completed', {
+        'person_id': enroll_result['person_id'],
+        'person_name': enroll_result.get('person_name'),
+        'encoding_count': enroll_result.get('encoding_count', 0)
+    })
+    return enroll_result
+
+@celery.task(name='tasks.compact_face_encodings')
+def compact_face_encodings(max_prototypes=None, dry_run=False):
+    from app.services.encoding_compaction import EncodingCompactionService
+    return EncodingCompactionService.compact_all(max_prototypes=max_prototypes, dry_run=dry_run)
+
+@celery.task(name='tasks.learn_face_sizes')
+def learn_face_sizes(days=None, min_samples=None):
+    from app.services.detection_roi import learn_face_sizes as learn_camera_face_sizes
+    days = days or flask_app.config.get('FACE_SIZE_LEARNING_DAYS', 30)
+    min_samples = min_samples or flask_app.config.get('FACE_SIZE_MIN_SAMPLES', 50)
+    
+    cameras = Camera.query.filter_by(is_active=True, face_detection_enabled=True).all()
+    return [learn_camera_face_sizes(camera.id, days=days, min_samples=min_samples) for camera in cameras]
+
 @celery.task(name='tasks.send_weekly_summary')
 def send_weekly_summary(user_id):
     summary = behavior_service.get_weekly_summary(user_id)
@@ -1,8 +1,10 @@
 from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.orm import validates
 from werkzeug.security import generate_password_hash, check_password_hash
 import pyotp
+import numpy as np
 
 db = SQLAlchemy()
 
@@ -81,12 +83,26 @@ class Camera(db.Model):
     face_detection_enabled = db.Column(db.Boolean, default=False)
     access_control_enabled = db.Column(db.Boolean, default=False)
     
+    # Object detector backend (an active MLModel row); NULL = the default active detector
+    detector_model_id = db.Column(db.Integer, db.ForeignKey('ml_models.id', ondelete='SET NULL'))
+    
+    # Region of interest: polygons of normalised [x, y] points; NULL = whole frame
+    detection_roi = db.Column(db.JSON)
+    # Face width range learned from face detections (see detection_roi.learn_face_sizes)
+    face_min_size = db.Column(db.Integer)
+    face_max_size = db.Column(db.Integer)
+    # Frame sampling overrides (see frame_sampler); NULL = FRAME_SKIP / FRAME_SKIP_ACTIVE / FRAME_IDLE_INTERVAL
+    frame_skip = db.Column(db.Integer)
+    active_frame_skip = db.Column(db.Integer)
+    idle_frame_interval = db.Column(db.Float)
+    
     last_motion = db.Column(db.DateTime)
     last_detection = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=utc_now)
     
     detections = db.relationship('Detection', backref='camera', lazy='dynamic', cascade='all, delete-orphan')
     access_logs = db.relationship('AccessLog', backref='camera', lazy='dynamic', cascade='all, delete-orphan')
+    detector_model = db.relationship('MLModel')
 
 class Detection(db.Model):
     __tablename__ = 'detections'
@@ -202,6 +218,7 @@ class FacePerson(db.Model):
     profile_image = db.Column(db.String(500))  # Path to main profile photo
     firebase_id = db.Column(db.String(100))  # Firebase Realtime DB sync ID
     face_encodings = db.relationship('FaceEncoding', backref='person', lazy='dynamic', cascade='all, delete-orphan')
+    face_prototypes = db.relationship('FacePrototype', backref='person', lazy='dynamic', cascade='all, delete-orphan')
     
     recognition_count = db.Column(db.Integer, default=0)
     last_recognized = db.Column(db.DateTime)
@@ -216,10 +233,63 @@ class FaceEncoding(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     person_id = db.Column(db.Integer, db.ForeignKey('face_persons.id'), nullable=False, index=True)
     
-    encoding = db.Column(db.JSON, nullable=False)  # Store 128-dim vector as JSON array
+    # 128-dim vector as little-endian float32 (512 bytes)
+    ENCODING_DTYPE = np.dtype('<f4')
+    
+    encoding = db.Column(db.LargeBinary(512), nullable=False)
     image_path = db.Column(db.String(500))
     
     created_at = db.Column(db.DateTime, default=utc_now)
+    
+    @validates('encoding')
+    def validate_encoding(self, key, value):
+        """Accept lists/arrays and store them in the packed binary format"""
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value)
+        return FaceEncoding.pack(value)
+    
+    @staticmethod
+    def pack(vector) -> bytes:
+        return np.asarray(vector, dtype=FaceEncoding.ENCODING_DTYPE).tobytes()
+    
+    @staticmethod
+    def unpack(blob):
+        """Zero-copy read-only float32 view over a stored encoding"""
+        return np.frombuffer(blob, dtype=FaceEncoding.ENCODING_DTYPE)
+    
+    @property
+    def vector(self):
+        return FaceEncoding.unpack(self.encoding)
+
+class FacePrototype(db.Model):
+    """
+    Representative encoding of a person (k-medoid of their FaceEncoding rows)
+    Matching uses a person's prototypes instead of every raw encoding once the
+    person has been compacted; the raw rows are kept for audit.
+    """
+    __tablename__ = 'face_prototypes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    person_id = db.Column(db.Integer, db.ForeignKey('face_persons.id'), nullable=False, index=True)
+    source_encoding_id = db.Column(db.Integer, db.ForeignKey('face_encodings.id', ondelete='SET NULL'))  # The medoid's raw row
+    
+    encoding = db.Column(db.LargeBinary(512), nullable=False)
+    weight = db.Column(db.Integer, nullable=False, default=1)  # Raw encodings this prototype represents
+    
+    created_at = db.Column(db.DateTime, default=utc_now)
+    
+    # Lets the unit of work delete prototypes before the raw rows they point at
+    source_encoding = db.relationship('FaceEncoding')
+    
+    @validates('encoding')
+    def validate_encoding(self, key, value):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value)
+        return FaceEncoding.pack(value)
+    
+    @property
+    def vector(self):
+        return FaceEncoding.unpack(self.encoding)
 
 class AccessLog(db.Model):
     """Log of access attempts (recognized/unknown persons)"""
@@ -105,6 +105,8 @@ SWAGGER_SPEC = {
             "post": {
                 "tags": ["Camera"],
                 "summary": "Process camera frame",
+                "description": "Send the raw JPEG/PNG bytes as application/octet-stream (or as a multipart 'frame' file); a JSON body with a base64 'frame' is still accepted",
+                "consumes": ["application/octet-stream", "multipart/form-data", "application/json"],
                 "security": [{"Bearer": []}],
                 "parameters": [
                     {
@@ -120,13 +122,14 @@ SWAGGER_SPEC = {
                             "type": "object",
                             "required": ["frame"],
                             "properties": {
-                                "frame": {"type": "string", "description": "Base64 encoded image"}
+                                "frame": {"type": "string", "description": "Base64 encoded image (legacy)"}
                             }
                         }
                     }
                 ],
                 "responses": {
                     "200": {"description": "Frame processed successfully"},
+                    "400": {"description": "Missing or undecodable frame"},
                     "404": {"description": "Camera not found"}
                 }
             }
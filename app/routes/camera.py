@@ -1,16 +1,24 @@
 from flask import Blueprint, render_template, request, jsonify, Response
 from flask_login import login_required, current_user
-from app.models import db, Camera, Detection
-from app.services.camera_service import CameraService
-from app.services.ml_service import MLService
+from app.models import db, Camera, Detection, MLModel
+from app.services.camera_service import get_camera_service
+from app.services.detection_roi import invalidate_camera_settings, validate_roi
+from app.services.detection_writer import detection_rows, get_detection_writer
+from app.services.ml_service import get_ml_service
+from app.services.frame_analysis import get_analysis_engine
+from app.services.frame_sampler import SAMPLING_SETTINGS, get_frame_sampler, validate_sampling_setting
+from app.services.stream_ingestion import get_stream_ingestion
+from app.services.camera_stream_manager import register_camera_socketio_handlers
+from app.utils.frame_codec import decode_frame
+from app import socketio
 from datetime import datetime
-import cv2
-import numpy as np
-import base64
 
 bp = Blueprint('camera', __name__, url_prefix='/camera')
-camera_service = CameraService()
-ml_service = MLService()
+camera_service = get_camera_service()
+ml_service = get_ml_service()
+analysis_engine = get_analysis_engine()
+
+register_camera_socketio_handlers(socketio)
 
 @bp.route('/')
 @login_required
@@ -33,12 +41,17 @@ def add_camera():
         user_id=current_user.id,
         name=name,
         location=location,
+        stream_url=(data.get('stream_url') or '').strip() or None,
         is_active=True
     )
     
     db.session.add(camera)
     db.session.commit()
     
+    ingestion = get_stream_ingestion()
+    if ingestion is not None:
+        ingestion.refresh_camera(camera)
+    
     return jsonify({
         'success': True,
         'camera': {
@@ -63,6 +76,8 @@ def update_camera(camera_id):
         camera.name = data['name']
     if 'location' in data:
         camera.location = data['location']
+    if 'stream_url' in data:
+        camera.stream_url = (data['stream_url'] or '').strip() or None
     if 'is_active' in data:
         camera.is_active = data['is_active']
     if 'motion_enabled' in data:
@@ -71,8 +86,29 @@ def update_camera(camera_id):
         camera.object_detection_enabled = data['object_detection_enabled']
     if 'face_detection_enabled' in data:
         camera.face_detection_enabled = data['face_detection_enabled']
+    if 'detector_model_id' in data:
+        model_id = data['detector_model_id']
+        if model_id is not None and model_id not in [model.id for model in ml_service.detector_models()]:
+            return jsonify({'success': False, 'error': 'Unknown or inactive detector model'}), 400
+        camera.detector_model_id = model_id
+    if 'detection_roi' in data:
+        try:
+            camera.detection_roi = validate_roi(data['detection_roi'])
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    for setting in SAMPLING_SETTINGS:
+        if setting in data:
+            try:
+                setattr(camera, setting, validate_sampling_setting(setting, data[setting]))
+            except (TypeError, ValueError) as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
     
     db.session.commit()
+    invalidate_camera_settings(camera_id)
+    
+    ingestion = get_stream_ingestion()
+    if ingestion is not None:
+        ingestion.refresh_camera(camera)
     
     return jsonify({'success': True})
 
@@ -87,8 +123,36 @@ def delete_camera(camera_id):
     db.session.delete(camera)
     db.session.commit()
     
+    camera_service.clear_camera_data(camera_id)
+    analysis_engine.clear_camera(camera_id)
+    get_frame_sampler().clear_camera(camera_id)
+    invalidate_camera_settings(camera_id)
+    ingestion = get_stream_ingestion()
+    if ingestion is not None:
+        ingestion.stop_camera(camera_id)
+    
     return jsonify({'success': True})
 
+@bp.route('/detectors')
+@login_required
+def list_detectors():
+    latency = ml_service.detector_stats()
+    
+    detectors = []
+    for model in ml_service.detector_models():
+        metadata = model.model_metadata or {}
+        detectors.append({
+            'id': model.id,
+            'name': model.name,
+            'model_type': model.model_type,
+            'version': model.version,
+            'input_size': metadata.get('input_size', 416),
+            'accuracy': model.accuracy,
+            'latency': latency.get(model.name)
+        })
+    
+    return jsonify({'success': True, 'detectors': detectors})
+
 @bp.route('/<int:camera_id>/process-frame', methods=['POST'])
 @login_required
 def process_frame(camera_id):
@@ -97,66 +161,35 @@ def process_frame(camera_id):
     if not camera:
         return jsonify({'success': False, 'error': 'Camera not found'}), 404
     
-    data = request.get_json()
-    frame_data = data.get('frame')
+    # Raw JPEG/PNG bytes (octet-stream or multipart 'frame' file), or a base64 'frame' in JSON
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('frame')
+        frame_data = upload.read() if upload else request.form.get('frame')
+    elif request.is_json:
+        frame_data = (request.get_json(silent=True) or {}).get('frame')
+    else:
+        frame_data = request.get_data()
     
     if not frame_data:
         return jsonify({'success': False, 'error': 'No frame data'}), 400
     
+    # Frames the sampler passes over are acknowledged without being decoded
+    sampler = get_frame_sampler()
+    if not sampler.should_analyze(camera_id):
+        return jsonify({'success': True, 'skipped': True, 'mode': sampler.stats(camera_id)['mode']})
+    
     try:
-        frame_bytes = base64.b64decode(frame_data.split(',')[1])
-        nparr = np.frombuffer(frame_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        results = {
-            'motion': False,
-            'objects': [],
-            'faces': [],
-            'timestamp': datetime.utcnow().isoformat()
-        }
-        
-        if camera.motion_enabled:
-            motion_detected = camera_service.detect_motion(camera_id, frame)
-            results['motion'] = motion_detected
-            
-            if motion_detected:
-                camera.last_motion = datetime.utcnow()
-        
-        if camera.object_detection_enabled:
-            objects = ml_service.detect_objects(frame)
-            results['objects'] = objects
-            
-            for obj in objects:
-                detection = Detection(
-                    camera_id=camera_id,
-                    detection_type='object',
-                    object_class=obj['class'],
-                    confidence=obj['confidence'],
-                    bbox_x=obj['bbox'][0],
-                    bbox_y=obj['bbox'][1],
-                    bbox_width=obj['bbox'][2],
-                    bbox_height=obj['bbox'][3]
-                )
-                db.session.add(detection)
+        frame = decode_frame(frame_data)
+        if frame is None:
+            return jsonify({'success': False, 'error': 'Invalid frame data'}), 400
         
-        if camera.face_detection_enabled:
-            faces = ml_service.detect_faces(frame)
-            results['faces'] = faces
-            
-            for face in faces:
-                detection = Detection(
-                    camera_id=camera_id,
-                    detection_type='face',
-                    confidence=face['confidence'],
-                    bbox_x=face['bbox'][0],
-                    bbox_y=face['bbox'][1],
-                    bbox_width=face['bbox'][2],
-                    bbox_height=face['bbox'][3]
-                )
-                db.session.add(detection)
+        results = analysis_engine.analyze(camera, frame)
+        sampler.report(camera_id, motion=results['motion'], tracking=bool(results['faces']))
         
-        camera.last_detection = datetime.utcnow()
-        db.session.commit()
+        # Rows and camera timestamps are bulk-written by the detection writer
+        now = datetime.utcnow()
+        get_detection_writer().add(camera_id, detection_rows(camera_id, results, now),
+                                   motion=results['motion'], timestamp=now)
         
         return jsonify({
             'success': True,
@@ -218,6 +251,10 @@ def get_stats(camera_id):
             'object_detections': object_detections,
             'face_detections': face_detections,
             'last_motion': camera.last_motion.isoformat() if camera.last_motion else None,
-            'last_detection': camera.last_detection.isoformat() if camera.last_detection else None
+            'last_detection': camera.last_detection.isoformat() if camera.last_detection else None,
+            'analysis': analysis_engine.stats(camera_id),
+            'detector': camera.detector_model.name if camera.detector_model else None,
+            'detection_writer': get_detection_writer().stats(),
+            'sampling': get_frame_sampler().stats(camera_id)
         }
     })
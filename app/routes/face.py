@@ -3,7 +3,7 @@ Face Recognition & Access Control Routes
 Integrated with Firebase, Notifications, and Door Control services
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 import os
@@ -11,9 +11,12 @@ from datetime import datetime, timezone
 from PIL import Image
 import io
 import logging
+import face_recognition
 
 from app.models import Camera, FacePerson, FaceEncoding, AccessLog, db
+from app.services.door_control_service import door_face_index
 from app.services.face_recognition_service import FaceRecognitionService
+from app.services.enrollment_pipeline import enqueue_enrollment, sync_person_to_firebase, upload_profile_image
 
 bp = Blueprint('face', __name__, url_prefix='/face')
 logger = logging.getLogger(__name__)
@@ -44,6 +47,10 @@ def enroll_person():
     - relation: str (optional: 'family', 'guest', 'staff')
     - is_resident: bool (optional, default: true)
     - images: file[] (multiple image files)
+    
+    With FACE_ENROLLMENT_ASYNC the images are encoded by a Celery job and the
+    response is 202 with a job_id; progress arrives as 'enrollment_progress'
+    events on the /alerts Socket.IO namespace.
     """
     try:
         person_name = request.form.get('person_name')
@@ -72,6 +79,20 @@ def enroll_person():
         if not saved_paths:
             return jsonify({'success': False, 'message': 'No valid images provided'}), 400
         
+        # Queue the enrollment pipeline; progress is pushed over Socket.IO
+        if current_app.config.get('FACE_ENROLLMENT_ASYNC'):
+            try:
+                job_id = enqueue_enrollment(
+                    current_user.id,
+                    person_name,
+                    saved_paths,
+                    relation=relation,
+                    is_resident=is_resident
+                )
+                return jsonify({'success': True, 'job_id': job_id, 'status': 'queued'}), 202
+            except Exception as e:
+                logger.warning(f"Enrollment queue unavailable, enrolling inline: {e}")
+        
         # Enroll person
         result = FaceRecognitionService.enroll_person(
             current_user.id,
@@ -84,33 +105,8 @@ def enroll_person():
         if result['success']:
             # Sync to Firebase
             try:
-                from app.services.firebase_service import FirebaseService
-                firebase_service = FirebaseService()
-                
-                person = FacePerson.query.get(result['person_id'])
-                if person and firebase_service.is_enabled:
-                    firebase_id = firebase_service.sync_person({
-                        'id': str(person.id),
-                        'name': person.name,
-                        'relation': person.relation,
-                        'is_resident': person.is_resident,
-                        'enrolled_date': int(person.created_at.timestamp() * 1000),
-                        'encoding_count': result.get('encoding_count', 0)
-                    })
-                    
-                    # Update person with Firebase ID
-                    if firebase_id:
-                        person.firebase_id = firebase_id
-                        db.session.commit()
-                    
-                    # Upload profile image to Firebase Storage
-                    if saved_paths:
-                        firebase_url = firebase_service.upload_image(
-                            saved_paths[0],
-                            f'faces/{person.id}/profile.jpg'
-                        )
-                        logger.info(f"Profile image uploaded to Firebase: {firebase_url}")
-                        
+                sync_person_to_firebase(result['person_id'], result.get('encoding_count', 0))
+                upload_profile_image(result['person_id'], saved_paths[0])
             except Exception as e:
                 logger.warning(f"Firebase sync failed (non-critical): {e}")
             
@@ -164,12 +160,16 @@ def delete_enrolled_person(person_id):
 @login_required
 def recognize():
     """
-    Recognize a face from uploaded image or camera frame
+    Recognize every face in an uploaded image or camera frame
     POST /face/recognize
     
     - camera_id: int (required)
     - image: file (image file) OR
     - image_data: str (base64 image)
+    
+    Returns one entry per detected face in 'faces' (up to MAX_FACES_PER_FRAME).
+    The door is controlled once per request, for the best recognised face;
+    the top-level recognition fields mirror that face.
     """
     try:
         camera_id = request.form.get('camera_id') or (request.json or {}).get('camera_id')
@@ -209,24 +209,30 @@ def recognize():
         else:
             return jsonify({'success': False, 'message': 'No image provided'}), 400
         
-        # Extract face encoding
-        encodings_data = FaceRecognitionService.encode_image_file(image_path)
-        
-        if not encodings_data:
+        # Locate and recognize every face in the frame (up to MAX_FACES_PER_FRAME);
+        # exact repeats of a face seen moments ago on this camera come from the recognition
+        # cache (near matches are not reused: the result drives the door)
+        try:
+            frame_faces = FaceRecognitionService.recognize_frame(
+                camera_id,
+                face_recognition.load_image_file(image_path),
+                timeout=current_app.config.get('FACE_ENCODING_TIMEOUT'),
+                access_control=True
+            )
+        except TimeoutError:
+            return jsonify({'success': False, 'message': 'Face encoding timed out'}), 503
+        
+        if not frame_faces:
             return jsonify({
                 'success': False,
                 'message': 'No face detected in image'
             }), 400
         
-        # Use first face detected
-        test_encoding = encodings_data[0]['encoding']
-        
-        # Recognize face
-        recognition_result = FaceRecognitionService.recognize_face(camera_id, test_encoding)
+        recognition_results = [face['recognition'] for face in frame_faces]
         
         # ── Firebase Integration ──────────────────────────────
         firebase_image_url = None
-        firebase_entry_id = None
+        firebase_service = None
         
         try:
             from app.services.firebase_service import FirebaseService
@@ -241,92 +247,131 @@ def recognize():
         except Exception as e:
             logger.warning(f"Firebase image upload failed: {e}")
         
-        # ── Door Control Decision ─────────────────────────────
-        door_result = {'action': 'alert_sent', 'access_granted': False}
+        # ── Door Control Decision (one per request) ───────────
+        door_index = door_face_index(recognition_results)
+        door_results = [
+            {'action': 'alert_sent', 'access_granted': False,
+             'message': 'Door decision made for another face in this frame'}
+            for _ in recognition_results
+        ]
+        door_results[door_index] = {'action': 'alert_sent', 'access_granted': False}
         
         try:
             from app.services.door_control_service import DoorControlService
             door_service = DoorControlService()
-            door_result = door_service.process_recognition(recognition_result, camera_id, image_path)
+            door_results[door_index] = door_service.process_recognition(
+                recognition_results[door_index], camera_id, image_path
+            )
         except Exception as e:
             logger.warning(f"Door control not available: {e}")
         
-        # ── Log Entry ─────────────────────────────────────────
-        access_log = AccessLog(
-            camera_id=camera_id,
-            person_id=recognition_result.get('person_id'),
-            person_name=recognition_result.get('person_name', 'Unknown'),
-            is_known=recognition_result.get('is_known', False),
-            confidence=recognition_result.get('confidence', 0.0),
-            image_path=image_path,
-            firebase_image_url=firebase_image_url,
-            access_granted=door_result.get('access_granted', False),
-            action=door_result.get('action', 'alert_sent')
-        )
-        db.session.add(access_log)
+        # ── Log Entries (single bulk insert) ──────────────────
+        access_logs = [
+            AccessLog(
+                camera_id=camera_id,
+                person_id=recognition_result.get('person_id'),
+                person_name=recognition_result.get('person_name', 'Unknown'),
+                is_known=recognition_result.get('is_known', False),
+                confidence=recognition_result.get('confidence', 0.0),
+                image_path=image_path,
+                firebase_image_url=firebase_image_url,
+                access_granted=door_result.get('access_granted', False),
+                action=door_result.get('action', 'alert_sent')
+            )
+            for recognition_result, door_result in zip(recognition_results, door_results)
+        ]
+        db.session.add_all(access_logs)
         db.session.flush()
         
         # Log to Firebase
+        firebase_entry_ids = [None] * len(access_logs)
         try:
             if firebase_service and firebase_service.is_enabled:
-                entry_data = {
-                    'person_id': str(recognition_result.get('person_id', '')),
-                    'person_name': recognition_result.get('person_name', 'Unknown'),
-                    'camera_id': str(camera_id),
-                    'is_known': recognition_result.get('is_known', False),
-                    'confidence': recognition_result.get('confidence', 0.0),
-                    'action': door_result.get('action', 'alert_sent'),
-                    'timestamp': int(datetime.now(timezone.utc).timestamp() * 1000),
-                    'image_url': firebase_image_url
-                }
-                firebase_entry_id = firebase_service.log_entry(entry_data)
-                
-                if firebase_entry_id:
-                    access_log.firebase_id = firebase_entry_id
+                for i, (recognition_result, door_result) in enumerate(zip(recognition_results, door_results)):
+                    entry_data = {
+                        'person_id': str(recognition_result.get('person_id', '')),
+                        'person_name': recognition_result.get('person_name', 'Unknown'),
+                        'camera_id': str(camera_id),
+                        'is_known': recognition_result.get('is_known', False),
+                        'confidence': recognition_result.get('confidence', 0.0),
+                        'action': door_result.get('action', 'alert_sent'),
+                        'timestamp': int(datetime.now(timezone.utc).timestamp() * 1000),
+                        'image_url': firebase_image_url
+                    }
+                    firebase_entry_ids[i] = firebase_service.log_entry(entry_data)
+                    
+                    if firebase_entry_ids[i]:
+                        access_logs[i].firebase_id = firebase_entry_ids[i]
         except Exception as e:
             logger.warning(f"Firebase entry log failed: {e}")
         
         db.session.commit()
         
-        # ── Send Notification ─────────────────────────────────
+        # ── Send Notifications ────────────────────────────────
         try:
-            is_known = recognition_result.get('is_known', False)
-            is_resident = recognition_result.get('is_resident', False)
-            
-            # Notify if unknown person or non-resident
-            if not is_known or (is_known and not is_resident):
-                from app.services.notification_service import NotificationService
-                notif_service = NotificationService()
-                notif_service.send_entry_alert({
-                    'person_name': recognition_result.get('person_name', 'Unknown'),
-                    'camera_id': camera.name,
-                    'is_known': is_known,
-                    'confidence': recognition_result.get('confidence', 0.0),
-                    'image_url': firebase_image_url,
-                    'entry_id': firebase_entry_id or str(access_log.id),
-                    'timestamp': int(datetime.now(timezone.utc).timestamp() * 1000)
-                })
+            notif_service = None
+            for recognition_result, access_log, firebase_entry_id in zip(
+                recognition_results, access_logs, firebase_entry_ids
+            ):
+                is_known = recognition_result.get('is_known', False)
+                is_resident = recognition_result.get('is_resident', False)
+                
+                # Notify if unknown person or non-resident
+                if not is_known or (is_known and not is_resident):
+                    if notif_service is None:
+                        from app.services.notification_service import NotificationService
+                        notif_service = NotificationService()
+                    notif_service.send_entry_alert({
+                        'person_name': recognition_result.get('person_name', 'Unknown'),
+                        'camera_id': camera.name,
+                        'is_known': is_known,
+                        'confidence': recognition_result.get('confidence', 0.0),
+                        'image_url': firebase_image_url,
+                        'entry_id': firebase_entry_id or str(access_log.id),
+                        'timestamp': int(datetime.now(timezone.utc).timestamp() * 1000)
+                    })
         except Exception as e:
             logger.warning(f"Notification failed: {e}")
         
-        # Update person's recognition stats
-        if recognition_result.get('is_known') and recognition_result.get('person_id'):
+        # Update persons' recognition stats
+        recognized_ids = [
+            r['person_id'] for r in recognition_results
+            if r.get('is_known') and r.get('person_id')
+        ]
+        if recognized_ids:
             try:
-                person = FacePerson.query.get(recognition_result['person_id'])
-                if person:
-                    person.recognition_count = (person.recognition_count or 0) + 1
-                    person.last_recognized = datetime.now(timezone.utc)
-                    db.session.commit()
+                now = datetime.now(timezone.utc)
+                for person in FacePerson.query.filter(FacePerson.id.in_(recognized_ids)).all():
+                    person.recognition_count = (person.recognition_count or 0) + recognized_ids.count(person.id)
+                    person.last_recognized = now
+                db.session.commit()
             except Exception as e:
                 logger.warning(f"Failed to update recognition stats: {e}")
         
+        faces = [
+            {
+                'recognition': recognition_result,
+                'door_action': door_result,
+                'entry_id': access_log.id,
+                'firebase_entry_id': firebase_entry_id,
+                'location': frame_face['location'],
+                'cached': frame_face['cached']
+            }
+            for recognition_result, door_result, access_log, firebase_entry_id, frame_face in zip(
+                recognition_results, door_results, access_logs, firebase_entry_ids, frame_faces
+            )
+        ]
+        
+        # Top-level fields describe the face the door decision was made for
         return jsonify({
             'success': True,
-            'recognition': recognition_result,
-            'door_action': door_result,
-            'entry_id': access_log.id,
-            'firebase_entry_id': firebase_entry_id,
-            'image_url': firebase_image_url or image_path
+            'recognition': faces[door_index]['recognition'],
+            'door_action': faces[door_index]['door_action'],
+            'entry_id': faces[door_index]['entry_id'],
+            'firebase_entry_id': faces[door_index]['firebase_entry_id'],
+            'image_url': firebase_image_url or image_path,
+            'face_count': len(faces),
+            'faces': faces
         }), 200
     
     except Exception as e:
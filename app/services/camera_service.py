@@ -1,68 +1,48 @@
+import threading
 import cv2
-import numpy as np
-from collections import defaultdict
+from flask import current_app, has_app_context
+from app.services.motion_engine import MotionEngine
 
 class CameraService:
     
-    def __init__(self):
-        self.previous_frames = {}
-        self.motion_threshold = 25
-        self.min_area = 500
+    def __init__(self, motion_engine=None):
+        self._motion_engine = motion_engine
+        self._lock = threading.Lock()
     
-    def detect_motion(self, camera_id, frame):
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (21, 21), 0)
-        
-        if camera_id not in self.previous_frames:
-            self.previous_frames[camera_id] = gray
-            return False
-        
-        frame_delta = cv2.absdiff(self.previous_frames[camera_id], gray)
-        thresh = cv2.threshold(frame_delta, self.motion_threshold, 255, cv2.THRESH_BINARY)[1]
-        
-        thresh = cv2.dilate(thresh, None, iterations=2)
-        contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        motion_detected = False
-        for contour in contours:
-            if cv2.contourArea(contour) > self.min_area:
-                motion_detected = True
-                break
-        
-        self.previous_frames[camera_id] = gray
-        
-        return motion_detected
+    @property
+    def motion_engine(self) -> MotionEngine:
+        # Built on first use so the MOTION_* settings come from the app serving the frame
+        with self._lock:
+            if self._motion_engine is None:
+                self._motion_engine = MotionEngine.from_config(current_app.config if has_app_context() else {})
+            return self._motion_engine
     
-    def get_motion_regions(self, camera_id, frame):
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (21, 21), 0)
-        
-        if camera_id not in self.previous_frames:
-            self.previous_frames[camera_id] = gray
-            return []
-        
-        frame_delta = cv2.absdiff(self.previous_frames[camera_id], gray)
-        thresh = cv2.threshold(frame_delta, self.motion_threshold, 255, cv2.THRESH_BINARY)[1]
-        thresh = cv2.dilate(thresh, None, iterations=2)
-        
-        contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        regions = []
-        for contour in contours:
-            if cv2.contourArea(contour) > self.min_area:
-                (x, y, w, h) = cv2.boundingRect(contour)
-                regions.append({
-                    'x': int(x),
-                    'y': int(y),
-                    'width': int(w),
-                    'height': int(h),
-                    'area': int(cv2.contourArea(contour))
-                })
-        
-        self.previous_frames[camera_id] = gray
-        
-        return regions
+    def _motion(self, camera_id, frame, gray=None):
+        # detect_motion and get_motion_regions on the same frame share one analysis
+        if gray is None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return self.motion_engine.analyze(camera_id, gray, source=frame)
+    
+    def detect_motion(self, camera_id, frame, gray=None):
+        return self._motion(camera_id, frame, gray).motion
+    
+    def get_motion_regions(self, camera_id, frame, gray=None):
+        return [dict(region) for region in self._motion(camera_id, frame, gray).regions]
     
     def clear_camera_data(self, camera_id):
-        if camera_id in self.previous_frames:
-            del self.previous_frames[camera_id]
+        self.motion_engine.clear(camera_id)
+    
+    def state_stats(self) -> dict:
+        return self.motion_engine.stats()
+
+
+_camera_service = None
+_camera_service_lock = threading.Lock()
+
+def get_camera_service() -> CameraService:
+    """Process-wide CameraService, so every route and stream shares (and evicts) one set of motion state"""
+    global _camera_service
+    with _camera_service_lock:
+        if _camera_service is None:
+            _camera_service = CameraService()
+        return _camera_service
@@ -0,0 +1,178 @@
+"""
+Camera State Store
+Bounded per-camera state (motion background models and their buffers)
+
+Mobile cameras come and go, so per-camera state cannot live in a plain dict
+keyed by camera id: it is kept in least-recently-used order and dropped when
+a camera has been idle for CAMERA_STATE_TTL seconds, when the total memory of
+all entries exceeds CAMERA_STATE_MEMORY_BUDGET_MB (least recently used
+first), or when CameraStreamManager unregisters the camera's stream. Idle
+entries are also swept every CAMERA_STATE_SWEEP_INTERVAL seconds by the
+AutomationScheduler, so state of cameras that all went quiet is released
+even though no further get or put arrives to expire it.
+
+Entries report their own size through a memory_bytes() method; the size of
+each camera's state is exported as safehome_camera_state_bytes.
+"""
+
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from app.services.metrics import update_camera_state_memory, remove_camera_state_memory
+
+# Every live store of this process, for sweep_camera_states
+_stores = weakref.WeakSet()
+
+
+class CameraStateStore:
+    """LRU / TTL / memory-budget bounded {camera_id: state} map"""
+
+    def __init__(self, ttl: float = 600.0, memory_budget: int = 64 * 1024 * 1024, name: str = 'camera'):
+        """ttl and memory_budget of 0 disable that bound"""
+        self.ttl = ttl
+        self.memory_budget = memory_budget
+        self.name = name
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._last_used = {}
+        self._evictions = {'ttl': 0, 'memory': 0, 'removed': 0}
+        self._lock = threading.Lock()
+        _stores.add(self)
+
+    @classmethod
+    def from_config(cls, config, name: str = 'camera') -> 'CameraStateStore':
+        return cls(
+            ttl=config.get('CAMERA_STATE_TTL', 600),
+            memory_budget=int(config.get('CAMERA_STATE_MEMORY_BUDGET_MB', 64) * 1024 * 1024),
+            name=name
+        )
+
+    def get(self, camera_id, default=None):
+        """A camera's state, marking it most recently used"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            state = self._entries.get(camera_id)
+            if state is None:
+                return default
+            self._entries.move_to_end(camera_id)
+            self._last_used[camera_id] = now
+            return state
+
+    def put(self, camera_id, state):
+        """Store a camera's state, evicting idle and least recently used cameras to stay within budget"""
+        now = time.monotonic()
+        size = self._size_of(state)
+        with self._lock:
+            self._entries[camera_id] = state
+            self._entries.move_to_end(camera_id)
+            self._sizes[camera_id] = size
+            self._last_used[camera_id] = now
+            self._expire(now)
+            evicted = self._enforce_budget(keep=camera_id)
+        update_camera_state_memory(self.name, camera_id, size)
+        for evicted_id in evicted:
+            remove_camera_state_memory(self.name, evicted_id)
+        return state
+
+    def resize(self, camera_id):
+        """Re-measure a camera's state after it grew or shrank"""
+        with self._lock:
+            state = self._entries.get(camera_id)
+            if state is None:
+                return
+            size = self._sizes[camera_id] = self._size_of(state)
+            evicted = self._enforce_budget(keep=camera_id)
+        update_camera_state_memory(self.name, camera_id, size)
+        for evicted_id in evicted:
+            remove_camera_state_memory(self.name, evicted_id)
+
+    def pop(self, camera_id, default=None):
+        with self._lock:
+            state = self._remove(camera_id, 'removed')
+        if state is None:
+            return default
+        remove_camera_state_memory(self.name, camera_id)
+        return state
+
+    def sweep(self) -> list:
+        """Drop every camera idle for longer than the TTL; returns their ids"""
+        with self._lock:
+            return self._expire(time.monotonic())
+
+    def _expire(self, now: float) -> list:
+        # Entries are in last-used order, so the idle ones are at the front
+        expired = []
+        if not self.ttl:
+            return expired
+        while self._entries:
+            camera_id = next(iter(self._entries))
+            if now - self._last_used[camera_id] <= self.ttl:
+                break
+            self._remove(camera_id, 'ttl')
+            expired.append(camera_id)
+        for camera_id in expired:
+            remove_camera_state_memory(self.name, camera_id)
+        return expired
+
+    def _enforce_budget(self, keep=None) -> list:
+        evicted = []
+        if not self.memory_budget:
+            return evicted
+        total = sum(self._sizes.values())
+        for camera_id in list(self._entries):
+            if total <= self.memory_budget:
+                break
+            if camera_id == keep:
+                continue
+            total -= self._sizes[camera_id]
+            self._remove(camera_id, 'memory')
+            evicted.append(camera_id)
+        return evicted
+
+    def _remove(self, camera_id, reason: str):
+        state = self._entries.pop(camera_id, None)
+        if state is not None:
+            self._sizes.pop(camera_id, None)
+            self._last_used.pop(camera_id, None)
+            self._evictions[reason] += 1
+        return state
+
+    @staticmethod
+    def _size_of(state) -> int:
+        memory_bytes = getattr(state, 'memory_bytes', None)
+        return int(memory_bytes()) if memory_bytes else 0
+
+    def __contains__(self, camera_id) -> bool:
+        with self._lock:
+            return camera_id in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._entries)
+
+    def memory_bytes(self, camera_id=None) -> int:
+        with self._lock:
+            if camera_id is not None:
+                return self._sizes.get(camera_id, 0)
+            return sum(self._sizes.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'cameras': len(self._entries),
+                'memory_bytes': sum(self._sizes.values()),
+                'memory_budget': self.memory_budget,
+                'ttl': self.ttl,
+                'evictions': dict(self._evictions)
+            }
+
+
+def sweep_camera_states() -> int:
+    """Sweep every CameraStateStore of this process; returns how many cameras were dropped"""
+    return sum(len(store.sweep()) for store in list(_stores))
@@ -3,13 +3,16 @@ Mobile & Multi-Camera Integration Service
 Handles WebRTC signaling, multiple camera streams, and real-time frame processing
 """
 
+from flask import request, current_app
+from flask_login import current_user
 from flask_socketio import emit, join_room, leave_room
-import base64
-import io
-from PIL import Image
+import time
+import cv2
 import json
 from datetime import datetime, timezone
-from app.models import Camera, db
+from app.models import Camera, AccessLog, FacePerson, db
+from app.services.face_tracker import FaceTracker
+from app.utils.frame_codec import decode_frame
 
 class CameraStreamManager:
     """Manages camera streams and WebRTC connections"""
@@ -20,20 +23,31 @@ class CameraStreamManager:
     # Store WebRTC peer connections: {camera_id: {peer_data}}
     peer_connections = {}
     
+    # Face trackers for streams with face recognition: {camera_id: FaceTracker}
+    face_trackers = {}
+    
     @staticmethod
-    def register_camera_stream(camera_id: int, user_id: int, stream_type: str = 'mobile'):
+    def register_camera_stream(camera_id: int, user_id: int, stream_type: str = 'mobile',
+                               track_faces: bool = False, detect_motion: bool = False, sid: str = None):
         """
         Register a camera stream (mobile or remote)
         stream_type: 'mobile', 'rtsp', 'http', 'mjpeg'
+        track_faces: recognise faces in this stream's frames (once per visit)
+        detect_motion: run motion detection on analysed frames (raises the sampling rate)
+        sid: Socket.IO client that publishes the stream; only its frames are accepted
         """
         CameraStreamManager.active_streams[camera_id] = {
             'user_id': user_id,
+            'sid': sid,
             'type': stream_type,
             'connected_clients': set(),
             'registered_at': datetime.now(timezone.utc).isoformat(),
             'frame_count': 0,
-            'last_frame': None
+            'last_frame': None,
+            'track_faces': track_faces,
+            'detect_motion': detect_motion
         }
+        CameraStreamManager.face_trackers.pop(camera_id, None)
         return True
     
     @staticmethod
@@ -43,8 +57,26 @@ class CameraStreamManager:
             del CameraStreamManager.active_streams[camera_id]
         if camera_id in CameraStreamManager.peer_connections:
             del CameraStreamManager.peer_connections[camera_id]
+        CameraStreamManager.face_trackers.pop(camera_id, None)
+        from app.services.frame_ingestion import get_frame_ingestion
+        from app.services.camera_service import get_camera_service
+        from app.services.frame_analysis import get_analysis_engine
+        from app.services.frame_relay import get_frame_relay
+        from app.services.frame_sampler import get_frame_sampler
+        get_frame_ingestion().discard(camera_id)
+        get_frame_sampler().clear_camera(camera_id)
+        get_frame_relay().clear_camera(camera_id)
+        # Motion background and gating state of an ephemeral camera go with its stream
+        get_camera_service().clear_camera_data(camera_id)
+        get_analysis_engine().clear_camera(camera_id)
         return True
     
+    @staticmethod
+    def is_stream_publisher(camera_id, sid) -> bool:
+        """Whether sid is the client that registered the camera's stream"""
+        stream = CameraStreamManager.active_streams.get(camera_id)
+        return stream is not None and stream.get('sid') is not None and stream['sid'] == sid
+    
     @staticmethod
     def add_stream_client(camera_id: int, client_id: str):
         """Add a client viewing this stream"""
@@ -60,31 +92,38 @@ class CameraStreamManager:
     @staticmethod
     def get_active_streams(user_id: int = None) -> list:
         """Get list of active streams, optionally filtered by user"""
+        from app.services.frame_ingestion import get_frame_ingestion
+        from app.services.frame_relay import get_frame_relay
+        from app.services.frame_sampler import get_frame_sampler
         streams = []
         for camera_id, stream_info in CameraStreamManager.active_streams.items():
             if user_id is None or stream_info['user_id'] == user_id:
-                streams.append({
+                stream = {
                     'camera_id': camera_id,
                     'type': stream_info['type'],
                     'connected_clients': len(stream_info['connected_clients']),
                     'registered_at': stream_info['registered_at'],
                     'frame_count': stream_info['frame_count']
-                })
+                }
+                tracker = CameraStreamManager.face_trackers.get(camera_id)
+                if tracker:
+                    stream['face_tracking'] = tracker.stats()
+                stream['ingestion'] = get_frame_ingestion().stats(camera_id)
+                stream['sampling'] = get_frame_sampler().stats(camera_id)
+                stream['relay'] = get_frame_relay().stats(camera_id)
+                streams.append(stream)
         return streams
     
     @staticmethod
-    def process_frame(camera_id: int, frame_data: str) -> dict:
+    def process_frame(camera_id: int, frame_data) -> dict:
         """
         Process camera frame for recognition
-        frame_data: base64 encoded image
+        frame_data: encoded image bytes (binary transport) or base64 / data:image string
         """
         try:
-            # Decode base64 frame
-            if frame_data.startswith('data:image'):
-                frame_data = frame_data.split(',')[1]
-            
-            image_bytes = base64.b64decode(frame_data)
-            image = Image.open(io.BytesIO(image_bytes))
+            frame = decode_frame(frame_data)
+            if frame is None:
+                return {'success': False, 'error': 'Frame processing error: invalid image data'}
             
             # Update frame count
             if camera_id in CameraStreamManager.active_streams:
@@ -93,8 +132,8 @@ class CameraStreamManager:
             
             return {
                 'success': True,
-                'image': image,
-                'size': image.size
+                'frame': frame,
+                'size': (frame.shape[1], frame.shape[0])
             }
         except Exception as e:
             return {
@@ -102,6 +141,138 @@ class CameraStreamManager:
                 'error': f'Frame processing error: {str(e)}'
             }
     
+    @staticmethod
+    def analyze_frame(camera_id: int, frame_data):
+        """
+        Decode and analyse one buffered stream frame (runs on a frame ingestion worker)
+        Faces are tracked for streams registered with track_faces; motion and
+        tracked faces are reported to the frame sampler
+        """
+        from app import socketio
+        from app.services.camera_service import get_camera_service
+        from app.services.frame_sampler import get_frame_sampler
+        
+        result = CameraStreamManager.process_frame(camera_id, frame_data)
+        if not result['success']:
+            print(f"Error analysing frame for camera {camera_id}: {result.get('error')}")
+            return
+        
+        stream = CameraStreamManager.active_streams.get(camera_id)
+        motion, faces = False, []
+        if stream and stream.get('detect_motion'):
+            motion = get_camera_service().detect_motion(camera_id, result['frame'])
+        if stream and stream.get('track_faces'):
+            faces = CameraStreamManager.track_faces(camera_id, cv2.cvtColor(result['frame'], cv2.COLOR_BGR2RGB))
+            socketio.emit('camera:faces', {
+                'camera_id': camera_id,
+                'faces': faces,
+                'timestamp': datetime.now(timezone.utc).isoformat()
+            }, room=f'camera_{camera_id}')
+        get_frame_sampler().report(camera_id, motion=motion, tracking=bool(faces))
+    
+    @staticmethod
+    def get_face_tracker(camera_id: int) -> FaceTracker:
+        """Face tracker of a camera stream, created on first use"""
+        tracker = CameraStreamManager.face_trackers.get(camera_id)
+        if tracker is None:
+            tracker = CameraStreamManager.face_trackers.setdefault(
+                camera_id, FaceTracker.from_config(current_app.config)
+            )
+        return tracker
+    
+    @staticmethod
+    def track_faces(camera_id: int, rgb_image, now: float = None) -> list:
+        """
+        Track and recognise the faces in one stream frame
+        Faces are located every frame but only new tracks (and tracks due for
+        re-verification) are encoded and matched; other faces inherit their
+        track's identity. One AccessLog is written per visit.
+        Returns one FaceTrack.to_dict() per face in the frame
+        """
+        from app.services.face_encoding_pool import get_encoding_pool
+        from app.services.face_recognition_service import FaceRecognitionService
+        
+        tracker = CameraStreamManager.get_face_tracker(camera_id)
+        pool = get_encoding_pool()
+        timeout = current_app.config.get('FACE_ENCODING_TIMEOUT')
+        now = time.monotonic() if now is None else now
+        
+        # Frames of one camera are tracked in order
+        with tracker.lock:
+            locations = FaceRecognitionService.locate_faces_for_camera(camera_id, rgb_image, timeout=timeout)
+            locations = locations[:current_app.config.get('MAX_FACES_PER_FRAME', 5)]
+            tracks = tracker.update(locations, now)
+            
+            pending = [track for track in tracks if tracker.needs_recognition(track, now)]
+            if pending:
+                encodings = pool.encode_locations(rgb_image, [track.location for track in pending], timeout=timeout)
+                recognitions = FaceRecognitionService.recognize_faces_batch(camera_id, encodings)
+                
+                visits = []
+                for track, recognition in zip(pending, recognitions):
+                    if 'error' in recognition:
+                        continue
+                    previous = track.recognition
+                    tracker.mark_recognized(track, recognition, now)
+                    # A new track, or re-verification found someone else: a new visit
+                    if previous is None or previous.get('person_id') != recognition.get('person_id'):
+                        visits.append(track)
+                
+                if visits:
+                    CameraStreamManager._log_visits(camera_id, visits)
+            
+            return [track.to_dict() for track in tracks]
+    
+    @staticmethod
+    def _log_visits(camera_id: int, tracks: list):
+        """
+        AccessLog and recognition stats for each new visit, and one door decision per frame
+        (for the best recognised visitor, see door_face_index); the others are only logged
+        """
+        from app.services.door_control_service import DoorControlService, door_face_index
+        
+        door_index = door_face_index([track.recognition for track in tracks])
+        door_results = [
+            {'action': 'alert_sent', 'access_granted': False,
+             'message': 'Door decision made for another face in this frame'}
+            for _ in tracks
+        ]
+        door_results[door_index] = {'action': 'alert_sent', 'access_granted': False}
+        try:
+            door_service = DoorControlService()
+            door_results[door_index] = door_service.process_recognition(tracks[door_index].recognition, camera_id)
+        except Exception as e:
+            print(f"Door control not available: {e}")
+        
+        try:
+            access_logs = [
+                AccessLog(
+                    camera_id=camera_id,
+                    person_id=track.recognition.get('person_id'),
+                    person_name=track.recognition.get('person_name', 'Unknown'),
+                    is_known=track.recognition.get('is_known', False),
+                    confidence=track.recognition.get('confidence', 0.0),
+                    access_granted=door_result.get('access_granted', False),
+                    action=door_result.get('action', 'alert_sent')
+                )
+                for track, door_result in zip(tracks, door_results)
+            ]
+            db.session.add_all(access_logs)
+            
+            recognized_ids = [track.recognition['person_id'] for track in tracks if track.recognition.get('is_known')]
+            if recognized_ids:
+                now = datetime.now(timezone.utc)
+                for person in FacePerson.query.filter(FacePerson.id.in_(recognized_ids)).all():
+                    person.recognition_count = (person.recognition_count or 0) + recognized_ids.count(person.id)
+                    person.last_recognized = now
+            
+            db.session.commit()
+            for track, access_log in zip(tracks, access_logs):
+                track.access_log_id = access_log.id
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error logging face visits for camera {camera_id}: {e}")
+    
     @staticmethod
     def store_webrtc_offer(camera_id: int, offer_sdp: str) -> str:
         """Store WebRTC offer and generate connection ID"""
@@ -135,23 +306,36 @@ class CameraStreamManager:
 
 def register_camera_socketio_handlers(socketio):
     """Register Socket.IO handlers for camera streaming"""
+    from app.services.frame_ingestion import get_frame_ingestion
+    from app.services.frame_relay import TIER_FULL, get_frame_relay
+    from app.services.frame_sampler import get_frame_sampler
+    
+    def owned_camera(camera_id):
+        """The camera if it belongs to the session's logged-in user (client-sent user ids are ignored)"""
+        if not camera_id or not current_user.is_authenticated:
+            return None
+        return Camera.query.filter_by(id=camera_id, user_id=current_user.id).first()
     
     @socketio.on('camera:register')
     def handle_camera_register(data):
-        """Mobile camera registers with server"""
+        """Mobile camera registers with server; this client becomes the stream's only frame source"""
         try:
             camera_id = data.get('camera_id')
-            user_id = data.get('user_id')
             stream_type = data.get('stream_type', 'mobile')
             
             # Verify camera ownership
-            camera = Camera.query.filter_by(id=camera_id, user_id=user_id).first()
+            camera = owned_camera(camera_id)
             if not camera:
                 emit('error', {'message': 'Camera not found'})
                 return
             
             # Register stream
-            CameraStreamManager.register_camera_stream(camera_id, user_id, stream_type)
+            CameraStreamManager.register_camera_stream(
+                camera_id, current_user.id, stream_type,
+                track_faces=bool(camera.face_detection_enabled and current_app.config.get('FACE_TRACKING_ENABLED', True)),
+                detect_motion=bool(camera.motion_enabled),
+                sid=request.sid
+            )
             join_room(f'camera_{camera_id}')
             
             emit('camera:registered', {
@@ -167,6 +351,9 @@ def register_camera_socketio_handlers(socketio):
         """Mobile camera disconnects"""
         try:
             camera_id = data.get('camera_id')
+            if not CameraStreamManager.is_stream_publisher(camera_id, request.sid):
+                emit('error', {'message': 'Camera stream not registered by this client'})
+                return
             CameraStreamManager.unregister_camera_stream(camera_id)
             leave_room(f'camera_{camera_id}')
             emit('camera:disconnected', {'camera_id': camera_id})
@@ -175,7 +362,12 @@ def register_camera_socketio_handlers(socketio):
     
     @socketio.on('camera:frame')
     def handle_camera_frame(data):
-        """Receive frame from mobile camera"""
+        """
+        Receive frame from mobile camera
+        'frame' is raw JPEG bytes (sent as a binary attachment) or, from older
+        clients, a base64 data:image string; 'full' quality viewers get it in
+        the same form, 'sd' and 'thumb' viewers as re-encoded JPEG bytes
+        """
         try:
             camera_id = data.get('camera_id')
             frame_data = data.get('frame')
@@ -184,40 +376,50 @@ def register_camera_socketio_handlers(socketio):
                 emit('error', {'message': 'Missing camera_id or frame'})
                 return
             
-            # Process frame
-            result = CameraStreamManager.process_frame(camera_id, frame_data)
+            # Frames drive face recognition and door control: only the registered publisher may send them
+            if not CameraStreamManager.is_stream_publisher(camera_id, request.sid):
+                emit('error', {'message': 'Camera stream not registered by this client'})
+                return
             
-            if result['success']:
-                # Broadcast frame to all viewers of this camera
-                socketio.emit('camera:frame', {
-                    'camera_id': camera_id,
-                    'frame': frame_data,
-                    'timestamp': datetime.now(timezone.utc).isoformat()
-                }, room=f'camera_{camera_id}')
-            else:
-                emit('error', {'message': result.get('error')})
+            # Relay every frame to its viewers; only sampled frames are decoded and
+            # analysed, on the frame ingestion workers so a slow detector never stalls the socket
+            get_frame_relay().relay(camera_id, frame_data)
+            
+            if get_frame_sampler().should_analyze(camera_id):
+                get_frame_ingestion().submit(camera_id, frame_data)
         except Exception as e:
             emit('error', {'message': f'Frame handling error: {str(e)}'})
     
     @socketio.on('camera:watch')
     def handle_camera_watch(data):
-        """Client wants to watch a camera stream"""
+        """
+        Client wants to watch a camera stream
+        'quality' is 'full' (default), 'sd' or 'thumb'; clients that acknowledge
+        camera:frame events can pass 'ack': true to be skipped while behind
+        """
         try:
             camera_id = data.get('camera_id')
-            user_id = data.get('user_id')
+            quality = data.get('quality') or TIER_FULL
             
             # Verify access
-            camera = Camera.query.filter_by(id=camera_id, user_id=user_id).first()
+            camera = owned_camera(camera_id)
             if not camera:
                 emit('error', {'message': 'Camera not found or access denied'})
                 return
             
+            try:
+                get_frame_relay().add_viewer(camera_id, request.sid, quality, ack=bool(data.get('ack')))
+            except ValueError as e:
+                emit('error', {'message': str(e)})
+                return
+            
             join_room(f'camera_{camera_id}')
             CameraStreamManager.add_stream_client(camera_id, request.sid)
             
             emit('camera:watching', {
                 'camera_id': camera_id,
-                'status': 'watching'
+                'status': 'watching',
+                'quality': quality
             })
         except Exception as e:
             emit('error', {'message': f'Watch error: {str(e)}'})
@@ -229,10 +431,20 @@ def register_camera_socketio_handlers(socketio):
             camera_id = data.get('camera_id')
             leave_room(f'camera_{camera_id}')
             CameraStreamManager.remove_stream_client(camera_id, request.sid)
+            get_frame_relay().remove_viewer(request.sid, camera_id)
             emit('camera:unwatching', {'camera_id': camera_id})
         except Exception as e:
             emit('error', {'message': f'Unwatch error: {str(e)}'})
     
+    @socketio.on('disconnect')
+    def handle_client_disconnect():
+        """Stop relaying frames to a client that went away, and end the streams it published"""
+        get_frame_relay().remove_viewer(request.sid)
+        for camera_id in list(CameraStreamManager.active_streams):
+            CameraStreamManager.remove_stream_client(camera_id, request.sid)
+            if CameraStreamManager.is_stream_publisher(camera_id, request.sid):
+                CameraStreamManager.unregister_camera_stream(camera_id)
+    
     @socketio.on('webrtc:offer')
     def handle_webrtc_offer(data):
         """Handle WebRTC offer from mobile camera"""
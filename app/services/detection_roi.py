@@ -0,0 +1,200 @@
+"""
+Detection Regions of Interest
+Per-camera ROI masks (Camera.detection_roi) and learned face size ranges
+(Camera.face_min_size / face_max_size)
+
+detection_roi is a list of polygons in normalised [0, 1] frame coordinates,
+e.g. [[[0.25, 0.1], [0.75, 0.1], [0.75, 0.9], [0.25, 0.9]]]. Detectors only
+look at the bounding box of the polygons and drop detections whose centre
+falls outside them.
+
+Face sizes are learned from the camera's recent face Detection boxes, so the
+Haar pyramid (and the HOG detection scale) only covers sizes a face at that
+door can actually have.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+import cv2
+import numpy as np
+
+# Cached Camera ROI / face size settings are re-read after this many seconds
+SETTINGS_TTL = 30.0
+
+
+def validate_roi(polygons) -> list:
+    """Normalised polygon list (or None to clear); raises ValueError when malformed"""
+    if polygons is None or polygons == []:
+        return None
+    if not isinstance(polygons, list):
+        raise ValueError('detection_roi must be a list of polygons')
+
+    cleaned = []
+    for polygon in polygons:
+        if not isinstance(polygon, list) or len(polygon) < 3:
+            raise ValueError('each ROI polygon needs at least 3 [x, y] points')
+        points = []
+        for point in polygon:
+            if not isinstance(point, (list, tuple)) or len(point) != 2:
+                raise ValueError('ROI points must be [x, y] pairs')
+            x, y = float(point[0]), float(point[1])
+            if not (0.0 <= x <= 1.0 and 0.0 <= y <= 1.0):
+                raise ValueError('ROI coordinates are fractions of the frame (0 to 1)')
+            points.append([x, y])
+        cleaned.append(points)
+    return cleaned
+
+
+def offset_detections(detections: list, dx: int, dy: int) -> list:
+    """Shift [x, y, w, h] detection boxes found on a crop back to frame coordinates"""
+    if not dx and not dy:
+        return detections
+    return [
+        {**detection, 'bbox': [detection['bbox'][0] + dx, detection['bbox'][1] + dy, *detection['bbox'][2:]]}
+        for detection in detections
+    ]
+
+
+class DetectionRoi:
+    """Pixel mask of a camera's ROI polygons for one frame size"""
+
+    def __init__(self, polygons: list, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.mask = np.zeros((height, width), dtype=np.uint8)
+        points = [
+            np.round(np.asarray(polygon, dtype=np.float32) * [width - 1, height - 1]).astype(np.int32)
+            for polygon in polygons
+        ]
+        cv2.fillPoly(self.mask, points, 255)
+
+        ys, xs = np.nonzero(self.mask)
+        if len(xs):
+            x0, y0 = int(xs.min()), int(ys.min())
+            self.bounds = (x0, y0, int(xs.max()) - x0 + 1, int(ys.max()) - y0 + 1)
+        else:
+            self.bounds = None
+
+    def contains(self, x, y) -> bool:
+        x, y = int(x), int(y)
+        return 0 <= x < self.width and 0 <= y < self.height and bool(self.mask[y, x])
+
+    def filter(self, detections: list) -> list:
+        """Detections ([x, y, w, h] boxes) whose centre is inside the ROI"""
+        return [
+            detection for detection in detections
+            if self.contains(detection['bbox'][0] + detection['bbox'][2] / 2,
+                             detection['bbox'][1] + detection['bbox'][3] / 2)
+        ]
+
+    def filter_locations(self, locations: list) -> list:
+        """face_recognition locations (top, right, bottom, left) whose centre is inside the ROI"""
+        return [
+            location for location in locations
+            if self.contains((location[1] + location[3]) / 2, (location[0] + location[2]) / 2)
+        ]
+
+    def restrict(self, box: tuple):
+        """Intersection of an (x, y, w, h) box with the ROI bounds, None when they do not overlap"""
+        if self.bounds is None:
+            return None
+        bx, by, bw, bh = self.bounds
+        x, y, w, h = box
+        x0, y0 = max(x, bx), max(y, by)
+        x1, y1 = min(x + w, bx + bw), min(y + h, by + bh)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return (x0, y0, x1 - x0, y1 - y0)
+
+
+def _freeze(polygons) -> tuple:
+    return tuple(tuple(tuple(point) for point in polygon) for polygon in polygons)
+
+
+@lru_cache(maxsize=64)
+def _roi(frozen: tuple, width: int, height: int) -> DetectionRoi:
+    return DetectionRoi([list(polygon) for polygon in frozen], width, height)
+
+
+def roi_for(polygons, width: int, height: int):
+    """Cached DetectionRoi of a polygon list at a frame size (None when no ROI is set)"""
+    if not polygons:
+        return None
+    return _roi(_freeze(polygons), width, height)
+
+
+_settings = {}
+_settings_lock = threading.Lock()
+
+
+def camera_detection_settings(camera_id) -> dict:
+    """
+    {'roi', 'face_min_size', 'face_max_size'} and the frame sampling overrides
+    ('frame_skip', 'active_frame_skip', 'idle_frame_interval') of a camera,
+    cached for SETTINGS_TTL seconds
+    """
+    from app.models import Camera, db
+
+    now = time.monotonic()
+    with _settings_lock:
+        cached = _settings.get(camera_id)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    camera = db.session.get(Camera, camera_id) if camera_id is not None else None
+    settings = {
+        'roi': camera.detection_roi if camera else None,
+        'face_min_size': camera.face_min_size if camera else None,
+        'face_max_size': camera.face_max_size if camera else None,
+        'frame_skip': camera.frame_skip if camera else None,
+        'active_frame_skip': camera.active_frame_skip if camera else None,
+        'idle_frame_interval': camera.idle_frame_interval if camera else None
+    }
+    with _settings_lock:
+        _settings[camera_id] = (settings, now + SETTINGS_TTL)
+    return settings
+
+
+def invalidate_camera_settings(camera_id=None):
+    with _settings_lock:
+        if camera_id is None:
+            _settings.clear()
+        else:
+            _settings.pop(camera_id, None)
+
+
+def learn_face_sizes(camera_id: int, days: int = 30, min_samples: int = 50) -> dict:
+    """
+    Set a camera's face_min_size / face_max_size from the widths of its recent face detections
+    (2nd percentile * 0.8 to 98th percentile * 1.25, never below 20 px)
+    Leaves them unset while there are fewer than min_samples detections
+    """
+    from app.models import Camera, Detection, db
+
+    since = datetime.utcnow() - timedelta(days=days)
+    widths = np.array([
+        width for (width,) in db.session.query(Detection.bbox_width).filter(
+            Detection.camera_id == camera_id,
+            Detection.detection_type == 'face',
+            Detection.bbox_width.isnot(None),
+            Detection.timestamp >= since
+        ).all()
+    ], dtype=np.float32)
+
+    report = {'camera_id': camera_id, 'samples': len(widths), 'face_min_size': None, 'face_max_size': None}
+    camera = db.session.get(Camera, camera_id)
+    if camera is None:
+        return report
+
+    if len(widths) >= min_samples:
+        low, high = np.percentile(widths, [2, 98])
+        report['face_min_size'] = max(20, int(low * 0.8))
+        report['face_max_size'] = max(report['face_min_size'] + 1, int(np.ceil(high * 1.25)))
+
+    camera.face_min_size = report['face_min_size']
+    camera.face_max_size = report['face_max_size']
+    db.session.commit()
+    invalidate_camera_settings(camera_id)
+    return report
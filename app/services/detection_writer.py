@@ -0,0 +1,230 @@
+"""
+Detection Writer
+Buffered persistence of Detection rows and camera activity timestamps
+
+process_frame used to add one ORM object per detection and commit once per
+frame. The writer instead buffers plain row mappings and a background thread
+flushes them every DETECTION_WRITER_BATCH_SIZE rows or
+DETECTION_WRITER_INTERVAL_MS, whichever comes first: one executemany INSERT
+for the rows and one UPDATE (CASE over camera ids) for cameras.last_motion /
+last_detection per flush.
+
+Rows are lost only when the buffer outgrows DETECTION_WRITER_MAX_PENDING (the
+oldest are dropped) or a flush fails; both are counted in stats() and the
+safehome_detection_writes_lost_total metric. The buffer is flushed when the
+process exits.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import case, insert, update
+from app.models import Camera, Detection, db
+from app.services.metrics import track_detection, track_detection_writes_lost, track_detection_flush
+
+logger = logging.getLogger(__name__)
+
+
+def detection_rows(camera_id, results: dict, timestamp: datetime = None) -> list:
+    """Detection row mappings for FrameAnalysisEngine.analyze results"""
+    timestamp = timestamp or datetime.utcnow()
+    rows = []
+    for detection_type, key in (('object', 'objects'), ('face', 'faces')):
+        for detection in results.get(key, []):
+            x, y, w, h = detection['bbox']
+            rows.append({
+                'camera_id': camera_id,
+                'detection_type': detection_type,
+                'object_class': detection.get('class'),
+                'confidence': detection['confidence'],
+                'bbox_x': x,
+                'bbox_y': y,
+                'bbox_width': w,
+                'bbox_height': h,
+                'timestamp': timestamp
+            })
+    return rows
+
+
+class DetectionWriter:
+    """Batches Detection inserts and camera timestamp updates"""
+
+    def __init__(self, batch_size: int = 500, interval: float = 0.5, max_pending: int = 20000, app=None):
+        """
+        interval is the longest a row waits in the buffer (seconds); 0 writes
+        synchronously in the caller's session on every add()
+        """
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.max_pending = max(self.batch_size, max_pending)
+        self.app = app
+        self._rows = []
+        self._cameras = {}
+        self._stats = {'written': 0, 'flushes': 0, 'lost': 0, 'last_flush_ms': None}
+        self._lock = threading.Lock()
+        # Serialises flushes so rows reach the database in the order they were added
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopping = False
+
+    @classmethod
+    def from_config(cls, config, app=None) -> 'DetectionWriter':
+        return cls(
+            batch_size=config.get('DETECTION_WRITER_BATCH_SIZE', 500),
+            interval=config.get('DETECTION_WRITER_INTERVAL_MS', 500) / 1000.0,
+            max_pending=config.get('DETECTION_WRITER_MAX_PENDING', 20000),
+            app=app
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None or not self.enabled:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._work, name='detection-writer', daemon=True)
+            self._thread.start()
+
+    def add(self, camera_id, rows: list, motion: bool = False, timestamp: datetime = None):
+        """
+        Queue a frame's detection rows; the camera's last_detection (and
+        last_motion when motion is set) move to timestamp at the next flush
+        """
+        timestamp = timestamp or datetime.utcnow()
+        for row in rows:
+            track_detection(camera_id, row['detection_type'])
+
+        with self._lock:
+            self._rows.extend(rows)
+            activity = self._cameras.setdefault(camera_id, {'last_motion': None, 'last_detection': None})
+            activity['last_detection'] = timestamp
+            if motion:
+                activity['last_motion'] = timestamp
+
+            overflow = len(self._rows) - self.max_pending
+            if overflow > 0:
+                del self._rows[:overflow]
+                self._stats['lost'] += overflow
+            flush_now = len(self._rows) >= self.batch_size
+
+        if overflow > 0:
+            track_detection_writes_lost('overflow', overflow)
+            logger.warning(f'Detection writer buffer full, dropped {overflow} rows')
+
+        if not self.enabled:
+            self.flush()
+        elif flush_now:
+            self.start()
+            self._wake.set()
+        else:
+            self.start()
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+                cameras, self._cameras = self._cameras, {}
+            if not rows and not cameras:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                if self.app is not None and not has_app_context():
+                    with self.app.app_context():
+                        self._write(rows, cameras)
+                else:
+                    self._write(rows, cameras)
+            except Exception as e:
+                with self._lock:
+                    self._stats['lost'] += len(rows)
+                track_detection_writes_lost('error', len(rows))
+                logger.error(f'Error writing {len(rows)} detections: {e}')
+                return 0
+
+            elapsed = time.perf_counter() - start
+            track_detection_flush(len(rows), elapsed)
+            with self._lock:
+                self._stats['written'] += len(rows)
+                self._stats['flushes'] += 1
+                self._stats['last_flush_ms'] = round(elapsed * 1000, 2)
+            return len(rows)
+
+    @staticmethod
+    def _write(rows: list, cameras: dict):
+        try:
+            if rows:
+                db.session.execute(insert(Detection), rows)
+
+            values = {}
+            for column in ('last_motion', 'last_detection'):
+                whens = {camera_id: activity[column] for camera_id, activity in cameras.items() if activity[column]}
+                if whens:
+                    values[column] = case(whens, value=Camera.id, else_=getattr(Camera, column))
+            if values:
+                db.session.execute(
+                    update(Camera).where(Camera.id.in_(list(cameras))).values(**values),
+                    execution_options={'synchronize_session': False}
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _work(self):
+        while not self._stopping:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, 'pending': len(self._rows)}
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the flush thread and write whatever is still buffered"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+        self._wake.set()
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_detection_writer() -> DetectionWriter:
+    """The process-wide detection writer, configured from the current app"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            config = current_app.config if has_app_context() else {}
+            _writer = DetectionWriter.from_config(
+                config, app=current_app._get_current_object() if has_app_context() else None
+            )
+        return _writer
+
+
+def stop_detection_writer():
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop()
+
+
+atexit.register(stop_detection_writer)
@@ -0,0 +1,253 @@
+"""
+Detector Backends
+cv2.dnn object detectors behind one interface, so CPU-only deployments can
+run a smaller network (YOLOv3/v4-tiny, MobileNet-SSD) at 320/416/608 input
+instead of full YOLOv3
+
+A backend is described by an MLModel row whose model_type is a key of
+BACKEND_TYPES; file_path is the weights file and model_metadata holds
+    config      network definition (.cfg / .prototxt / .pbtxt)
+    input_size  square network input (multiple of 32 for YOLO), default 416
+    classes     'coco', 'voc' or a list of label names
+    scale, mean, swap_rb   blob preprocessing overrides
+The legacy ml_models/yolov3.* pair is the 'yolov3' backend used when no row
+applies.
+"""
+
+import threading
+import cv2
+import numpy as np
+
+COCO_CLASSES = ['person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat',
+                'traffic light', 'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat',
+                'dog', 'horse', 'sheep', 'cow', 'elephant', 'bear', 'zebra', 'giraffe', 'backpack',
+                'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee', 'skis', 'snowboard', 'sports ball',
+                'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard', 'tennis racket',
+                'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple',
+                'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake', 'chair',
+                'couch', 'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop', 'mouse', 'remote',
+                'keyboard', 'cell phone', 'microwave', 'oven', 'toaster', 'sink', 'refrigerator', 'book',
+                'clock', 'vase', 'scissors', 'teddy bear', 'hair drier', 'toothbrush']
+
+# MobileNet-SSD (Caffe) label map; index 0 is the background class
+VOC_CLASSES = ['background', 'aeroplane', 'bicycle', 'bird', 'boat', 'bottle', 'bus', 'car', 'cat',
+               'chair', 'cow', 'diningtable', 'dog', 'horse', 'motorbike', 'person', 'pottedplant',
+               'sheep', 'sofa', 'train', 'tvmonitor']
+
+CLASS_SETS = {'coco': COCO_CLASSES, 'voc': VOC_CLASSES}
+
+INPUT_SIZES = (320, 416, 608)
+
+
+def _class_names(classes):
+    if isinstance(classes, str):
+        return CLASS_SETS[classes]
+    return list(classes)
+
+
+def decode_yolo(outputs, width, height, class_names, threshold=0.5, nms_threshold=0.4) -> list:
+    """Vectorised decoding of darknet YOLO output layers (rows of cx, cy, w, h, objectness, scores...)"""
+    rows = [np.asarray(output).reshape(-1, output.shape[-1]) for output in outputs]
+    rows = np.concatenate(rows) if rows else np.empty((0, 5 + len(class_names)), dtype=np.float32)
+
+    # Only rows whose best class clears the threshold get boxes; argmax over the survivors
+    scores = rows[:, 5:]
+    confidences = scores.max(axis=1) if scores.size else np.empty(0, dtype=np.float32)
+    keep = confidences > threshold
+    if not keep.any():
+        return []
+
+    rows = rows[keep]
+    confidences = confidences[keep]
+    class_ids = np.argmax(scores[keep], axis=1)
+
+    # Same truncation as int(): centre and size first, then the top-left corner
+    centers_x = (rows[:, 0] * width).astype(np.int64)
+    centers_y = (rows[:, 1] * height).astype(np.int64)
+    widths = (rows[:, 2] * width).astype(np.int64)
+    heights = (rows[:, 3] * height).astype(np.int64)
+    xs = (centers_x - widths / 2).astype(np.int64)
+    ys = (centers_y - heights / 2).astype(np.int64)
+
+    boxes = np.stack([xs, ys, widths, heights], axis=1).tolist()
+    confidences = confidences.tolist()
+
+    indices = cv2.dnn.NMSBoxes(boxes, confidences, threshold, nms_threshold)
+
+    results = []
+    # NMSBoxes returns (n,) or (n, 1) arrays of numpy ints depending on the OpenCV version
+    for idx in np.asarray(indices, dtype=np.int64).flatten():
+        class_id = int(class_ids[idx])
+        results.append({
+            'class': class_names[class_id] if class_id < len(class_names) else 'unknown',
+            'confidence': confidences[idx],
+            'bbox': boxes[idx]
+        })
+    return results
+
+
+def decode_ssd(outputs, width, height, class_names, threshold=0.5) -> list:
+    """Decoding of a DetectionOutput layer: rows of (image, class, confidence, x1, y1, x2, y2), already NMSed"""
+    rows = np.asarray(outputs[0]).reshape(-1, 7)
+    rows = rows[rows[:, 2] > threshold]
+    if not len(rows):
+        return []
+
+    corners = np.clip(rows[:, 3:7], 0.0, 1.0) * [width, height, width, height]
+    corners = corners.astype(np.int64)
+    results = []
+    for row, (x1, y1, x2, y2) in zip(rows, corners.tolist()):
+        class_id = int(row[1])
+        results.append({
+            'class': class_names[class_id] if 0 <= class_id < len(class_names) else 'unknown',
+            'confidence': float(row[2]),
+            'bbox': [x1, y1, x2 - x1, y2 - y1]
+        })
+    return results
+
+
+class DetectorBackend:
+    """A cv2.dnn detection network, its preprocessing and its output decoding"""
+
+    model_type = None
+    default_classes = 'coco'
+    default_scale = 1 / 255.0
+    default_mean = (0, 0, 0)
+    default_swap_rb = True
+
+    def __init__(self, name, weights, config=None, input_size=416, classes=None,
+                 scale=None, mean=None, swap_rb=None, version=None, model_id=None):
+        if input_size not in INPUT_SIZES:
+            raise ValueError(f'Unsupported input size {input_size}; expected one of {INPUT_SIZES}')
+        self.name = name
+        self.weights = str(weights)
+        self.config = str(config) if config else None
+        self.input_size = input_size
+        self.class_names = _class_names(classes or self.default_classes)
+        self.scale = self.default_scale if scale is None else scale
+        self.mean = tuple(mean) if mean is not None else self.default_mean
+        self.swap_rb = self.default_swap_rb if swap_rb is None else swap_rb
+        self.version = version
+        self.model_id = model_id
+        self.net = None
+        self.output_layers = None
+        # A dnn.Net keeps its input and intermediate blobs, so one forward pass at a time
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_model(cls, model) -> 'DetectorBackend':
+        """Backend described by an MLModel row"""
+        metadata = model.model_metadata or {}
+        backend_cls = BACKEND_TYPES[model.model_type]
+        return backend_cls(
+            name=model.name,
+            weights=model.file_path,
+            config=metadata.get('config'),
+            input_size=int(metadata.get('input_size', 416)),
+            classes=metadata.get('classes'),
+            scale=metadata.get('scale'),
+            mean=metadata.get('mean'),
+            swap_rb=metadata.get('swap_rb'),
+            version=model.version,
+            model_id=model.id
+        )
+
+    @property
+    def input_shape(self) -> tuple:
+        return (1, 3, self.input_size, self.input_size)
+
+    def load(self) -> 'DetectorBackend':
+        self.net = cv2.dnn.readNet(self.weights, self.config) if self.config else cv2.dnn.readNet(self.weights)
+        layer_names = self.net.getLayerNames()
+        self.output_layers = [layer_names[i - 1] for i in np.asarray(self.net.getUnconnectedOutLayers()).flatten()]
+        return self
+
+    def memory_bytes(self) -> int:
+        try:
+            weights_bytes, blobs_bytes = self.net.getMemoryConsumption(self.input_shape)
+            return int(weights_bytes + blobs_bytes)
+        except cv2.error:
+            return 0
+
+    def blob_params(self) -> tuple:
+        """(size, scale, swap_rb, mean) for FrameContext.blob / blobFromImage"""
+        return (self.input_size, self.input_size), self.scale, self.swap_rb, self.mean
+
+    def blob(self, frame):
+        return self.blob_batch([frame])
+
+    def blob_batch(self, frames):
+        size, scale, swap_rb, mean = self.blob_params()
+        return cv2.dnn.blobFromImages(frames, scale, size, mean, swapRB=swap_rb, crop=False)
+
+    def forward(self, blob):
+        with self.lock:
+            self.net.setInput(blob)
+            return self.net.forward(self.output_layers)
+
+    def split_batch(self, outputs, batch_size) -> list:
+        """Per-image outputs of a batched forward pass"""
+        raise NotImplementedError
+
+    def decode(self, outputs, width, height, threshold=0.5) -> list:
+        """[{'class', 'confidence', 'bbox': [x, y, w, h]}] in frame pixels"""
+        raise NotImplementedError
+
+    def warm_up(self):
+        self.forward(np.zeros(self.input_shape, dtype=np.float32))
+
+    def describe(self) -> dict:
+        return {
+            'name': self.name,
+            'model_type': self.model_type,
+            'version': self.version,
+            'model_id': self.model_id,
+            'input_size': self.input_size,
+            'classes': len(self.class_names)
+        }
+
+
+class YoloBackend(DetectorBackend):
+    """Darknet YOLO (v3, v3-tiny, v4-tiny, ...) from .weights + .cfg"""
+
+    model_type = 'yolo'
+
+    def split_batch(self, outputs, batch_size) -> list:
+        per_layer = [
+            output if output.ndim == 3 else output.reshape(batch_size, -1, output.shape[-1])
+            for output in outputs
+        ]
+        return [[layer[i] for layer in per_layer] for i in range(batch_size)]
+
+    def decode(self, outputs, width, height, threshold=0.5) -> list:
+        return decode_yolo(outputs, width, height, self.class_names, threshold)
+
+
+class SsdBackend(DetectorBackend):
+    """Single-shot detectors ending in a DetectionOutput layer (MobileNet-SSD Caffe / TensorFlow)"""
+
+    model_type = 'ssd'
+    default_classes = 'voc'
+    default_scale = 1 / 127.5
+    default_mean = (127.5, 127.5, 127.5)
+    default_swap_rb = False
+
+    def split_batch(self, outputs, batch_size) -> list:
+        # DetectionOutput rows of all images share one (1, 1, N, 7) blob, keyed by column 0
+        rows = np.asarray(outputs[0]).reshape(-1, 7)
+        return [[rows[rows[:, 0] == i]] for i in range(batch_size)]
+
+    def decode(self, outputs, width, height, threshold=0.5) -> list:
+        return decode_ssd(outputs, width, height, self.class_names, threshold)
+
+
+BACKEND_TYPES = {
+    YoloBackend.model_type: YoloBackend,
+    SsdBackend.model_type: SsdBackend
+}
+
+
+def register_backend_type(backend_cls):
+    """Make MLModel rows with model_type == backend_cls.model_type loadable"""
+    BACKEND_TYPES[backend_cls.model_type] = backend_cls
+    return backend_cls
@@ -13,6 +13,19 @@ import time
 logger = logging.getLogger(__name__)
 
 
+def door_face_index(recognition_results):
+    """
+    Index of the face a frame's single door decision is made for:
+    best known resident, else best known person, else the first face
+    """
+    def rank(i):
+        result = recognition_results[i]
+        is_known = bool(result.get('is_known'))
+        confidence = result.get('confidence', 0.0) if is_known else 0.0
+        return (is_known and bool(result.get('is_resident')), is_known, confidence, -i)
+    return max(range(len(recognition_results)), key=rank)
+
+
 class DoorControlService:
     """Handle smart lock operations and door access control"""
     
@@ -0,0 +1,193 @@
+"""
+Encoding Compaction Service
+Reduces each enrolled person to at most FACE_PROTOTYPES_PER_PERSON
+representative encodings (k-medoids of their FaceEncoding rows)
+
+Raw FaceEncoding rows are never deleted. The resident gallery matches a
+compacted person against their FacePrototype rows only (see
+FaceRecognitionService._gallery_rows), so matching cost no longer grows with
+the number of enrollment photos.
+
+Before a user's prototypes are committed, every stored enrollment encoding is
+re-identified leave-one-out against the raw gallery and against the compacted
+gallery; the accuracy of both is reported and the compaction is rolled back if
+it loses more than FACE_COMPACTION_MAX_ACCURACY_DROP.
+"""
+
+import numpy as np
+from flask import current_app
+from app.models import FacePerson, FaceEncoding, FacePrototype, db
+from app.services.face_gallery_index import squared_distances
+from app.services.face_recognition_service import FaceRecognitionService
+
+
+def k_medoids(vectors: np.ndarray, k: int, iterations: int = 20) -> tuple:
+    """
+    Deterministic k-medoids (farthest-point init, then Voronoi iteration)
+    Returns (medoid row indices (k,), assignment of every row (n,))
+    """
+    n = len(vectors)
+    if n <= k:
+        return np.arange(n), np.arange(n)
+
+    distances = np.sqrt(squared_distances(vectors, vectors))
+
+    # Start from the most central vector, then keep adding the worst-covered one
+    medoids = [int(np.argmin(distances.sum(axis=1)))]
+    while len(medoids) < k:
+        coverage = distances[:, medoids].min(axis=1)
+        if coverage.max() == 0:
+            break
+        medoids.append(int(np.argmax(coverage)))
+    medoids = np.array(medoids)
+
+    for _ in range(iterations):
+        assignment = np.argmin(distances[:, medoids], axis=1)
+        updated = medoids.copy()
+        for cluster in range(len(medoids)):
+            members = np.flatnonzero(assignment == cluster)
+            if len(members):
+                updated[cluster] = members[np.argmin(distances[np.ix_(members, members)].sum(axis=1))]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+
+    return medoids, np.argmin(distances[:, medoids], axis=1)
+
+
+class EncodingCompactionService:
+    """Builds FacePrototype rows and reports their effect on accuracy"""
+
+    @staticmethod
+    def _user_encodings(user_id: int) -> tuple:
+        rows = db.session.query(FaceEncoding.id, FaceEncoding.person_id, FaceEncoding.encoding)\
+            .join(FacePerson)\
+            .filter(FacePerson.user_id == user_id)\
+            .order_by(FaceEncoding.id)\
+            .all()
+        ids = np.fromiter((row_id for row_id, _, _ in rows), dtype=np.int64, count=len(rows))
+        person_ids = np.fromiter((pid for _, pid, _ in rows), dtype=np.int64, count=len(rows))
+        matrix = FaceEncoding.unpack(b''.join(bytes(enc) for _, _, enc in rows))\
+            .astype(np.float32, copy=False)\
+            .reshape(-1, FaceRecognitionService.ENCODING_SIZE)
+        return ids, person_ids, matrix
+
+    @staticmethod
+    def identification_accuracy(queries: np.ndarray, query_ids: np.ndarray, query_persons: np.ndarray,
+                                gallery: np.ndarray, gallery_sources: np.ndarray, gallery_persons: np.ndarray,
+                                tolerance: float = None, chunk_size: int = 1024) -> float:
+        """
+        Leave-one-out top-1 accuracy: each query must match its own person within
+        tolerance, ignoring gallery entries derived from the query row itself
+        """
+        if len(queries) == 0:
+            return 1.0
+        if tolerance is None:
+            tolerance = FaceRecognitionService.FACE_MATCH_TOLERANCE
+
+        correct = 0
+        for start in range(0, len(queries), chunk_size):
+            end = start + chunk_size
+            sq = squared_distances(queries[start:end], gallery)
+            sq[query_ids[start:end, None] == gallery_sources[None, :]] = np.inf
+            nearest = np.argmin(sq, axis=1)
+            matched = np.sqrt(sq[np.arange(len(nearest)), nearest]) <= tolerance
+            correct += int(np.sum(matched & (gallery_persons[nearest] == query_persons[start:end])))
+        return correct / len(queries)
+
+    @staticmethod
+    def compact_user(user_id: int, max_prototypes: int = None, max_accuracy_drop: float = None,
+                     dry_run: bool = False) -> dict:
+        """
+        Rebuild the prototypes of every person of a user with more than
+        max_prototypes encodings
+        Returns a report with the raw vs compacted identification accuracy
+        """
+        if max_prototypes is None:
+            max_prototypes = current_app.config.get('FACE_PROTOTYPES_PER_PERSON', 5)
+        if max_accuracy_drop is None:
+            max_accuracy_drop = current_app.config.get('FACE_COMPACTION_MAX_ACCURACY_DROP', 0.01)
+
+        ids, person_ids, matrix = EncodingCompactionService._user_encodings(user_id)
+        report = {
+            'user_id': user_id,
+            'encodings': len(ids),
+            'persons_compacted': 0,
+            'gallery_size_before': len(FaceRecognitionService.get_gallery(user_id)) if len(ids) else 0,
+            'gallery_size_after': len(ids),
+            'raw_accuracy': None,
+            'compact_accuracy': None,
+            'accuracy_delta': None,
+            'committed': False
+        }
+        if len(ids) == 0:
+            return report
+
+        try:
+            # Rebuild every person's prototypes from their current raw rows
+            FacePrototype.query.filter(
+                FacePrototype.person_id.in_(np.unique(person_ids).tolist())
+            ).delete(synchronize_session=False)
+
+            gallery, sources, owners = [], [], []
+            for person_id in np.unique(person_ids):
+                rows = np.flatnonzero(person_ids == person_id)
+                if len(rows) <= max_prototypes:
+                    gallery.append(matrix[rows])
+                    sources.append(ids[rows])
+                    owners.append(person_ids[rows])
+                    continue
+
+                medoids, assignment = k_medoids(matrix[rows], max_prototypes)
+                weights = np.bincount(assignment, minlength=len(medoids))
+                db.session.add_all([
+                    FacePrototype(
+                        person_id=int(person_id),
+                        source_encoding_id=int(ids[rows[medoid]]),
+                        encoding=matrix[rows[medoid]],
+                        weight=int(weight)
+                    )
+                    for medoid, weight in zip(medoids, weights)
+                ])
+                gallery.append(matrix[rows[medoids]])
+                sources.append(ids[rows[medoids]])
+                owners.append(person_ids[rows[medoids]])
+                report['persons_compacted'] += 1
+
+            gallery, sources, owners = np.concatenate(gallery), np.concatenate(sources), np.concatenate(owners)
+            raw_accuracy = EncodingCompactionService.identification_accuracy(
+                matrix, ids, person_ids, matrix, ids, person_ids
+            )
+            compact_accuracy = EncodingCompactionService.identification_accuracy(
+                matrix, ids, person_ids, gallery, sources, owners
+            )
+            report.update({
+                'gallery_size_after': len(gallery),
+                'raw_accuracy': round(raw_accuracy, 4),
+                'compact_accuracy': round(compact_accuracy, 4),
+                'accuracy_delta': round(compact_accuracy - raw_accuracy, 4)
+            })
+
+            if dry_run or raw_accuracy - compact_accuracy > max_accuracy_drop:
+                db.session.rollback()
+                return report
+
+            db.session.commit()
+            report['committed'] = True
+            FaceRecognitionService.invalidate_gallery(user_id)
+            return report
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error compacting face encodings for user {user_id}: {str(e)}")
+            report['error'] = str(e)
+            return report
+
+    @staticmethod
+    def compact_all(max_prototypes: int = None, dry_run: bool = False) -> list:
+        """Compact every user that has enrolled persons"""
+        user_ids = [user_id for (user_id,) in db.session.query(FacePerson.user_id).distinct().all()]
+        return [
+            EncodingCompactionService.compact_user(user_id, max_prototypes=max_prototypes, dry_run=dry_run)
+            for user_id in user_ids
+        ]
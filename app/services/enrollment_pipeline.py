@@ -0,0 +1,97 @@
+"""
+Enrollment Pipeline
+Runs face enrollment as a Celery pipeline so the request returns immediately:
+
+    tasks.enroll_person -> tasks.sync_enrolled_person -> tasks.upload_enrolled_profile
+    (encode + commit)      (Firebase sync_person)        (Firebase upload_image)
+
+Each stage reports progress to the user over Socket.IO ('enrollment_progress'
+on the /alerts namespace), keyed by the job id returned to the client.
+"""
+
+import logging
+import uuid
+from celery import Celery, chain
+from flask import current_app
+from app.models import FacePerson, db
+from app.utils.socketio_utils import send_enrollment_progress
+
+logger = logging.getLogger(__name__)
+
+_celery_client = None
+
+
+def _get_celery_client() -> Celery:
+    """Producer-only Celery client; the web process never imports app.celery_tasks"""
+    global _celery_client
+    if _celery_client is None:
+        _celery_client = Celery(
+            current_app.import_name,
+            broker=current_app.config['CELERY_BROKER_URL'],
+            backend=current_app.config['CELERY_RESULT_BACKEND']
+        )
+    return _celery_client
+
+
+def enqueue_enrollment(user_id: int, person_name: str, image_paths: list,
+                       relation: str = 'family', is_resident: bool = True) -> str:
+    """Queue the enrollment pipeline and return its job id"""
+    job_id = str(uuid.uuid4())
+    client = _get_celery_client()
+
+    pipeline = chain(
+        client.signature('tasks.enroll_person', kwargs={
+            'user_id': user_id,
+            'person_name': person_name,
+            'image_paths': image_paths,
+            'relation': relation,
+            'is_resident': is_resident,
+            'job_id': job_id
+        }).set(task_id=job_id),
+        client.signature('tasks.sync_enrolled_person', kwargs={'job_id': job_id}),
+        client.signature('tasks.upload_enrolled_profile', kwargs={'job_id': job_id})
+    )
+    # Fail fast when the broker is down so the route can fall back to inline enrollment
+    pipeline.apply_async(retry=False)
+
+    send_enrollment_progress(user_id, job_id, 'queued', {'total_images': len(image_paths)})
+    return job_id
+
+
+def sync_person_to_firebase(person_id: int, encoding_count: int):
+    """Sync an enrolled person to Firebase; returns the Firebase id or None"""
+    from app.services.firebase_service import FirebaseService
+    firebase_service = FirebaseService()
+
+    person = FacePerson.query.get(person_id)
+    if not person or not firebase_service.is_enabled:
+        return None
+
+    firebase_id = firebase_service.sync_person({
+        'id': str(person.id),
+        'name': person.name,
+        'relation': person.relation,
+        'is_resident': person.is_resident,
+        'enrolled_date': int(person.created_at.timestamp() * 1000),
+        'encoding_count': encoding_count
+    })
+
+    # Update person with Firebase ID
+    if firebase_id:
+        person.firebase_id = firebase_id
+        db.session.commit()
+
+    return firebase_id
+
+
+def upload_profile_image(person_id: int, image_path: str):
+    """Upload an enrolled person's profile image to Firebase Storage; returns its URL or None"""
+    from app.services.firebase_service import FirebaseService
+    firebase_service = FirebaseService()
+
+    if not image_path or not firebase_service.is_enabled:
+        return None
+
+    firebase_url = firebase_service.upload_image(image_path, f'faces/{person_id}/profile.jpg')
+    logger.info(f"Profile image uploaded to Firebase: {firebase_url}")
+    return firebase_url
@@ -0,0 +1,226 @@
+"""
+Face Encoding Pool
+Runs dlib face detection/encoding in a dedicated process pool so request
+threads are not blocked one core per image
+
+One pool is created lazily per (gunicorn) worker process. Pool processes
+load the dlib models once in their initializer. With
+FACE_ENCODING_POOL_SIZE = 0 encoding runs inline in the calling thread, as it
+does in daemonic processes (prefork Celery workers), which may not start
+children, and in any process where the pool failed to start.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+# Detection settings captured from the app config for pool processes
+_worker_settings = {}
+
+
+def _init_worker(settings: dict):
+    """Pool process initializer: load and warm up the dlib models"""
+    import numpy as np
+    import face_recognition
+
+    _worker_settings.update(settings)
+    face_recognition.face_encodings(np.zeros((64, 64, 3), dtype=np.uint8), [(0, 64, 64, 0)])
+
+
+def _encode_file(image_path: str) -> list:
+    from app.services.face_recognition_service import FaceRecognitionService
+    return FaceRecognitionService.encode_image_file(image_path, **_worker_settings)
+
+
+def _encode_frame(frame) -> list:
+    from app.services.face_recognition_service import FaceRecognitionService
+    return FaceRecognitionService.encode_opencv_frame(frame, **_worker_settings)
+
+
+def _locate_faces(rgb_image) -> list:
+    from app.services.face_recognition_service import FaceRecognitionService
+    return FaceRecognitionService.locate_faces(rgb_image, **_worker_settings)
+
+
+def _locate_faces_at(job) -> list:
+    from app.services.face_recognition_service import FaceRecognitionService
+    rgb_image, scale = job
+    return FaceRecognitionService.locate_faces(rgb_image, **{**_worker_settings, 'scale': scale})
+
+
+def _encode_locations(job) -> list:
+    import face_recognition
+    rgb_image, locations = job
+    return [encoding.tolist() for encoding in face_recognition.face_encodings(rgb_image, locations)]
+
+
+class FaceEncodingPool:
+    """Process pool for face encoding jobs"""
+
+    def __init__(self, size: int = 2, scale: float = 1.0, min_width: int = 320,
+                 start_method: str = 'spawn'):
+        self.size = size
+        self.settings = {'scale': scale, 'min_width': min_width}
+        self.start_method = start_method
+        self._executor = None
+        self._pid = None
+        # Process in which the pool could not be started; it encodes inline from then on
+        self._failed_pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> 'FaceEncodingPool':
+        return cls(
+            size=config.get('FACE_ENCODING_POOL_SIZE', 2),
+            scale=config.get('FACE_DETECTION_SCALE', 1.0),
+            min_width=config.get('FACE_DETECTION_MIN_WIDTH', 320),
+            start_method=config.get('FACE_ENCODING_POOL_START_METHOD', 'spawn')
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Whether jobs go to the process pool from this process"""
+        if self.size <= 0 or self._failed_pid == os.getpid():
+            return False
+        # Daemonic processes (e.g. billiard children of a prefork Celery worker) cannot have children
+        return not multiprocessing.current_process().daemon
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            # A forked copy of a pool is unusable; build a fresh one per process
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                    initargs=(self.settings,)
+                )
+                self._pid = os.getpid()
+                logger.info(f'Started face encoding pool with {self.size} processes')
+            return self._executor
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _run_inline(func, items: list, progress_callback=None) -> list:
+        results = []
+        for item in items:
+            results.append(func(item))
+            if progress_callback:
+                progress_callback(len(results), len(items), results[-1])
+        return results
+
+    def _run(self, func, items: list, timeout: float = None, progress_callback=None) -> list:
+        try:
+            executor = self._get_executor()
+            futures = [executor.submit(func, item) for item in items]
+        except BrokenProcessPool:
+            self._reset()
+            raise
+        except (AssertionError, OSError) as e:
+            # Pool processes could not be started here: encode inline instead of failing the job
+            logger.warning(f'Face encoding pool unavailable, encoding inline: {e!r}')
+            self._reset()
+            self._failed_pid = os.getpid()
+            return self._run_inline(func, items, progress_callback)
+
+        try:
+            for done, future in enumerate(as_completed(futures, timeout=timeout), start=1):
+                if progress_callback:
+                    progress_callback(done, len(futures), future.result())
+            return [future.result() for future in futures]
+        except FutureTimeoutError:
+            for future in futures:
+                future.cancel()
+            raise FutureTimeoutError(f'Face encoding timed out after {timeout}s')
+        except BrokenProcessPool:
+            self._reset()
+            raise
+
+    def encode_files(self, image_paths: list, timeout: float = None, progress_callback=None) -> list:
+        """
+        Encode several image files in parallel
+        progress_callback(done, total, result) is called as each image finishes
+        Returns one encode_image_file result list per path, in order
+        """
+        if not self.enabled:
+            from app.services.face_recognition_service import FaceRecognitionService
+            results = []
+            for path in image_paths:
+                results.append(FaceRecognitionService.encode_image_file(path))
+                if progress_callback:
+                    progress_callback(len(results), len(image_paths), results[-1])
+            return results
+        return self._run(_encode_file, list(image_paths), timeout, progress_callback)
+
+    def encode_file(self, image_path: str, timeout: float = None) -> list:
+        """Encode one image file, raising TimeoutError if it takes longer than timeout"""
+        return self.encode_files([image_path], timeout)[0]
+
+    def encode_frame(self, frame, timeout: float = None) -> list:
+        """Encode a BGR OpenCV frame, raising TimeoutError if it takes longer than timeout"""
+        if not self.enabled:
+            from app.services.face_recognition_service import FaceRecognitionService
+            return FaceRecognitionService.encode_opencv_frame(frame)
+        return self._run(_encode_frame, [frame], timeout)[0]
+
+    def locate_faces(self, rgb_image, timeout: float = None, scale: float = None) -> list:
+        """Face locations (top, right, bottom, left) in an RGB image; scale overrides FACE_DETECTION_SCALE"""
+        if not self.enabled:
+            from app.services.face_recognition_service import FaceRecognitionService
+            return FaceRecognitionService.locate_faces(rgb_image, scale)
+        if scale is not None:
+            return self._run(_locate_faces_at, [(rgb_image, scale)], timeout)[0]
+        return self._run(_locate_faces, [rgb_image], timeout)[0]
+
+    def encode_locations(self, rgb_image, locations: list, timeout: float = None) -> list:
+        """128-d encodings (as lists) of the faces at the given locations"""
+        if not locations:
+            return []
+        if not self.enabled:
+            return _encode_locations((rgb_image, locations))
+        return self._run(_encode_locations, [(rgb_image, list(locations))], timeout)[0]
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            owned = self._pid == os.getpid()
+        if executor is not None and owned:
+            executor.shutdown(wait=wait, cancel_futures=True)
+            logger.info('Face encoding pool stopped')
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_encoding_pool() -> FaceEncodingPool:
+    """The process-wide encoding pool, configured from the current app"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            config = current_app.config if has_app_context() else {}
+            _pool = FaceEncodingPool.from_config(config)
+        return _pool
+
+
+def shutdown_encoding_pool(wait: bool = True):
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
+
+
+atexit.register(shutdown_encoding_pool)
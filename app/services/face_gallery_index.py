@@ -0,0 +1,357 @@
+"""
+Face Gallery Index
+Nearest-neighbour search over enrolled face encodings
+
+Two interchangeable backends:
+- ExactGalleryIndex: brute-force scan, always returns the true nearest encoding
+- IVFGalleryIndex: inverted-file index (k-means coarse quantizer), only scans
+  the `nprobe` closest clusters; sub-linear for large multi-tenant galleries
+
+Both support incremental add/remove and persist to a single .npz file.
+Mutations build new arrays and swap them in, so concurrent searches always
+see a consistent snapshot.
+"""
+
+import os
+import json
+import tempfile
+import numpy as np
+
+ENCODING_SIZE = 128
+
+
+def squared_distances(queries: np.ndarray, vectors: np.ndarray, sq_norms: np.ndarray = None) -> np.ndarray:
+    """(M, N) squared euclidean distances via |q|^2 + |v|^2 - 2 q.v"""
+    if sq_norms is None:
+        sq_norms = np.einsum('ij,ij->i', vectors, vectors)
+    sq = queries @ vectors.T
+    sq *= -2
+    sq += np.einsum('ij,ij->i', queries, queries)[:, None]
+    sq += sq_norms[None, :]
+    np.maximum(sq, 0, out=sq)
+    return sq
+
+
+def _as_matrix(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return np.ascontiguousarray(matrix.reshape(-1, ENCODING_SIZE))
+
+
+class GalleryIndex:
+    """Base class for gallery index backends"""
+
+    backend = None
+
+    def __init__(self):
+        self.signature = None
+        self._state = self._empty_state()
+
+    def _empty_state(self) -> dict:
+        return {
+            'vectors': np.empty((0, ENCODING_SIZE), dtype=np.float32),
+            'person_ids': np.empty(0, dtype=np.int64),
+            'sq_norms': np.empty(0, dtype=np.float32)
+        }
+
+    def __len__(self):
+        return len(self._state['person_ids'])
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._state['vectors']
+
+    @property
+    def person_ids(self) -> np.ndarray:
+        return self._state['person_ids']
+
+    def build(self, vectors, person_ids):
+        """Replace the whole index contents"""
+        raise NotImplementedError
+
+    def add(self, person_id: int, vectors):
+        """Add encodings for one person"""
+        raise NotImplementedError
+
+    def remove(self, person_id: int):
+        """Remove every encoding of one person"""
+        raise NotImplementedError
+
+    def search(self, queries) -> tuple:
+        """
+        Nearest neighbour of each query
+        Returns (distances (M,), person_ids (M,)); person_id is -1 when the index is empty
+        """
+        raise NotImplementedError
+
+    def _payload(self) -> dict:
+        state = self._state
+        return {'vectors': state['vectors'], 'person_ids': state['person_ids']}
+
+    def _restore(self, arrays: dict, params: dict):
+        self.build(arrays['vectors'], arrays['person_ids'])
+
+    def params(self) -> dict:
+        return {}
+
+    def save(self, path: str):
+        """Atomically persist the index to `path` (.npz)"""
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        meta = {
+            'backend': self.backend,
+            'params': self.params(),
+            'signature': list(self.signature) if self.signature is not None else None
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, meta=np.array(json.dumps(meta)), **self._payload())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def load(path: str) -> 'GalleryIndex':
+        """Load an index saved with save(); the backend is read from the file"""
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            arrays = {key: data[key] for key in data.files if key != 'meta'}
+
+        index = create_gallery_index(meta['backend'], **meta.get('params', {}))
+        index._restore(arrays, meta.get('params', {}))
+        index.signature = tuple(meta['signature']) if meta.get('signature') is not None else None
+        return index
+
+
+class ExactGalleryIndex(GalleryIndex):
+    """Brute-force index: one (M, N) distance matrix per search"""
+
+    backend = 'exact'
+
+    def build(self, vectors, person_ids):
+        vectors = _as_matrix(vectors)
+        self._state = {
+            'vectors': vectors,
+            'person_ids': np.asarray(person_ids, dtype=np.int64),
+            'sq_norms': np.einsum('ij,ij->i', vectors, vectors)
+        }
+
+    def add(self, person_id: int, vectors):
+        vectors = _as_matrix(vectors)
+        state = self._state
+        self._state = {
+            'vectors': np.concatenate([state['vectors'], vectors]),
+            'person_ids': np.concatenate([state['person_ids'], np.full(len(vectors), person_id, dtype=np.int64)]),
+            'sq_norms': np.concatenate([state['sq_norms'], np.einsum('ij,ij->i', vectors, vectors)])
+        }
+
+    def remove(self, person_id: int):
+        state = self._state
+        keep = state['person_ids'] != person_id
+        self._state = {key: value[keep] for key, value in state.items()}
+
+    def search(self, queries) -> tuple:
+        queries = _as_matrix(queries)
+        state = self._state
+        if len(state['person_ids']) == 0:
+            return np.ones(len(queries), dtype=np.float32), np.full(len(queries), -1, dtype=np.int64)
+
+        sq = squared_distances(queries, state['vectors'], state['sq_norms'])
+        nearest = np.argmin(sq, axis=1)
+        distances = np.sqrt(sq[np.arange(len(queries)), nearest])
+        return distances, state['person_ids'][nearest]
+
+
+class IVFGalleryIndex(GalleryIndex):
+    """
+    Inverted-file index
+    Vectors are bucketed by their nearest k-means centroid and stored
+    contiguously per bucket; a search scans only the nprobe nearest buckets.
+    """
+
+    backend = 'ivf'
+
+    # Retrain the quantizer once the index outgrows its training set this much
+    RETRAIN_GROWTH = 4
+    TRAIN_SAMPLE_SIZE = 20000
+    TRAIN_ITERATIONS = 10
+
+    def __init__(self, nlist: int = None, nprobe: int = 8, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self._trained_size = 0
+        super().__init__()
+
+    def _empty_state(self) -> dict:
+        state = super()._empty_state()
+        state['centroids'] = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        state['offsets'] = np.zeros(1, dtype=np.int64)
+        return state
+
+    def params(self) -> dict:
+        return {'nlist': self.nlist, 'nprobe': self.nprobe, 'seed': self.seed}
+
+    def _train(self, vectors: np.ndarray) -> np.ndarray:
+        """Plain k-means (Lloyd) on a sample of the vectors"""
+        rng = np.random.default_rng(self.seed)
+        nlist = self.nlist or max(1, int(np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+
+        sample = vectors
+        if len(vectors) > self.TRAIN_SAMPLE_SIZE:
+            sample = vectors[rng.choice(len(vectors), self.TRAIN_SAMPLE_SIZE, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.TRAIN_ITERATIONS):
+            assignment = self._assign(sample, centroids)
+            counts = np.bincount(assignment, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+
+            empty = counts == 0
+            centroids[~empty] = sums[~empty] / counts[~empty, None]
+            if empty.any():
+                centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+
+        self._trained_size = len(vectors)
+        return centroids
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+        sq_norms = np.einsum('ij,ij->i', centroids, centroids)
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            assignment[start:start + chunk_size] = np.argmin(
+                squared_distances(chunk, centroids, sq_norms), axis=1
+            )
+        return assignment
+
+    def _layout(self, vectors, person_ids, centroids) -> dict:
+        """Sort vectors by bucket so every inverted list is a contiguous slice"""
+        if len(vectors) == 0 or len(centroids) == 0:
+            state = self._empty_state()
+            state['centroids'] = centroids
+            state['offsets'] = np.zeros(len(centroids) + 1, dtype=np.int64)
+            return state
+
+        assignment = self._assign(vectors, centroids)
+        order = np.argsort(assignment, kind='stable')
+        vectors = np.ascontiguousarray(vectors[order])
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=len(centroids)), out=offsets[1:])
+        return {
+            'vectors': vectors,
+            'person_ids': np.asarray(person_ids, dtype=np.int64)[order],
+            'sq_norms': np.einsum('ij,ij->i', vectors, vectors),
+            'centroids': centroids,
+            'offsets': offsets
+        }
+
+    def build(self, vectors, person_ids, centroids: np.ndarray = None):
+        vectors = _as_matrix(vectors)
+        if centroids is None:
+            centroids = self._train(vectors) if len(vectors) else np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        self._state = self._layout(vectors, person_ids, centroids)
+
+    def add(self, person_id: int, vectors):
+        """Append the new vectors to the end of their buckets; only they are assigned to a centroid"""
+        vectors = _as_matrix(vectors)
+        state = self._state
+        size = len(state['person_ids']) + len(vectors)
+
+        if len(state['centroids']) == 0 or size > self.RETRAIN_GROWTH * max(self._trained_size, 1):
+            all_vectors = np.concatenate([state['vectors'], vectors])
+            all_ids = np.concatenate([state['person_ids'], np.full(len(vectors), person_id, dtype=np.int64)])
+            self.build(all_vectors, all_ids)
+            return
+
+        centroids, offsets = state['centroids'], state['offsets']
+        assignment = self._assign(vectors, centroids)
+        order = np.argsort(assignment, kind='stable')
+        vectors, assignment = vectors[order], assignment[order]
+        # Insertion points are the current bucket ends; np.insert keeps same-bucket rows in order
+        positions = offsets[assignment + 1]
+        new_offsets = offsets.copy()
+        np.cumsum(np.bincount(assignment, minlength=len(centroids)), out=new_offsets[1:])
+        new_offsets[1:] += offsets[1:]
+        self._state = {
+            'vectors': np.ascontiguousarray(np.insert(state['vectors'], positions, vectors, axis=0)),
+            'person_ids': np.insert(state['person_ids'], positions, person_id),
+            'sq_norms': np.insert(state['sq_norms'], positions, np.einsum('ij,ij->i', vectors, vectors)),
+            'centroids': centroids,
+            'offsets': new_offsets
+        }
+
+    def remove(self, person_id: int):
+        """Drop a person's rows; the buckets of the remaining rows are unchanged"""
+        state = self._state
+        keep = state['person_ids'] != person_id
+        if keep.all():
+            return
+        # Rows kept before each offset give the new offsets
+        kept_before = np.zeros(len(keep) + 1, dtype=np.int64)
+        np.cumsum(keep, out=kept_before[1:])
+        self._state = {
+            'vectors': state['vectors'][keep],
+            'person_ids': state['person_ids'][keep],
+            'sq_norms': state['sq_norms'][keep],
+            'centroids': state['centroids'],
+            'offsets': kept_before[state['offsets']]
+        }
+
+    def search(self, queries) -> tuple:
+        queries = _as_matrix(queries)
+        state = self._state
+        distances = np.ones(len(queries), dtype=np.float32)
+        person_ids = np.full(len(queries), -1, dtype=np.int64)
+        if len(state['person_ids']) == 0:
+            return distances, person_ids
+
+        centroids, offsets = state['centroids'], state['offsets']
+        nprobe = min(self.nprobe, len(centroids))
+        probe_sq = squared_distances(queries, centroids)
+        probes = np.argpartition(probe_sq, nprobe - 1, axis=1)[:, :nprobe]
+
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([
+                np.arange(offsets[bucket], offsets[bucket + 1]) for bucket in probes[i]
+            ])
+            if len(candidates) == 0:
+                continue
+            sq = squared_distances(
+                query[None, :], state['vectors'][candidates], state['sq_norms'][candidates]
+            )[0]
+            nearest = int(np.argmin(sq))
+            distances[i] = np.sqrt(sq[nearest])
+            person_ids[i] = state['person_ids'][candidates[nearest]]
+
+        return distances, person_ids
+
+    def _payload(self) -> dict:
+        payload = super()._payload()
+        payload['centroids'] = self._state['centroids']
+        payload['trained_size'] = np.array(self._trained_size)
+        return payload
+
+    def _restore(self, arrays: dict, params: dict):
+        self._trained_size = int(arrays.get('trained_size', len(arrays['vectors'])))
+        self.build(arrays['vectors'], arrays['person_ids'], centroids=arrays['centroids'])
+
+
+GALLERY_BACKENDS = {
+    ExactGalleryIndex.backend: ExactGalleryIndex,
+    IVFGalleryIndex.backend: IVFGalleryIndex
+}
+
+
+def create_gallery_index(backend: str = 'exact', **params) -> GalleryIndex:
+    """Instantiate a gallery index backend by name"""
+    if backend not in GALLERY_BACKENDS:
+        raise ValueError(f'Unknown gallery index backend: {backend}')
+    if backend == ExactGalleryIndex.backend:
+        return ExactGalleryIndex()
+    return GALLERY_BACKENDS[backend](**params)
@@ -9,8 +9,14 @@ import cv2
 from PIL import Image
 import io
 import os
+import threading
+import time
 from datetime import datetime, timezone
-from app.models import FacePerson, FaceEncoding, AccessLog, db
+from flask import current_app, has_app_context
+from app.models import FacePerson, FaceEncoding, FacePrototype, AccessLog, db
+from app.services.detection_roi import camera_detection_settings, roi_for
+from app.services.face_gallery_index import GalleryIndex, create_gallery_index
+from app.services.recognition_cache import face_crop_hash, get_recognition_cache
 
 class FaceRecognitionService:
     """Service for face detection and recognition"""
@@ -21,35 +27,123 @@ class FaceRecognitionService:
     # Minimum faces needed to train a person
     MIN_ENCODING_COUNT = 2
     
+    # Dimensionality of face_recognition encodings
+    ENCODING_SIZE = 128
+    
+    # Smallest face (pixels) the HOG detector's 80x80 window finds
+    HOG_MIN_FACE_SIZE = 80
+    
+    # Resident gallery cache: {user_id: GalleryIndex}
+    _galleries = {}
+    _gallery_lock = threading.Lock()
+    
     def __init__(self):
         self.face_detector = face_recognition.load_image_file
         self.face_encodings_model = face_recognition.face_encodings
     
     @staticmethod
-    def encode_image_file(image_path: str) -> list:
+    def locate_faces(rgb_image, scale: float = None, min_width: int = None) -> list:
+        """
+        Run HOG face detection on a downscaled copy of the image
+        Returns face locations (top, right, bottom, left) in original image coordinates
+        """
+        if scale is None:
+            scale = FaceRecognitionService._config('FACE_DETECTION_SCALE', 1.0)
+        
+        height, width = rgb_image.shape[:2]
+        
+        # Never shrink below the smallest width HOG still finds faces at
+        if min_width is None:
+            min_width = FaceRecognitionService._config('FACE_DETECTION_MIN_WIDTH', 320)
+        if width * scale < min_width:
+            scale = min_width / width
+        
+        if scale >= 1.0:
+            return face_recognition.face_locations(rgb_image, model='hog')
+        
+        small = cv2.resize(rgb_image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        locations = face_recognition.face_locations(small, model='hog')
+        
+        return [
+            (
+                max(0, int(round(top / scale))),
+                min(width, int(round(right / scale))),
+                min(height, int(round(bottom / scale))),
+                max(0, int(round(left / scale)))
+            )
+            for top, right, bottom, left in locations
+        ]
+    
+    @staticmethod
+    def locate_faces_for_camera(camera_id: int, rgb_image, timeout: float = None) -> list:
+        """
+        Face locations in a camera's frame, honouring its detection ROI and learned face sizes
+        HOG runs on the ROI's bounding box only, downscaled as far as the camera's smallest
+        face allows; faces outside the ROI or wider than face_max_size are dropped
+        """
+        from app.services.face_encoding_pool import get_encoding_pool
+        
+        settings = camera_detection_settings(camera_id)
+        height, width = rgb_image.shape[:2]
+        roi = roi_for(settings['roi'], width, height)
+        
+        x = y = 0
+        image = rgb_image
+        if roi is not None:
+            if roi.bounds is None:
+                return []
+            x, y, w, h = roi.bounds
+            image = np.ascontiguousarray(rgb_image[y:y + h, x:x + w])
+        
+        scale = None
+        if settings['face_min_size']:
+            scale = min(1.0, FaceRecognitionService.HOG_MIN_FACE_SIZE / settings['face_min_size'])
+        
+        locations = get_encoding_pool().locate_faces(image, timeout=timeout, scale=scale)
+        locations = [(top + y, right + x, bottom + y, left + x) for top, right, bottom, left in locations]
+        
+        if roi is not None:
+            locations = roi.filter_locations(locations)
+        if settings['face_max_size']:
+            locations = [
+                location for location in locations
+                if location[1] - location[3] <= settings['face_max_size']
+            ]
+        return locations
+    
+    @staticmethod
+    def _encode_rgb(rgb_image, scale: float = None, min_width: int = None) -> list:
+        """Detect on a downscaled copy, encode on the full-resolution crops"""
+        face_locations = FaceRecognitionService.locate_faces(rgb_image, scale, min_width)
+        face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+        
+        return [
+            {
+                'encoding': encoding.tolist(),
+                'location': location,
+            }
+            for encoding, location in zip(face_encodings, face_locations)
+        ]
+    
+    @staticmethod
+    def encode_image_file(image_path: str, scale: float = None, min_width: int = None) -> list:
         """
         Load image and extract face encodings
         Returns list of (encoding, face_location) tuples
         """
         try:
             image = face_recognition.load_image_file(image_path)
-            face_locations = face_recognition.face_locations(image, model='hog')
-            face_encodings = face_recognition.face_encodings(image, face_locations)
             
-            return [
-                {
-                    'encoding': encoding.tolist(),
-                    'location': location,
-                    'confidence': 0.95  # Face_recognition doesn't return confidence
-                }
-                for encoding, location in zip(face_encodings, face_locations)
-            ]
+            results = FaceRecognitionService._encode_rgb(image, scale, min_width)
+            for result in results:
+                result['confidence'] = 0.95  # Face_recognition doesn't return confidence
+            return results
         except Exception as e:
             print(f"Error encoding image {image_path}: {str(e)}")
             return []
     
     @staticmethod
-    def encode_opencv_frame(frame) -> list:
+    def encode_opencv_frame(frame, scale: float = None, min_width: int = None) -> list:
         """
         Extract faces from OpenCV frame (numpy array)
         Returns list of encodings with locations
@@ -58,16 +152,7 @@ class FaceRecognitionService:
             # OpenCV uses BGR, face_recognition uses RGB
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             
-            face_locations = face_recognition.face_locations(rgb_frame, model='hog')
-            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-            
-            return [
-                {
-                    'encoding': encoding.tolist(),
-                    'location': location,
-                }
-                for encoding, location in zip(face_encodings, face_locations)
-            ]
+            return FaceRecognitionService._encode_rgb(rgb_frame, scale, min_width)
         except Exception as e:
             print(f"Error encoding frame: {str(e)}")
             return []
@@ -88,20 +173,31 @@ class FaceRecognitionService:
             elif image_array.shape[2] == 4:
                 image_array = cv2.cvtColor(image_array, cv2.COLOR_RGBA2RGB)
             
-            face_locations = face_recognition.face_locations(image_array, model='hog')
-            face_encodings = face_recognition.face_encodings(image_array, face_locations)
-            
-            return [
-                {
-                    'encoding': encoding.tolist(),
-                    'location': location,
-                }
-                for encoding, location in zip(face_encodings, face_locations)
-            ]
+            return FaceRecognitionService._encode_rgb(image_array)
         except Exception as e:
             print(f"Error encoding PIL image: {str(e)}")
             return []
     
+    @staticmethod
+    def as_vector(encoding):
+        """
+        Get an encoding as a float32 vector
+        Packed binary encodings are returned as zero-copy views
+        """
+        if isinstance(encoding, (bytes, bytearray, memoryview)):
+            return FaceEncoding.unpack(encoding)
+        if isinstance(encoding, FaceEncoding):
+            return encoding.vector
+        return np.asarray(encoding, dtype=np.float32)
+    
+    @staticmethod
+    def _stack_encodings(known_encodings) -> np.ndarray:
+        if isinstance(known_encodings, np.ndarray):
+            return known_encodings
+        if len(known_encodings) == 0:
+            return np.empty((0, FaceRecognitionService.ENCODING_SIZE), dtype=np.float32)
+        return np.vstack([FaceRecognitionService.as_vector(enc) for enc in known_encodings])
+    
     @staticmethod
     def compare_faces(test_encoding: list, known_encodings: list, tolerance: float = None) -> list:
         """
@@ -111,8 +207,8 @@ class FaceRecognitionService:
         if tolerance is None:
             tolerance = FaceRecognitionService.FACE_MATCH_TOLERANCE
         
-        test_encoding = np.array(test_encoding)
-        known_encodings = np.array(known_encodings)
+        test_encoding = FaceRecognitionService.as_vector(test_encoding)
+        known_encodings = FaceRecognitionService._stack_encodings(known_encodings)
         
         distances = face_recognition.face_distance(known_encodings, test_encoding)
         return (distances <= tolerance).tolist()
@@ -123,8 +219,8 @@ class FaceRecognitionService:
         Find the closest matching encoding
         Returns {'match_index': int, 'distance': float, 'confidence': float}
         """
-        test_encoding = np.array(test_encoding)
-        known_encodings = np.array(known_encodings)
+        test_encoding = FaceRecognitionService.as_vector(test_encoding)
+        known_encodings = FaceRecognitionService._stack_encodings(known_encodings)
         
         distances = face_recognition.face_distance(known_encodings, test_encoding)
         
@@ -144,9 +240,12 @@ class FaceRecognitionService:
     
     @staticmethod
     def enroll_person(user_id: int, person_name: str, image_paths: list, 
-                     relation: str = 'family', is_resident: bool = True) -> dict:
+                     relation: str = 'family', is_resident: bool = True,
+                     progress_callback=None) -> dict:
         """
         Enroll a new person with multiple face images
+        progress_callback(stage, **data) is called as images are encoded ('encoding')
+        and once the encodings are committed ('encodings_stored')
         Returns {'success': bool, 'message': str, 'person_id': int}
         """
         try:
@@ -161,11 +260,25 @@ class FaceRecognitionService:
             db.session.add(face_person)
             db.session.flush()
             
-            # Encode all images and store encodings
+            # Encode all images in parallel on the encoding pool, then store encodings
+            from app.services.face_encoding_pool import get_encoding_pool
+            faces_found = []
+            
+            def on_image_encoded(done, total, encodings_data):
+                faces_found.append(len(encodings_data))
+                if progress_callback:
+                    progress_callback('encoding', images_encoded=done, total_images=total,
+                                      faces_found=sum(faces_found))
+            
+            encoded_images = get_encoding_pool().encode_files(
+                image_paths,
+                timeout=FaceRecognitionService._config('FACE_ENCODING_TIMEOUT'),
+                progress_callback=on_image_encoded
+            )
+            
             encoding_count = 0
-            for image_path in image_paths:
-                encodings_data = FaceRecognitionService.encode_image_file(image_path)
-                
+            vectors = []
+            for image_path, encodings_data in zip(image_paths, encoded_images):
                 for enc_data in encodings_data:
                     face_encoding = FaceEncoding(
                         person_id=face_person.id,
@@ -173,6 +286,7 @@ class FaceRecognitionService:
                         image_path=image_path
                     )
                     db.session.add(face_encoding)
+                    vectors.append(enc_data['encoding'])
                     encoding_count += 1
             
             if encoding_count < FaceRecognitionService.MIN_ENCODING_COUNT:
@@ -183,6 +297,11 @@ class FaceRecognitionService:
                 }
             
             db.session.commit()
+            FaceRecognitionService._update_gallery(user_id, lambda index: index.add(face_person.id, vectors),
+                                                   encodings=encoding_count)
+            
+            if progress_callback:
+                progress_callback('encodings_stored', person_id=face_person.id, encoding_count=encoding_count)
             
             return {
                 'success': True,
@@ -202,65 +321,319 @@ class FaceRecognitionService:
         Returns {'is_known': bool, 'person_id': int, 'person_name': str, 
                  'confidence': float, 'match_details': dict}
         """
+        return FaceRecognitionService.recognize_faces_batch(camera_id, [test_encoding])[0]
+    
+    @staticmethod
+    def recognize_faces_batch(camera_id: int, encodings: list) -> list:
+        """
+        Recognize several faces from one frame in a single matrix-matrix distance call
+        At most MAX_FACES_PER_FRAME encodings are matched
+        Returns one recognize_face-style dict per matched encoding
+        """
         from app.models import Camera, User
         
+        encodings = list(encodings)[:FaceRecognitionService._max_faces_per_frame()]
+        if not encodings:
+            return []
+        
         try:
             # Get camera and user
             camera = Camera.query.get(camera_id)
             if not camera:
-                return {'is_known': False, 'error': 'Camera not found'}
+                return [{'is_known': False, 'error': 'Camera not found'} for _ in encodings]
             
             user = User.query.get(camera.user_id)
             if not user:
-                return {'is_known': False, 'error': 'User not found'}
+                return [{'is_known': False, 'error': 'User not found'} for _ in encodings]
             
-            # Get all face persons for this user
-            face_persons = FacePerson.query.filter_by(user_id=user.id).all()
+            gallery = FaceRecognitionService.get_gallery(user.id)
             
-            if not face_persons:
-                return {
-                    'is_known': False,
-                    'message': 'No enrolled persons for this camera',
-                    'confidence': 0.0
-                }
+            if len(gallery) == 0:
+                return [
+                    {
+                        'is_known': False,
+                        'message': 'No enrolled persons for this camera',
+                        'confidence': 0.0
+                    }
+                    for _ in encodings
+                ]
             
-            best_match = None
-            best_distance = float('inf')
+            matches = FaceRecognitionService.match_gallery_batch(encodings, gallery)
             
-            # Compare against all enrolled persons
-            for person in face_persons:
-                encodings = FaceEncoding.query.filter_by(person_id=person.id).all()
-                
-                if not encodings:
-                    continue
-                
-                known_encodings = [enc.encoding for enc in encodings]
-                match_result = FaceRecognitionService.find_closest_match(
-                    test_encoding, known_encodings
-                )
+            # One query for every matched person
+            matched_ids = {m['person_id'] for m in matches if m['is_match']}
+            persons = {}
+            if matched_ids:
+                persons = {
+                    p.id: p for p in FacePerson.query.filter(FacePerson.id.in_(matched_ids)).all()
+                }
+            
+            results = []
+            for match_result in matches:
+                best_match = persons.get(match_result['person_id']) if match_result['is_match'] else None
                 
-                if match_result['is_match'] and match_result['distance'] < best_distance:
-                    best_match = person
-                    best_distance = match_result['distance']
+                if best_match:
+                    results.append({
+                        'is_known': True,
+                        'person_id': best_match.id,
+                        'person_name': best_match.name,
+                        'confidence': 1.0 - match_result['distance'],
+                        'relation': best_match.relation,
+                        'is_resident': best_match.is_resident
+                    })
+                else:
+                    results.append({
+                        'is_known': False,
+                        'confidence': 0.0,
+                        'message': 'Face does not match any enrolled person'
+                    })
             
-            if best_match:
-                return {
-                    'is_known': True,
-                    'person_id': best_match.id,
-                    'person_name': best_match.name,
-                    'confidence': 1.0 - best_distance,
-                    'relation': best_match.relation,
-                    'is_resident': best_match.is_resident
-                }
-            else:
-                return {
-                    'is_known': False,
-                    'confidence': 0.0,
-                    'message': 'Face does not match any enrolled person'
-                }
+            return results
         
         except Exception as e:
-            return {'is_known': False, 'error': f'Recognition error: {str(e)}'}
+            return [{'is_known': False, 'error': f'Recognition error: {str(e)}'} for _ in encodings]
+    
+    @staticmethod
+    def recognize_frame(camera_id: int, rgb_image, timeout: float = None, access_control: bool = False) -> list:
+        """
+        Locate, encode and recognize every face in an RGB image
+        Faces whose crop matches one seen on this camera within
+        FACE_RECOGNITION_CACHE_TTL reuse the cached result and are not encoded;
+        with access_control (results drive the door) only exact crop hashes match
+        Returns [{'location': tuple, 'recognition': dict, 'cached': bool}]
+        (at most MAX_FACES_PER_FRAME); raises TimeoutError like the encoding pool
+        """
+        from app.services.face_encoding_pool import get_encoding_pool
+        
+        pool = get_encoding_pool()
+        cache = get_recognition_cache()
+        
+        locations = FaceRecognitionService.locate_faces_for_camera(camera_id, rgb_image, timeout=timeout)
+        locations = [tuple(location) for location in locations[:FaceRecognitionService._max_faces_per_frame()]]
+        
+        hashes = [face_crop_hash(rgb_image, location) for location in locations]
+        max_distance = 0 if access_control else None
+        results = [cache.get(camera_id, phash, max_distance) for phash in hashes]
+        misses = [i for i, result in enumerate(results) if result is None]
+        
+        if misses:
+            start = time.perf_counter()
+            encodings = pool.encode_locations(rgb_image, [locations[i] for i in misses], timeout=timeout)
+            recognitions = FaceRecognitionService.recognize_faces_batch(camera_id, encodings)
+            cost = (time.perf_counter() - start) / len(misses)
+            
+            for i, recognition in zip(misses, recognitions):
+                results[i] = recognition
+                if 'error' not in recognition:
+                    cache.put(camera_id, hashes[i], recognition, cost)
+        
+        return [
+            {'location': location, 'recognition': result, 'cached': i not in misses}
+            for i, (location, result) in enumerate(zip(locations, results))
+        ]
+    
+    @staticmethod
+    def _max_faces_per_frame() -> int:
+        return FaceRecognitionService._config('MAX_FACES_PER_FRAME', 5)
+    
+    @staticmethod
+    def _gallery_signature(user_id: int) -> tuple:
+        """
+        Cheap (count, max id) fingerprint of a user's enrolled encodings and prototypes.
+        Lets every worker process notice enrollments and compactions made elsewhere.
+        """
+        def scalar(aggregate, model):
+            return db.select(aggregate(model.id)).join(FacePerson).where(
+                FacePerson.user_id == user_id
+            ).scalar_subquery()
+        
+        # One round trip, each aggregate its own scalar subquery (no FROM clause to cross join)
+        return tuple(db.session.execute(db.select(
+            scalar(db.func.count, FaceEncoding), scalar(db.func.max, FaceEncoding),
+            scalar(db.func.count, FacePrototype), scalar(db.func.max, FacePrototype)
+        )).one())
+    
+    @staticmethod
+    def _config(key: str, default=None):
+        if has_app_context():
+            return current_app.config.get(key, default)
+        return default
+    
+    @staticmethod
+    def _new_gallery_index(size: int) -> GalleryIndex:
+        """Pick the gallery backend: 'exact', 'ivf', or 'auto' (ivf for large galleries)"""
+        backend = FaceRecognitionService._config('FACE_GALLERY_BACKEND', 'auto')
+        if backend == 'auto':
+            min_size = FaceRecognitionService._config('FACE_GALLERY_IVF_MIN_SIZE', 5000)
+            backend = 'ivf' if size >= min_size else 'exact'
+        return create_gallery_index(
+            backend, nprobe=FaceRecognitionService._config('FACE_GALLERY_IVF_NPROBE', 8)
+        )
+    
+    @staticmethod
+    def _gallery_path(user_id: int):
+        directory = FaceRecognitionService._config('FACE_GALLERY_PATH')
+        if not directory:
+            return None
+        return os.path.join(directory, f'user_{user_id}.npz')
+    
+    @staticmethod
+    def _save_gallery(user_id: int, index: GalleryIndex):
+        path = FaceRecognitionService._gallery_path(user_id)
+        if not path:
+            return
+        try:
+            index.save(path)
+        except Exception as e:
+            print(f"Error saving face gallery for user {user_id}: {str(e)}")
+    
+    @staticmethod
+    def _gallery_rows(user_id: int) -> list:
+        """
+        (person_id, packed encoding) rows to match against: the prototypes of
+        compacted persons, and every raw encoding of everyone else. A person
+        whose raw encodings changed since compaction falls back to raw rows.
+        """
+        raw_rows = db.session.query(FaceEncoding.person_id, FaceEncoding.encoding)\
+            .join(FacePerson)\
+            .filter(FacePerson.user_id == user_id)\
+            .order_by(FaceEncoding.id)\
+            .all()
+        prototype_rows = db.session.query(FacePrototype.person_id, FacePrototype.encoding, FacePrototype.weight)\
+            .join(FacePerson)\
+            .filter(FacePerson.user_id == user_id)\
+            .order_by(FacePrototype.id)\
+            .all()
+        if not prototype_rows:
+            return raw_rows
+        
+        raw_counts, weights = {}, {}
+        for person_id, _ in raw_rows:
+            raw_counts[person_id] = raw_counts.get(person_id, 0) + 1
+        for person_id, _, weight in prototype_rows:
+            weights[person_id] = weights.get(person_id, 0) + weight
+        compacted = {pid for pid, weight in weights.items() if raw_counts.get(pid) == weight}
+        
+        return [(pid, enc) for pid, enc, _ in prototype_rows if pid in compacted] + \
+               [(pid, enc) for pid, enc in raw_rows if pid not in compacted]
+    
+    @staticmethod
+    def _load_gallery(user_id: int, signature: tuple) -> GalleryIndex:
+        """
+        Load a user's gallery index, from disk when the persisted copy is current,
+        otherwise from the user's prototypes and encodings (see _gallery_rows)
+        """
+        path = FaceRecognitionService._gallery_path(user_id)
+        if path and os.path.exists(path):
+            try:
+                index = GalleryIndex.load(path)
+                if index.signature == signature:
+                    return index
+            except Exception as e:
+                print(f"Error loading face gallery {path}: {str(e)}")
+        
+        rows = FaceRecognitionService._gallery_rows(user_id)
+        
+        # Packed rows concatenate straight into the (N, 128) matrix
+        matrix = FaceEncoding.unpack(b''.join(bytes(enc) for _, enc in rows))\
+            .astype(np.float32, copy=False)\
+            .reshape(-1, FaceRecognitionService.ENCODING_SIZE)
+        person_ids = np.fromiter((pid for pid, _ in rows), dtype=np.int64, count=len(rows))
+        
+        index = FaceRecognitionService._new_gallery_index(len(rows))
+        index.build(matrix, person_ids)
+        index.signature = signature
+        FaceRecognitionService._save_gallery(user_id, index)
+        return index
+    
+    @staticmethod
+    def get_gallery(user_id: int) -> GalleryIndex:
+        """Get the resident gallery index for a user, building it lazily"""
+        signature = FaceRecognitionService._gallery_signature(user_id)
+        
+        with FaceRecognitionService._gallery_lock:
+            gallery = FaceRecognitionService._galleries.get(user_id)
+        
+        if gallery is not None and gallery.signature == signature:
+            return gallery
+        
+        gallery = FaceRecognitionService._load_gallery(user_id, signature)
+        
+        with FaceRecognitionService._gallery_lock:
+            FaceRecognitionService._galleries[user_id] = gallery
+        
+        return gallery
+    
+    @staticmethod
+    def _update_gallery(user_id: int, mutate, encodings: int = 0, prototypes: int = 0):
+        """
+        Apply an incremental add/remove to a cached gallery and persist it
+        encodings / prototypes are the row counts the committed change added (negative: removed).
+        The new signature is only adopted when it differs from the cached one by exactly that
+        change; rows committed elsewhere in the meantime drop the gallery so it is rebuilt.
+        Galleries not yet cached are simply built on their next use
+        """
+        get_recognition_cache().clear()
+        try:
+            signature = FaceRecognitionService._gallery_signature(user_id)
+            with FaceRecognitionService._gallery_lock:
+                gallery = FaceRecognitionService._galleries.get(user_id)
+                if gallery is None:
+                    return
+                previous = gallery.signature
+                if previous is None or (signature[0], signature[2]) != (previous[0] + encodings,
+                                                                         previous[2] + prototypes):
+                    FaceRecognitionService._galleries.pop(user_id, None)
+                    return
+                mutate(gallery)
+                gallery.signature = signature
+            FaceRecognitionService._save_gallery(user_id, gallery)
+        except Exception as e:
+            print(f"Error updating face gallery for user {user_id}: {str(e)}")
+            FaceRecognitionService.invalidate_gallery(user_id)
+    
+    @staticmethod
+    def invalidate_gallery(user_id: int = None):
+        """Drop the cached gallery for a user (or for everyone)"""
+        get_recognition_cache().clear()
+        with FaceRecognitionService._gallery_lock:
+            if user_id is None:
+                FaceRecognitionService._galleries.clear()
+            else:
+                FaceRecognitionService._galleries.pop(user_id, None)
+    
+    @staticmethod
+    def match_gallery(test_encoding, gallery: GalleryIndex) -> dict:
+        """
+        Match one encoding against a whole gallery
+        Returns {'person_id': int, 'distance': float, 'confidence': float, 'is_match': bool}
+        """
+        return FaceRecognitionService.match_gallery_batch([test_encoding], gallery)[0]
+    
+    @staticmethod
+    def match_gallery_batch(test_encodings: list, gallery: GalleryIndex) -> list:
+        """
+        Match M encodings against a gallery in one index search
+        Returns one match_gallery-style dict per encoding
+        """
+        if len(gallery) == 0:
+            return [
+                {'person_id': None, 'distance': 1.0, 'confidence': 0.0, 'is_match': False}
+                for _ in test_encodings
+            ]
+        
+        queries = FaceRecognitionService._stack_encodings(test_encodings).astype(np.float32, copy=False)
+        distances, person_ids = gallery.search(queries)
+        
+        return [
+            {
+                'person_id': int(person_id),
+                'distance': float(distance),
+                'confidence': 1.0 - float(distance),
+                'is_match': float(distance) <= FaceRecognitionService.FACE_MATCH_TOLERANCE
+            }
+            for distance, person_id in zip(distances, person_ids)
+        ]
     
     @staticmethod
     def log_access(camera_id: int, test_encoding: list, image_path: str = None,
@@ -333,11 +706,16 @@ class FaceRecognitionService:
             return {'access_granted': False, 'error': f'Error logging access: {str(e)}'}
     
     @staticmethod
-    def get_enrolled_persons(user_id: int) -> list:
-        """Get all enrolled persons for a user"""
+    def get_enrolled_persons(user_id: int, include_encodings: bool = False) -> list:
+        """
+        Get all enrolled persons for a user
+        With include_encodings, each person also carries zero-copy float32
+        views over their stored encodings (not JSON serializable)
+        """
         persons = FacePerson.query.filter_by(user_id=user_id).all()
-        return [
-            {
+        results = []
+        for p in persons:
+            person_data = {
                 'id': p.id,
                 'name': p.name,
                 'relation': p.relation,
@@ -347,8 +725,10 @@ class FaceRecognitionService:
                 'recognition_count': p.recognition_count,
                 'last_recognized': p.last_recognized.isoformat() if p.last_recognized else None
             }
-            for p in persons
-        ]
+            if include_encodings:
+                person_data['encodings'] = [enc.vector for enc in p.face_encodings]
+            results.append(person_data)
+        return results
     
     @staticmethod
     def delete_enrolled_person(person_id: int, user_id: int) -> dict:
@@ -358,8 +738,11 @@ class FaceRecognitionService:
             if not person:
                 return {'success': False, 'message': 'Person not found'}
             
+            encodings, prototypes = person.face_encodings.count(), person.face_prototypes.count()
             db.session.delete(person)
             db.session.commit()
+            FaceRecognitionService._update_gallery(user_id, lambda index: index.remove(person_id),
+                                                   encodings=-encodings, prototypes=-prototypes)
             
             return {'success': True, 'message': f'Deleted {person.name} from enrollment'}
         except Exception as e:
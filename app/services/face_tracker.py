@@ -0,0 +1,131 @@
+"""
+Face Tracker
+IoU tracking of face boxes across the frames of one camera stream
+
+Each track is recognised once when it appears (and re-verified every
+FACE_TRACK_REVERIFY_SECONDS); later frames inherit its identity, so a
+person standing at the door costs one encode per visit instead of one per
+frame.
+"""
+
+import threading
+import time
+import numpy as np
+
+
+def box_iou(boxes_a, boxes_b) -> np.ndarray:
+    """(len(a), len(b)) IoU matrix of (top, right, bottom, left) boxes"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+class FaceTrack:
+    """One face followed across frames"""
+
+    def __init__(self, track_id: int, location: tuple, now: float):
+        self.track_id = track_id
+        self.location = tuple(location)
+        self.first_seen = now
+        self.last_seen = now
+        self.last_verified = None
+        self.recognition = None
+        self.access_log_id = None
+        self.frames = 1
+
+    def to_dict(self) -> dict:
+        return {
+            'track_id': self.track_id,
+            'location': self.location,
+            'recognition': self.recognition,
+            'access_log_id': self.access_log_id,
+            'frames': self.frames
+        }
+
+
+class FaceTracker:
+    """Greedy IoU tracker for the faces of one camera"""
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: float = 2.0, reverify_interval: float = 10.0):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.reverify_interval = reverify_interval
+        self.tracks = {}
+        self.lock = threading.Lock()
+        self._next_id = 1
+        self.faces_seen = 0
+        self.recognitions = 0
+
+    @classmethod
+    def from_config(cls, config) -> 'FaceTracker':
+        return cls(
+            iou_threshold=config.get('FACE_TRACK_IOU_THRESHOLD', 0.3),
+            max_age=config.get('FACE_TRACK_MAX_AGE', 2.0),
+            reverify_interval=config.get('FACE_TRACK_REVERIFY_SECONDS', 10.0)
+        )
+
+    def update(self, locations: list, now: float = None) -> list:
+        """
+        Match this frame's face boxes to live tracks
+        Returns one FaceTrack per location, in order; unmatched boxes start new tracks
+        and tracks unseen for longer than max_age are dropped
+        """
+        now = time.monotonic() if now is None else now
+        for track_id in [tid for tid, track in self.tracks.items() if now - track.last_seen > self.max_age]:
+            del self.tracks[track_id]
+
+        live = list(self.tracks.values())
+        assigned = [None] * len(locations)
+
+        if live and locations:
+            iou = box_iou(locations, [track.location for track in live])
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                i, j = np.unravel_index(flat, iou.shape)
+                if iou[i, j] < self.iou_threshold:
+                    break
+                if assigned[i] is None and live[j] is not None:
+                    assigned[i], live[j] = live[j], None
+
+        for i, location in enumerate(locations):
+            track = assigned[i]
+            if track is None:
+                track = FaceTrack(self._next_id, location, now)
+                self.tracks[track.track_id] = track
+                self._next_id += 1
+                assigned[i] = track
+            else:
+                track.location = tuple(location)
+                track.last_seen = now
+                track.frames += 1
+
+        self.faces_seen += len(locations)
+        return assigned
+
+    def needs_recognition(self, track: FaceTrack, now: float = None) -> bool:
+        """New tracks and tracks not verified for reverify_interval seconds"""
+        if track.last_verified is None:
+            return True
+        now = time.monotonic() if now is None else now
+        return now - track.last_verified >= self.reverify_interval
+
+    def mark_recognized(self, track: FaceTrack, recognition: dict, now: float = None):
+        track.recognition = recognition
+        track.last_verified = time.monotonic() if now is None else now
+        self.recognitions += 1
+
+    def stats(self) -> dict:
+        return {
+            'active_tracks': len(self.tracks),
+            'faces_seen': self.faces_seen,
+            'recognitions': self.recognitions
+        }
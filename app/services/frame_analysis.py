@@ -0,0 +1,332 @@
+"""
+Frame Analysis Engine
+Runs the enabled detection stages of a camera on one frame, sharing the
+preprocessed intermediates (grayscale, DNN blob) between them instead of
+every detector converting the frame again. Motion detection smooths its own
+downscaled copy of the grayscale frame inside MotionEngine.
+
+With MOTION_GATED_INFERENCE the object and face detectors only run when
+CameraService finds motion, on padded crops of the motion regions when those
+cover a small part of the frame, and on the full frame at least every
+MOTION_GATE_HEARTBEAT seconds; all other frames skip inference.
+
+A camera's detection_roi narrows every detector to the bounding box of its
+ROI polygons and drops detections outside them. The face stage's Haar pass
+runs once per frame, bounded by the camera's learned face sizes; the object
+stage's no-weights fallback keeps its own unbounded cascade settings.
+"""
+
+import threading
+import time
+from datetime import datetime
+from functools import cached_property
+import cv2
+from flask import current_app, has_app_context
+from app.services.detection_roi import offset_detections, roi_for
+from app.services.metrics import track_ml_inference, track_inference_skipped
+
+DNN_INPUT_SIZE = (416, 416)
+
+
+class FrameContext:
+    """One decoded BGR frame and its lazily built, cached intermediates"""
+
+    def __init__(self, frame, camera_id=None, offset: tuple = (0, 0)):
+        self.bgr = frame
+        self.camera_id = camera_id
+        self.offset = offset
+        self.detector = None
+        # (min, max) Haar face size in pixels, None = unbounded
+        self.face_sizes = (None, None)
+        self._blobs = {}
+        self._memo = {}
+
+    @property
+    def height(self) -> int:
+        return self.bgr.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.bgr.shape[1]
+
+    @cached_property
+    def gray(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+
+    def blob(self, size: tuple = DNN_INPUT_SIZE, scale: float = 1 / 255.0, swap_rb: bool = True,
+             mean: tuple = (0, 0, 0)):
+        """NCHW DNN input blob, built once per (size, scale, swap_rb, mean)"""
+        key = (tuple(size), scale, swap_rb, tuple(mean))
+        if key not in self._blobs:
+            self._blobs[key] = cv2.dnn.blobFromImage(self.bgr, scale, tuple(size), tuple(mean),
+                                                     swapRB=swap_rb, crop=False)
+        return self._blobs[key]
+
+    def memo(self, key, compute):
+        """compute() once per frame context; later callers get the cached result"""
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def crop(self, box: tuple) -> 'FrameContext':
+        """Context for an (x, y, w, h) box of this frame, reusing its grayscale if already built"""
+        x, y, w, h = box
+        child = FrameContext(self.bgr[y:y + h, x:x + w], self.camera_id,
+                             (self.offset[0] + x, self.offset[1] + y))
+        child.detector = self.detector
+        child.face_sizes = self.face_sizes
+        if 'gray' in self.__dict__:
+            child.__dict__['gray'] = self.gray[y:y + h, x:x + w]
+        return child
+
+
+def merge_boxes(boxes: list) -> list:
+    """Union overlapping (x, y, w, h) boxes until none overlap"""
+    boxes = [tuple(box) for box in boxes]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                ax, ay, aw, ah = boxes[i]
+                bx, by, bw, bh = boxes[j]
+                if ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah:
+                    x, y = min(ax, bx), min(ay, by)
+                    boxes[i] = (x, y, max(ax + aw, bx + bw) - x, max(ay + ah, by + bh) - y)
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+def motion_crops(regions: list, width: int, height: int, padding: int = 32) -> list:
+    """Padded, merged (x, y, w, h) crops around CameraService.get_motion_regions output"""
+    boxes = []
+    for region in regions:
+        x0 = max(0, region['x'] - padding)
+        y0 = max(0, region['y'] - padding)
+        x1 = min(width, region['x'] + region['width'] + padding)
+        y1 = min(height, region['y'] + region['height'] + padding)
+        boxes.append((x0, y0, x1 - x0, y1 - y0))
+    return merge_boxes(boxes)
+
+
+class FrameAnalysisEngine:
+    """
+    Per-frame pipeline over CameraService and MLService
+    Stages run in order and are gated by the camera's detection flags:
+    motion (motion_enabled), objects (object_detection_enabled),
+    faces (face_detection_enabled)
+    """
+
+    STAGES = (
+        ('motion', 'motion_enabled'),
+        ('objects', 'object_detection_enabled'),
+        ('faces', 'face_detection_enabled')
+    )
+    DETECTOR_STAGES = ('objects', 'faces')
+
+    def __init__(self, camera_service, ml_service):
+        self.camera_service = camera_service
+        self.ml_service = ml_service
+        self._hooks = [self._record_stage_metric]
+        self._lock = threading.Lock()
+        self._last_full_frame = {}
+        self._stats = {}
+
+    def add_stage_hook(self, hook):
+        """hook(stage, seconds, context) is called after every stage that ran"""
+        self._hooks.append(hook)
+
+    def remove_stage_hook(self, hook):
+        if hook in self._hooks:
+            self._hooks.remove(hook)
+
+    @staticmethod
+    def _record_stage_metric(stage, seconds, context):
+        track_ml_inference(stage, seconds)
+
+    @staticmethod
+    def _gate_settings() -> dict:
+        config = current_app.config if has_app_context() else {}
+        return {
+            'enabled': config.get('MOTION_GATED_INFERENCE', False),
+            'heartbeat': config.get('MOTION_GATE_HEARTBEAT', 30.0),
+            'crop_max_area': config.get('MOTION_GATE_CROP_MAX_AREA', 0.5),
+            'crop_padding': config.get('MOTION_GATE_CROP_PADDING', 32)
+        }
+
+    def analyze(self, camera, frame) -> dict:
+        """
+        Analyse one BGR frame for a Camera row
+        Returns {'motion', 'objects', 'faces', 'timestamp', 'timings' (ms per stage)};
+        gated analysis adds 'motion_regions' and 'gate'
+        """
+        context = FrameContext(frame, camera.id)
+        results = {
+            'motion': False,
+            'objects': [],
+            'faces': [],
+            'timestamp': datetime.utcnow().isoformat(),
+            'timings': {}
+        }
+        detectors = [
+            stage for stage, flag in self.STAGES
+            if stage in self.DETECTOR_STAGES and getattr(camera, flag, False)
+        ]
+
+        if 'objects' in detectors:
+            context.detector = self.ml_service.detector_for(camera)
+        context.face_sizes = (getattr(camera, 'face_min_size', None), getattr(camera, 'face_max_size', None))
+        roi = roi_for(getattr(camera, 'detection_roi', None), context.width, context.height)
+
+        gate = self._gate_settings()
+        if gate['enabled'] and detectors:
+            # Motion regions drive the gate; they are only reported as motion when the camera reports motion
+            regions = self._timed('motion', context, results, lambda: self._run_motion_regions(context))
+            if getattr(camera, 'motion_enabled', False):
+                results['motion'] = bool(regions)
+            results['motion_regions'] = regions
+            targets = self._gate(context, regions, detectors, gate, results)
+        else:
+            if getattr(camera, 'motion_enabled', False):
+                results['motion'] = self._timed('motion', context, results, lambda: self._run_motion(context))
+            targets = [context]
+
+        if roi is not None:
+            targets = self._restrict(targets, roi)
+
+        for stage in detectors:
+            if not targets:
+                continue
+            run = getattr(self, f'_run_{stage}')
+            detections = self._timed(stage, context, results, lambda: [
+                detection for target in targets
+                for detection in offset_detections(run(target), *target.offset)
+            ])
+            results[stage] = roi.filter(detections) if roi is not None else detections
+
+        return results
+
+    def _timed(self, stage, context, results, run):
+        start = time.perf_counter()
+        value = run()
+        elapsed = time.perf_counter() - start
+
+        results['timings'][stage] = round(elapsed * 1000, 2)
+        for hook in self._hooks:
+            hook(stage, elapsed, context)
+        return value
+
+    def _gate(self, context, regions, detectors, gate, results) -> list:
+        """Contexts the detectors should run on for this frame (empty = skip inference)"""
+        camera_id = context.camera_id
+        now = time.monotonic()
+        crops = []
+        if regions:
+            crops = motion_crops(regions, context.width, context.height, gate['crop_padding'])
+            if sum(w * h for _, _, w, h in crops) > gate['crop_max_area'] * context.width * context.height:
+                crops = []
+
+        with self._lock:
+            stats = self._camera_stats(camera_id)
+            stats['frames'] += 1
+            last_full = self._last_full_frame.get(camera_id)
+            heartbeat_due = last_full is None or now - last_full >= gate['heartbeat']
+
+            if heartbeat_due:
+                decision, targets = 'heartbeat', [context]
+            elif not regions:
+                decision, targets = 'skipped', []
+            elif crops:
+                decision, targets = 'crops', [context.crop(box) for box in crops]
+            else:
+                decision, targets = 'motion', [context]
+
+            if decision == 'skipped':
+                stats['skipped'] += len(detectors)
+            else:
+                stats['inferences'] += len(detectors)
+            if decision == 'crops':
+                stats['cropped'] += len(detectors)
+            elif decision != 'skipped':
+                self._last_full_frame[camera_id] = now
+
+        if decision == 'skipped':
+            for stage in detectors:
+                track_inference_skipped(camera_id, stage)
+        results['gate'] = {'decision': decision, 'crops': len(crops) if decision == 'crops' else 0}
+        return targets
+
+    def _camera_stats(self, camera_id) -> dict:
+        stats = self._stats.get(camera_id)
+        if stats is None:
+            stats = self._stats[camera_id] = {'frames': 0, 'inferences': 0, 'skipped': 0, 'cropped': 0}
+        return stats
+
+    def stats(self, camera_id) -> dict:
+        """Motion gating counters: gated frames, detector runs, skipped runs, runs on crops"""
+        with self._lock:
+            return dict(self._stats.get(camera_id, {'frames': 0, 'inferences': 0, 'skipped': 0, 'cropped': 0}))
+
+    def clear_camera(self, camera_id):
+        with self._lock:
+            self._stats.pop(camera_id, None)
+            self._last_full_frame.pop(camera_id, None)
+
+    @staticmethod
+    def _restrict(targets: list, roi) -> list:
+        """Targets cropped to the ROI's bounding box; targets outside it are dropped"""
+        restricted = []
+        for target in targets:
+            ox, oy = target.offset
+            box = roi.restrict((ox, oy, target.width, target.height))
+            if box is None:
+                continue
+            x, y, w, h = box
+            if (x, y, w, h) == (ox, oy, target.width, target.height):
+                restricted.append(target)
+            else:
+                restricted.append(target.crop((x - ox, y - oy, w, h)))
+        return restricted
+
+    def _run_motion(self, context: FrameContext):
+        return self.camera_service.detect_motion(context.camera_id, context.bgr, gray=context.gray)
+
+    def _run_motion_regions(self, context: FrameContext):
+        return self.camera_service.get_motion_regions(context.camera_id, context.bgr, gray=context.gray)
+
+    def _haar_faces(self, context: FrameContext) -> list:
+        min_size, max_size = context.face_sizes
+        return context.memo('haar_faces', lambda: self.ml_service.detect_faces(
+            context.bgr, gray=context.gray, min_size=min_size, max_size=max_size
+        ))
+
+    def _run_objects(self, context: FrameContext):
+        # The Haar fallback (no detector weights) needs the grayscale, a DNN backend its own blob
+        backend = context.detector
+        if backend is None:
+            return self.ml_service.detect_objects(context.bgr, gray=context.gray)
+        size, scale, swap_rb, mean = backend.blob_params()
+        return self.ml_service.detect_objects(context.bgr, blob=context.blob(size, scale, swap_rb, mean),
+                                              backend=backend)
+
+    def _run_faces(self, context: FrameContext):
+        return self._haar_faces(context)
+
+
+_analysis_engine = None
+_analysis_engine_lock = threading.Lock()
+
+
+def get_analysis_engine() -> FrameAnalysisEngine:
+    """Process-wide FrameAnalysisEngine over the shared CameraService and MLService"""
+    global _analysis_engine
+    with _analysis_engine_lock:
+        if _analysis_engine is None:
+            from app.services.camera_service import get_camera_service
+            from app.services.ml_service import get_ml_service
+            _analysis_engine = FrameAnalysisEngine(get_camera_service(), get_ml_service())
+        return _analysis_engine
@@ -0,0 +1,204 @@
+"""
+Frame Ingestion
+Bounded per-camera frame buffers between the Socket.IO handlers and frame
+analysis
+
+Each camera gets a ring buffer of FRAME_BUFFER_SIZE frames: when analysis
+falls behind, the oldest frame is dropped instead of the socket stalling.
+A small worker pool analyses the newest buffered frame of each camera (older
+ones are stale and dropped); a camera is only ever analysed by one worker at
+a time, so its frames are handled in order.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+from collections import deque
+from flask import current_app, has_app_context
+from app.services.metrics import track_frame_received, track_frames_dropped, update_frame_queue_depth
+
+logger = logging.getLogger(__name__)
+
+
+class FrameIngestion:
+    """Drop-oldest frame buffers drained by a worker pool"""
+
+    def __init__(self, handler, workers: int = 2, buffer_size: int = 2, app=None):
+        """
+        handler(camera_id, frame) analyses one frame; it runs in a worker thread
+        (inside app's context when app is given), or inline in the caller's
+        context when workers is 0
+        """
+        self.handler = handler
+        self.workers = workers
+        self.buffer_size = max(1, buffer_size)
+        self.app = app
+        self._buffers = {}
+        self._stats = {}
+        self._scheduled = set()
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopping = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def start(self):
+        with self._lock:
+            if self._threads or not self.enabled:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'frame-ingestion-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f'Started frame ingestion with {self.workers} workers')
+
+    def submit(self, camera_id, frame) -> bool:
+        """
+        Buffer a frame for analysis
+        Returns False when the buffer was full and its oldest frame was dropped
+        """
+        track_frame_received(camera_id)
+        if not self.enabled:
+            with self._lock:
+                stats = self._camera_stats(camera_id)
+                stats['received'] += 1
+                stats['processed'] += 1
+            self._run(camera_id, frame)
+            return True
+
+        with self._lock:
+            buffer = self._buffers.get(camera_id)
+            if buffer is None:
+                buffer = self._buffers[camera_id] = deque(maxlen=self.buffer_size)
+            stats = self._camera_stats(camera_id)
+            stats['received'] += 1
+
+            overflow = len(buffer) == buffer.maxlen
+            if overflow:
+                stats['dropped'] += 1
+            buffer.append(frame)
+            depth = len(buffer)
+
+            schedule = camera_id not in self._scheduled
+            if schedule:
+                self._scheduled.add(camera_id)
+
+        if overflow:
+            track_frames_dropped(camera_id, 'overflow')
+        update_frame_queue_depth(camera_id, depth)
+        if schedule:
+            self.start()
+            self._ready.put(camera_id)
+        return not overflow
+
+    def _camera_stats(self, camera_id) -> dict:
+        stats = self._stats.get(camera_id)
+        if stats is None:
+            stats = self._stats[camera_id] = {'received': 0, 'dropped': 0, 'processed': 0}
+        return stats
+
+    def _take_latest(self, camera_id):
+        """Newest buffered frame of a camera; older ones are stale and dropped"""
+        with self._lock:
+            buffer = self._buffers.get(camera_id)
+            if not buffer:
+                self._scheduled.discard(camera_id)
+                return None, 0
+            frame = buffer.pop()
+            stale = len(buffer)
+            buffer.clear()
+            stats = self._camera_stats(camera_id)
+            stats['dropped'] += stale
+            stats['processed'] += 1
+
+        if stale:
+            track_frames_dropped(camera_id, 'stale', stale)
+        update_frame_queue_depth(camera_id, 0)
+        return frame, stale
+
+    def _work(self):
+        while True:
+            camera_id = self._ready.get()
+            if camera_id is None or self._stopping:
+                break
+
+            frame, _ = self._take_latest(camera_id)
+            if frame is None:
+                continue
+            self._run(camera_id, frame)
+
+            # Frames that arrived meanwhile: queue the camera again, behind the others
+            with self._lock:
+                pending = bool(self._buffers.get(camera_id))
+                if not pending:
+                    self._scheduled.discard(camera_id)
+            if pending:
+                self._ready.put(camera_id)
+
+    def _run(self, camera_id, frame):
+        try:
+            if self.app is not None and not has_app_context():
+                with self.app.app_context():
+                    self.handler(camera_id, frame)
+            else:
+                self.handler(camera_id, frame)
+        except Exception as e:
+            logger.error(f'Frame analysis failed for camera {camera_id}: {e}')
+
+    def discard(self, camera_id):
+        """Drop a camera's buffered frames and stats (stream unregistered)"""
+        with self._lock:
+            self._buffers.pop(camera_id, None)
+            self._stats.pop(camera_id, None)
+        update_frame_queue_depth(camera_id, 0)
+
+    def stats(self, camera_id) -> dict:
+        with self._lock:
+            stats = dict(self._stats.get(camera_id, {'received': 0, 'dropped': 0, 'processed': 0}))
+            stats['queue_depth'] = len(self._buffers.get(camera_id, ()))
+        return stats
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            threads, self._threads = self._threads, []
+            self._stopping = True
+        for _ in threads:
+            self._ready.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+
+_ingestion = None
+_ingestion_lock = threading.Lock()
+
+
+def get_frame_ingestion() -> FrameIngestion:
+    """The process-wide camera frame ingestion, configured from the current app"""
+    global _ingestion
+    with _ingestion_lock:
+        if _ingestion is None:
+            from app.services.camera_stream_manager import CameraStreamManager
+            config = current_app.config if has_app_context() else {}
+            _ingestion = FrameIngestion(
+                CameraStreamManager.analyze_frame,
+                workers=config.get('FRAME_INGESTION_WORKERS', 2),
+                buffer_size=config.get('FRAME_BUFFER_SIZE', 2),
+                app=current_app._get_current_object() if has_app_context() else None
+            )
+        return _ingestion
+
+
+def stop_frame_ingestion():
+    global _ingestion
+    with _ingestion_lock:
+        ingestion, _ingestion = _ingestion, None
+    if ingestion is not None:
+        ingestion.stop()
+
+
+atexit.register(stop_frame_ingestion)
@@ -0,0 +1,288 @@
+"""
+Frame Relay
+Fans live camera frames out to the viewers watching them
+
+Viewers pick a quality tier when they watch a camera:
+- full: the camera's own encoded frame, passed through untouched
+- sd / thumb: JPEG re-encoded at FRAME_RELAY_SD_WIDTH / FRAME_RELAY_THUMB_WIDTH
+
+A frame is decoded at most once (at a reduced JPEG scale when the tiers
+allow it) and encoded at most once per tier that has viewers; every viewer
+of a tier is sent the same bytes object.
+
+Viewers that acknowledge frames (camera:watch with 'ack': true) are flow
+controlled: while FRAME_RELAY_MAX_IN_FLIGHT of their frames are
+unacknowledged, new frames skip them instead of queueing up on their socket.
+Frames not acknowledged within FRAME_RELAY_ACK_TIMEOUT seconds are written
+off. Viewers that do not acknowledge receive every frame.
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from functools import partial
+import cv2
+from flask import current_app, has_app_context
+from app.services.metrics import track_frame_relayed, track_relay_skipped
+from app.utils.frame_codec import decode_frame, frame_bytes
+
+TIER_THUMB = 'thumb'
+TIER_SD = 'sd'
+TIER_FULL = 'full'
+TIERS = (TIER_THUMB, TIER_SD, TIER_FULL)
+
+# cv2.imdecode flags that let libjpeg decode at 1/n scale
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def _socketio_emit(event, data, to, callback=None):
+    from app import socketio
+    socketio.emit(event, data, to=to, callback=callback)
+
+
+class _Viewer:
+    __slots__ = ('sid', 'tier', 'ack', 'in_flight')
+
+    def __init__(self, sid, tier: str, ack: bool):
+        self.sid = sid
+        self.tier = tier
+        self.ack = ack
+        self.in_flight = deque()
+
+
+class _TierStats:
+    __slots__ = ('frames', 'deliveries', 'skipped', 'bytes', 'frame_bytes', 'recent')
+
+    def __init__(self):
+        self.frames = 0
+        self.deliveries = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.frame_bytes = 0
+        self.recent = deque()
+
+
+class FrameRelay:
+    """Per-tier encode-once fan-out of camera frames to their viewers"""
+
+    def __init__(self, emit=None, sd_width: int = 640, thumb_width: int = 320, quality: int = 70,
+                 max_in_flight: int = 2, ack_timeout: float = 5.0, window: float = 10.0):
+        """
+        emit(event, data, to, callback) sends to one Socket.IO client (default: socketio.emit)
+        window is the period bytes_per_second is averaged over
+        """
+        self.emit = emit or _socketio_emit
+        self.widths = {TIER_SD: sd_width, TIER_THUMB: thumb_width}
+        self.quality = quality
+        self.max_in_flight = max(1, max_in_flight)
+        self.ack_timeout = ack_timeout
+        self.window = window
+        self._viewers = {}
+        self._stats = {}
+        self._source_widths = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, emit=None) -> 'FrameRelay':
+        return cls(
+            emit=emit,
+            sd_width=config.get('FRAME_RELAY_SD_WIDTH', 640),
+            thumb_width=config.get('FRAME_RELAY_THUMB_WIDTH', 320),
+            quality=config.get('FRAME_RELAY_JPEG_QUALITY', 70),
+            max_in_flight=config.get('FRAME_RELAY_MAX_IN_FLIGHT', 2),
+            ack_timeout=config.get('FRAME_RELAY_ACK_TIMEOUT', 5.0)
+        )
+
+    def add_viewer(self, camera_id, sid, tier: str = TIER_FULL, ack: bool = False):
+        """Start (or change) relaying a camera's frames to a client; raises ValueError for an unknown tier"""
+        if tier not in TIERS:
+            raise ValueError(f"quality must be one of {', '.join(TIERS)}")
+        with self._lock:
+            self._viewers.setdefault(camera_id, {})[sid] = _Viewer(sid, tier, ack)
+
+    def remove_viewer(self, sid, camera_id=None):
+        """Stop relaying to a client, for one camera or (disconnected) all of them"""
+        with self._lock:
+            camera_ids = [camera_id] if camera_id is not None else list(self._viewers)
+            for viewer_camera_id in camera_ids:
+                viewers = self._viewers.get(viewer_camera_id)
+                if viewers is None:
+                    continue
+                viewers.pop(sid, None)
+                if not viewers:
+                    del self._viewers[viewer_camera_id]
+
+    def viewers(self, camera_id) -> int:
+        with self._lock:
+            return len(self._viewers.get(camera_id, ()))
+
+    def relay(self, camera_id, frame_data, timestamp: str = None) -> dict:
+        """
+        Send a frame to every viewer of a camera that is ready for it
+        Returns {tier: viewers sent to}
+        """
+        now = time.monotonic()
+        ready, skipped = {}, {}
+        with self._lock:
+            for viewer in self._viewers.get(camera_id, {}).values():
+                while viewer.in_flight and now - viewer.in_flight[0] > self.ack_timeout:
+                    viewer.in_flight.popleft()
+                if viewer.ack and len(viewer.in_flight) >= self.max_in_flight:
+                    skipped[viewer.tier] = skipped.get(viewer.tier, 0) + 1
+                    continue
+                ready.setdefault(viewer.tier, []).append(viewer)
+
+        frames = self._encode(camera_id, frame_data, ready) if ready else {}
+        timestamp = timestamp or datetime.now(timezone.utc).isoformat()
+
+        sent = {}
+        for tier, viewers in ready.items():
+            frame = frames.get(tier)
+            if frame is None:
+                continue
+            payload = {'camera_id': camera_id, 'frame': frame, 'quality': tier, 'timestamp': timestamp}
+            for viewer in viewers:
+                callback = None
+                if viewer.ack:
+                    with self._lock:
+                        viewer.in_flight.append(now)
+                    callback = partial(self._acknowledged, viewer)
+                self.emit('camera:frame', payload, viewer.sid, callback)
+            sent[tier] = len(viewers)
+
+        self._record(camera_id, frames, sent, skipped, now)
+        return sent
+
+    def _acknowledged(self, viewer: _Viewer, *args):
+        with self._lock:
+            if viewer.in_flight:
+                viewer.in_flight.popleft()
+
+    def _encode(self, camera_id, frame_data, tiers) -> dict:
+        """{tier: encoded frame} for the requested tiers, decoding the source at most once"""
+        frames = {}
+        if TIER_FULL in tiers:
+            # Passed through in the form the camera sent it (bytes, or base64 from older clients)
+            frames[TIER_FULL] = frame_data
+
+        scaled = [tier for tier in (TIER_SD, TIER_THUMB) if tier in tiers]
+        if not scaled:
+            return frames
+
+        image = self._decode(camera_id, frame_data, max(self.widths[tier] for tier in scaled))
+        if image is None:
+            return frames
+
+        with self._lock:
+            source_width = self._source_widths[camera_id]
+        original = None
+        for tier in (TIER_SD, TIER_THUMB):
+            width = self.widths[tier]
+            if source_width <= width:
+                # Already small enough: sent as the camera encoded it
+                if tier in tiers:
+                    original = original or bytes(frame_bytes(frame_data))
+                    frames[tier] = original
+                continue
+            if image.shape[1] > width:
+                image = cv2.resize(image, (width, max(1, round(image.shape[0] * width / image.shape[1]))),
+                                   interpolation=cv2.INTER_AREA)
+            if tier in tiers:
+                ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if ok:
+                    frames[tier] = encoded.tobytes()
+        return frames
+
+    def _decode(self, camera_id, frame_data, needed_width: int):
+        """Decode a frame at the smallest JPEG scale still at least needed_width wide"""
+        with self._lock:
+            source_width = self._source_widths.get(camera_id)
+
+        if source_width:
+            for factor, flags in REDUCED_DECODE_FLAGS:
+                if source_width // factor >= needed_width:
+                    image = decode_frame(frame_data, flags)
+                    # A camera that switched to a lower resolution is decoded in full below
+                    if image is not None and image.shape[1] >= needed_width:
+                        with self._lock:
+                            self._source_widths[camera_id] = image.shape[1] * factor
+                        return image
+                    break
+
+        image = decode_frame(frame_data)
+        if image is not None:
+            with self._lock:
+                self._source_widths[camera_id] = image.shape[1]
+        return image
+
+    def _record(self, camera_id, frames: dict, sent: dict, skipped: dict, now: float):
+        with self._lock:
+            tier_stats = self._stats.setdefault(camera_id, {})
+            for tier in set(sent) | set(skipped):
+                stats = tier_stats.get(tier)
+                if stats is None:
+                    stats = tier_stats[tier] = _TierStats()
+                stats.skipped += skipped.get(tier, 0)
+                viewers = sent.get(tier, 0)
+                if viewers:
+                    size = len(frames[tier])
+                    stats.frames += 1
+                    stats.deliveries += viewers
+                    stats.frame_bytes = size
+                    stats.bytes += size * viewers
+                    stats.recent.append((now, size * viewers))
+                while stats.recent and now - stats.recent[0][0] > self.window:
+                    stats.recent.popleft()
+
+        for tier, viewers in sent.items():
+            track_frame_relayed(camera_id, tier, viewers, len(frames[tier]) * viewers)
+        for tier, count in skipped.items():
+            track_relay_skipped(camera_id, tier, count)
+
+    def stats(self, camera_id) -> dict:
+        """Viewers and bandwidth of a camera's relay, overall and per tier"""
+        now = time.monotonic()
+        with self._lock:
+            viewers = self._viewers.get(camera_id, {})
+            tiers = {}
+            for tier in TIERS:
+                stats = self._stats.get(camera_id, {}).get(tier)
+                tier_viewers = sum(1 for viewer in viewers.values() if viewer.tier == tier)
+                if stats is None and not tier_viewers:
+                    continue
+                stats = stats or _TierStats()
+                recent = sum(size for sent_at, size in stats.recent if now - sent_at <= self.window)
+                tiers[tier] = {
+                    'viewers': tier_viewers,
+                    'frames': stats.frames,
+                    'frames_sent': stats.deliveries,
+                    'frames_skipped': stats.skipped,
+                    'bytes_sent': stats.bytes,
+                    'bytes_per_second': round(recent / self.window, 1),
+                    'frame_bytes': stats.frame_bytes
+                }
+        return {
+            'viewers': len(viewers),
+            'bytes_per_second': round(sum(tier['bytes_per_second'] for tier in tiers.values()), 1),
+            'tiers': tiers
+        }
+
+    def clear_camera(self, camera_id):
+        """Forget a camera's stats and source size; its viewers stay subscribed"""
+        with self._lock:
+            self._stats.pop(camera_id, None)
+            self._source_widths.pop(camera_id, None)
+
+
+_relay = None
+_relay_lock = threading.Lock()
+
+
+def get_frame_relay() -> FrameRelay:
+    """The process-wide frame relay, configured from the current app"""
+    global _relay
+    with _relay_lock:
+        if _relay is None:
+            _relay = FrameRelay.from_config(current_app.config if has_app_context() else {})
+        return _relay
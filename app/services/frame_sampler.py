@@ -0,0 +1,190 @@
+"""
+Frame Sampler
+Decides which received camera frames are analysed, for both Socket.IO
+streams and frames POSTed to /camera/<id>/process-frame
+
+Cameras send frames at whatever rate their hardware manages, so analysis is
+paced per camera rather than per frame:
+
+- normal: every FRAME_SKIP-th frame
+- active: every FRAME_SKIP_ACTIVE-th frame for FRAME_ACTIVE_HOLD seconds
+  after an analysed frame had motion or a tracked face
+- idle: one heartbeat frame every FRAME_IDLE_INTERVAL seconds once nothing
+  has happened for FRAME_IDLE_AFTER seconds (0 = never idle)
+
+The heartbeat frames are what notice motion again and switch the camera
+back to the active rate. Camera.frame_skip, active_frame_skip and
+idle_frame_interval override the rates per camera.
+"""
+
+import threading
+import time
+from flask import current_app, has_app_context
+from app.services.metrics import track_frame_sampled
+
+MODE_NORMAL = 'normal'
+MODE_ACTIVE = 'active'
+MODE_IDLE = 'idle'
+
+# Camera columns that override the sampler defaults
+SAMPLING_SETTINGS = ('frame_skip', 'active_frame_skip', 'idle_frame_interval')
+
+
+def validate_sampling_setting(name: str, value):
+    """Value for one of SAMPLING_SETTINGS (None = use the default); raises ValueError when invalid"""
+    if value is None:
+        return None
+    if name == 'idle_frame_interval':
+        value = float(value)
+        if value < 0:
+            raise ValueError('idle_frame_interval must be 0 or more seconds')
+        return value
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(f'{name} must be a whole number of frames')
+    value = int(value)
+    if value < 1:
+        raise ValueError(f'{name} must be at least 1')
+    return value
+
+
+class _CameraSampling:
+    __slots__ = ('received', 'analysed', 'since_analysed', 'last_analysed', 'last_activity', 'first_seen', 'mode')
+
+    def __init__(self, now: float):
+        self.received = 0
+        self.analysed = 0
+        self.since_analysed = 0
+        self.last_analysed = None
+        self.last_activity = None
+        self.first_seen = now
+        self.mode = MODE_NORMAL
+
+
+class FrameSampler:
+    """Per-camera adaptive frame sampling"""
+
+    def __init__(self, frame_skip: int = 2, active_frame_skip: int = 1, idle_interval: float = 5.0,
+                 idle_after: float = 60.0, active_hold: float = 10.0, camera_settings=None):
+        """
+        camera_settings(camera_id) returns a dict with any of SAMPLING_SETTINGS;
+        None values fall back to the defaults given here
+        """
+        self.frame_skip = max(1, frame_skip)
+        self.active_frame_skip = max(1, active_frame_skip)
+        self.idle_interval = idle_interval
+        self.idle_after = idle_after
+        self.active_hold = active_hold
+        self.camera_settings = camera_settings
+        self._cameras = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, camera_settings=None) -> 'FrameSampler':
+        return cls(
+            frame_skip=config.get('FRAME_SKIP', 2),
+            active_frame_skip=config.get('FRAME_SKIP_ACTIVE', 1),
+            idle_interval=config.get('FRAME_IDLE_INTERVAL', 5.0),
+            idle_after=config.get('FRAME_IDLE_AFTER', 60.0),
+            active_hold=config.get('FRAME_ACTIVE_HOLD', 10.0),
+            camera_settings=camera_settings
+        )
+
+    def _rates(self, camera_id) -> tuple:
+        overrides = {}
+        if self.camera_settings is not None:
+            try:
+                overrides = self.camera_settings(camera_id) or {}
+            except Exception:
+                overrides = {}
+
+        def pick(name, default):
+            value = overrides.get(name)
+            return default if value is None else value
+
+        return (
+            max(1, pick('frame_skip', self.frame_skip)),
+            max(1, pick('active_frame_skip', self.active_frame_skip)),
+            pick('idle_frame_interval', self.idle_interval)
+        )
+
+    def _mode(self, state: _CameraSampling, now: float) -> str:
+        if state.last_activity is not None and now - state.last_activity <= self.active_hold:
+            return MODE_ACTIVE
+        quiet_since = state.first_seen if state.last_activity is None else state.last_activity
+        if self.idle_after and now - quiet_since > self.idle_after:
+            return MODE_IDLE
+        return MODE_NORMAL
+
+    def should_analyze(self, camera_id, now: float = None) -> bool:
+        """Count a received frame and decide whether it is analysed"""
+        now = time.monotonic() if now is None else now
+        frame_skip, active_frame_skip, idle_interval = self._rates(camera_id)
+
+        with self._lock:
+            state = self._cameras.get(camera_id)
+            if state is None:
+                state = self._cameras[camera_id] = _CameraSampling(now)
+            state.received += 1
+            state.since_analysed += 1
+            state.mode = self._mode(state, now)
+
+            if state.last_analysed is None:
+                analyse = True
+            elif state.mode == MODE_ACTIVE:
+                analyse = state.since_analysed >= active_frame_skip
+            elif state.mode == MODE_IDLE:
+                analyse = now - state.last_analysed >= idle_interval
+            else:
+                analyse = state.since_analysed >= frame_skip
+
+            if analyse:
+                state.analysed += 1
+                state.since_analysed = 0
+                state.last_analysed = now
+            mode = state.mode
+
+        track_frame_sampled(camera_id, mode, analyse)
+        return analyse
+
+    def report(self, camera_id, motion: bool = False, tracking: bool = False, now: float = None):
+        """Outcome of an analysed frame: motion or tracked faces raise the camera's rate"""
+        if not (motion or tracking):
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            state = self._cameras.get(camera_id)
+            if state is not None:
+                state.last_activity = now
+
+    def clear_camera(self, camera_id):
+        with self._lock:
+            self._cameras.pop(camera_id, None)
+
+    def stats(self, camera_id) -> dict:
+        """{'received', 'analysed', 'skipped', 'analysed_ratio', 'mode'} of a camera"""
+        with self._lock:
+            state = self._cameras.get(camera_id)
+            if state is None:
+                return {'received': 0, 'analysed': 0, 'skipped': 0, 'analysed_ratio': None, 'mode': MODE_NORMAL}
+            return {
+                'received': state.received,
+                'analysed': state.analysed,
+                'skipped': state.received - state.analysed,
+                'analysed_ratio': round(state.analysed / state.received, 3),
+                'mode': state.mode
+            }
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_frame_sampler() -> FrameSampler:
+    """The process-wide frame sampler, configured from the current app"""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            from app.services.detection_roi import camera_detection_settings
+            config = current_app.config if has_app_context() else {}
+            _sampler = FrameSampler.from_config(config, camera_settings=camera_detection_settings)
+        return _sampler
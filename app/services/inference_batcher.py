@@ -0,0 +1,132 @@
+"""
+Inference Batcher
+Micro-batching of model inputs submitted concurrently by many callers
+
+Frames from different cameras (ingestion workers, process-frame requests,
+Celery tasks) are queued; a single worker thread collects up to max_batch of
+them, or whatever arrived within max_wait of the first one, runs the model
+once on the whole batch and hands every caller its own result through a
+Future. Items still queued when the batcher stops fail with BatcherStopped.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from app.services.metrics import track_inference_batch
+
+logger = logging.getLogger(__name__)
+
+
+class BatcherStopped(RuntimeError):
+    """Set on the futures of items the batcher stopped before running"""
+
+
+class InferenceBatcher:
+    """Collects items into batches for run_batch(items) -> results (same order)"""
+
+    def __init__(self, run_batch, max_batch: int = 8, max_wait: float = 0.01, name: str = 'inference-batcher',
+                 result_timeout: float = 5.0):
+        """result_timeout is how long callers should wait on a submitted item's future"""
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.result_timeout = result_timeout
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._batches = 0
+        self._items = 0
+        self._largest = 0
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self._ensure_started()
+        self._queue.put((item, future))
+        return future
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._work, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _fail_pending(self, entries=()):
+        """Fail the given entries and everything still queued"""
+        entries = [entry for entry in entries if entry is not None]
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not None:
+                entries.append(entry)
+        for _, future in entries:
+            if not future.done():
+                future.set_exception(BatcherStopped(f'{self.name} stopped'))
+
+    def _work(self):
+        while True:
+            first = self._queue.get()
+            if first is None or self._stopping:
+                self._fail_pending([first])
+                break
+
+            batch = self._collect(first)
+            futures = [future for _, future in batch]
+            try:
+                results = self.run_batch([item for item, _ in batch])
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f'Batched inference failed ({len(batch)} items): {e}')
+                for future in futures:
+                    future.set_exception(e)
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._largest = max(self._largest, len(batch))
+            track_inference_batch(len(batch))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'batches': self._batches,
+                'items': self._items,
+                'mean_batch_size': round(self._items / self._batches, 2) if self._batches else 0.0,
+                'largest_batch': self._largest,
+                'queue_depth': self._queue.qsize()
+            }
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+        # Items submitted while the worker was shutting down
+        self._fail_pending()
+
@@ -49,6 +49,106 @@ ml_inference_duration = Histogram(
     ['model_type']
 )
 
+face_recognition_cache_lookups = Counter(
+    'safehome_face_recognition_cache_lookups_total',
+    'Face recognition cache lookups',
+    ['result']
+)
+
+face_recognition_cache_saved_seconds = Counter(
+    'safehome_face_recognition_cache_saved_seconds_total',
+    'Encode and match time avoided by face recognition cache hits'
+)
+
+camera_frames_received = Counter(
+    'safehome_camera_frames_received_total',
+    'Camera stream frames received',
+    ['camera_id']
+)
+
+camera_frames_sampled = Counter(
+    'safehome_camera_frames_sampled_total',
+    'Received camera frames by sampling mode and whether they were analysed',
+    ['camera_id', 'mode', 'outcome']
+)
+
+camera_frames_dropped = Counter(
+    'safehome_camera_frames_dropped_total',
+    'Camera stream frames dropped before analysis',
+    ['camera_id', 'reason']
+)
+
+camera_frame_queue_depth = Gauge(
+    'safehome_camera_frame_queue_depth',
+    'Frames buffered for analysis per camera',
+    ['camera_id']
+)
+
+ml_inference_skipped = Counter(
+    'safehome_ml_inference_skipped_total',
+    'Detector runs skipped by motion gating',
+    ['camera_id', 'stage']
+)
+
+ml_inference_batch_size = Histogram(
+    'safehome_ml_inference_batch_size',
+    'Frames per batched detector forward pass',
+    buckets=(1, 2, 4, 8, 16, 32)
+)
+
+ml_model_load_seconds = Gauge(
+    'safehome_ml_model_load_seconds',
+    'Time taken to load each ML model',
+    ['model']
+)
+
+ml_model_memory_bytes = Gauge(
+    'safehome_ml_model_memory_bytes',
+    'Estimated memory held by each loaded ML model',
+    ['model']
+)
+
+detection_writes_lost = Counter(
+    'safehome_detection_writes_lost_total',
+    'Detection rows dropped by the detection writer',
+    ['reason']
+)
+
+detection_flush_rows = Histogram(
+    'safehome_detection_flush_rows',
+    'Detection rows written per detection writer flush',
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 5000)
+)
+
+detection_flush_duration = Histogram(
+    'safehome_detection_flush_duration_seconds',
+    'Detection writer flush duration'
+)
+
+frame_relay_bytes = Counter(
+    'safehome_frame_relay_bytes_total',
+    'Frame bytes relayed to camera viewers',
+    ['camera_id', 'tier']
+)
+
+frame_relay_frames = Counter(
+    'safehome_frame_relay_frames_total',
+    'Frames relayed to camera viewers (one per viewer)',
+    ['camera_id', 'tier']
+)
+
+frame_relay_skipped = Counter(
+    'safehome_frame_relay_skipped_total',
+    'Frames not sent to slow camera viewers',
+    ['camera_id', 'tier']
+)
+
+camera_state_bytes = Gauge(
+    'safehome_camera_state_bytes',
+    'Memory held by per-camera state',
+    ['store', 'camera_id']
+)
+
 def track_request_metrics(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -97,6 +197,72 @@ def track_ml_inference(model_type, duration):
         model_type=model_type
     ).observe(duration)
 
+def track_recognition_cache(hit, saved_seconds=0.0):
+    face_recognition_cache_lookups.labels(
+        result='hit' if hit else 'miss'
+    ).inc()
+    if hit:
+        face_recognition_cache_saved_seconds.inc(saved_seconds)
+
+def track_frame_received(camera_id):
+    camera_frames_received.labels(
+        camera_id=str(camera_id)
+    ).inc()
+
+def track_frame_sampled(camera_id, mode, analysed):
+    camera_frames_sampled.labels(
+        camera_id=str(camera_id),
+        mode=mode,
+        outcome='analysed' if analysed else 'skipped'
+    ).inc()
+
+def track_frames_dropped(camera_id, reason, count=1):
+    camera_frames_dropped.labels(
+        camera_id=str(camera_id),
+        reason=reason
+    ).inc(count)
+
+def update_frame_queue_depth(camera_id, depth):
+    camera_frame_queue_depth.labels(
+        camera_id=str(camera_id)
+    ).set(depth)
+
+def track_inference_skipped(camera_id, stage):
+    ml_inference_skipped.labels(
+        camera_id=str(camera_id),
+        stage=stage
+    ).inc()
+
+def track_inference_batch(size):
+    ml_inference_batch_size.observe(size)
+
+def update_model_stats(model, load_seconds, memory_bytes):
+    ml_model_load_seconds.labels(model=model).set(load_seconds)
+    ml_model_memory_bytes.labels(model=model).set(memory_bytes)
+
+def track_detection_writes_lost(reason, count):
+    detection_writes_lost.labels(reason=reason).inc(count)
+
+def track_detection_flush(rows, duration):
+    detection_flush_rows.observe(rows)
+    detection_flush_duration.observe(duration)
+
+def track_frame_relayed(camera_id, tier, viewers, size):
+    frame_relay_frames.labels(camera_id=str(camera_id), tier=tier).inc(viewers)
+    frame_relay_bytes.labels(camera_id=str(camera_id), tier=tier).inc(size)
+
+def track_relay_skipped(camera_id, tier, count):
+    frame_relay_skipped.labels(camera_id=str(camera_id), tier=tier).inc(count)
+
+def update_camera_state_memory(store, camera_id, size):
+    camera_state_bytes.labels(store=store, camera_id=str(camera_id)).set(size)
+
+def remove_camera_state_memory(store, camera_id):
+    try:
+        camera_state_bytes.remove(store, str(camera_id))
+    except KeyError:
+        pass
+
 def update_active_users(count):
     active_users.set(count)
 
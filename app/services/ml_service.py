@@ -1,89 +1,209 @@
+import atexit
 import cv2
 import numpy as np
-import os
-from pathlib import Path
+import threading
+import time
+from functools import partial
+from flask import current_app, has_app_context
+from app.services.detection_roi import offset_detections
+from app.services.detector_backends import BACKEND_TYPES, COCO_CLASSES
+from app.services.inference_batcher import InferenceBatcher
+from app.services.metrics import track_ml_inference
+from app.services.model_registry import FACE_CASCADE, YOLO, get_model_registry
+
+# How long a detector choice (camera -> MLModel row) is reused before re-reading ml_models
+DETECTOR_SELECTION_TTL = 30.0
+# Haar face search window when no face size has been learned for the camera
+DEFAULT_MIN_FACE_SIZE = 30
 
 class MLService:
     
-    def __init__(self):
-        self.object_detector = None
-        self.face_cascade = None
+    def __init__(self, registry=None, batch_size=None, batch_wait_ms=None):
+        self._registry = registry
         self.confidence_threshold = 0.5
-        self._load_models()
+        self.batch_size = batch_size
+        self.batch_wait_ms = batch_wait_ms
+        self._batchers = {}
+        self._selection = {}
+        self._latency = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def registry(self):
+        return self._registry or get_model_registry()
+    
+    @property
+    def face_cascade(self):
+        return self.registry.get(FACE_CASCADE)
+    
+    @property
+    def yolo(self):
+        return self.registry.get(YOLO)
     
-    def _load_models(self):
+    @property
+    def object_detector(self):
+        yolo = self.yolo
+        return yolo.net if yolo is not None else None
+    
+    @staticmethod
+    def detector_models():
+        """Active MLModel rows that describe a detector backend, newest first"""
+        from app.models import MLModel
+        return MLModel.query.filter(
+            MLModel.is_active == True,
+            MLModel.model_type.in_(list(BACKEND_TYPES))
+        ).order_by(MLModel.created_at.desc(), MLModel.id.desc()).all()
+    
+    def detector_for(self, camera=None):
+        """
+        Detector backend for a camera: its detector_model_id when that MLModel is active,
+        else the newest active detector row, else the legacy ml_models/yolov3 network
+        (None means the Haar fallback)
+        """
+        if not has_app_context():
+            return self.yolo
+        
+        model_id = getattr(camera, 'detector_model_id', None)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._selection.get(model_id)
+        if cached is not None and cached[1] > now:
+            return cached[0] or self.yolo
+        
         try:
-            cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            self.face_cascade = cv2.CascadeClassifier(cascade_path)
+            models = self.detector_models()
+            model = next((m for m in models if m.id == model_id), None) or (models[0] if models else None)
+            backend = self.registry.detector(model) if model is not None else None
         except Exception as e:
-            print(f"Error loading face cascade: {e}")
+            print(f"Error selecting detector for camera {getattr(camera, 'id', None)}: {e}")
+            backend = None
         
+        with self._lock:
+            self._selection[model_id] = (backend, now + DETECTOR_SELECTION_TTL)
+        return backend or self.yolo
+    
+    def load_active_detectors(self):
+        """Load every active detector row (startup warm-up)"""
         try:
-            model_path = Path('ml_models')
-            if (model_path / 'yolov3.weights').exists():
-                self.object_detector = cv2.dnn.readNet(
-                    str(model_path / 'yolov3.weights'),
-                    str(model_path / 'yolov3.cfg')
-                )
+            return [self.registry.detector(model) for model in self.detector_models()]
         except Exception as e:
-            print(f"Error loading YOLO model: {e}")
+            print(f"Error loading detector backends: {e}")
+            return []
+    
+    def clear_detector_selection(self):
+        with self._lock:
+            self._selection.clear()
+    
+    def batcher_for(self, backend=None):
+        """Micro-batcher for a backend's forward passes, None when ML_BATCH_SIZE <= 1"""
+        backend = backend or self.yolo
+        if backend is None:
+            return None
+        
+        with self._lock:
+            if backend.name not in self._batchers:
+                config = current_app.config if has_app_context() else {}
+                batch_size = self.batch_size or config.get('ML_BATCH_SIZE', 1)
+                wait_ms = self.batch_wait_ms if self.batch_wait_ms is not None else config.get('ML_BATCH_WAIT_MS', 10)
+                batcher = None
+                if batch_size > 1:
+                    batcher = InferenceBatcher(partial(self._forward_batch, backend), batch_size, wait_ms / 1000.0,
+                                               name=f'{backend.name}-batcher',
+                                               result_timeout=config.get('ML_BATCH_TIMEOUT_MS', 2000) / 1000.0)
+                    atexit.register(batcher.stop, 1.0)
+                self._batchers[backend.name] = batcher
+            return self._batchers[backend.name]
+    
+    @staticmethod
+    def _forward_batch(backend, blobs):
+        return backend.split_batch(backend.forward(np.concatenate(blobs)), len(blobs))
+    
+    @staticmethod
+    def _within_roi(roi, frame, gray, detect):
+        """Run detect(frame, gray) on the ROI's bounding box only and keep detections inside the ROI"""
+        if roi.bounds is None:
+            return []
+        x, y, w, h = roi.bounds
+        detections = detect(frame[y:y + h, x:x + w], gray[y:y + h, x:x + w] if gray is not None else None)
+        return roi.filter(offset_detections(detections, x, y))
     
-    def detect_objects(self, frame):
-        if self.object_detector is None:
-            return self._detect_objects_simple(frame)
+    def detect_objects(self, frame, blob=None, gray=None, backend=None, roi=None):
+        if roi is not None:
+            return self._within_roi(roi, frame, gray, lambda f, g: self.detect_objects(f, gray=g, backend=backend))
         
-        blob = cv2.dnn.blobFromImage(frame, 1/255.0, (416, 416), swapRB=True, crop=False)
-        self.object_detector.setInput(blob)
+        backend = backend or self.yolo
+        if backend is None:
+            return self._detect_objects_simple(frame, gray=gray)
         
-        layer_names = self.object_detector.getLayerNames()
-        output_layers = [layer_names[i - 1] for i in self.object_detector.getUnconnectedOutLayers()]
+        if blob is None:
+            blob = backend.blob(frame)
         
-        detections = self.object_detector.forward(output_layers)
+        start = time.perf_counter()
+        batcher = self.batcher_for(backend)
+        outputs = None
+        if batcher is not None:
+            try:
+                outputs = batcher.submit(blob).result(timeout=batcher.result_timeout)
+            except Exception as e:
+                # Stopped, stalled or failed batch: run this frame on its own
+                print(f"Batched inference unavailable for {backend.name}, running directly: {e!r}")
+        if outputs is None:
+            outputs = backend.forward(blob)
+        self._record_latency(backend, time.perf_counter() - start, 1)
         
         height, width = frame.shape[:2]
-        boxes = []
-        confidences = []
-        class_ids = []
-        
-        for detection in detections:
-            for obj in detection:
-                scores = obj[5:]
-                class_id = np.argmax(scores)
-                confidence = scores[class_id]
-                
-                if confidence > self.confidence_threshold:
-                    center_x = int(obj[0] * width)
-                    center_y = int(obj[1] * height)
-                    w = int(obj[2] * width)
-                    h = int(obj[3] * height)
-                    
-                    x = int(center_x - w / 2)
-                    y = int(center_y - h / 2)
-                    
-                    boxes.append([x, y, w, h])
-                    confidences.append(float(confidence))
-                    class_ids.append(class_id)
-        
-        indices = cv2.dnn.NMSBoxes(boxes, confidences, self.confidence_threshold, 0.4)
+        return backend.decode(outputs, width, height, self.confidence_threshold)
+    
+    def detect_objects_batch(self, frames, backend=None, roi=None):
+        if not frames:
+            return []
         
-        results = []
-        class_names = self._get_coco_classes()
+        if roi is not None:
+            if roi.bounds is None:
+                return [[] for _ in frames]
+            x, y, w, h = roi.bounds
+            crops = self.detect_objects_batch([frame[y:y + h, x:x + w] for frame in frames], backend=backend)
+            return [roi.filter(offset_detections(detections, x, y)) for detections in crops]
         
-        for i in indices:
-            idx = i if isinstance(i, int) else i[0]
-            box = boxes[idx]
-            results.append({
-                'class': class_names[class_ids[idx]] if class_ids[idx] < len(class_names) else 'unknown',
-                'confidence': confidences[idx],
-                'bbox': box
-            })
+        backend = backend or self.yolo
+        if backend is None:
+            return [self._detect_objects_simple(frame) for frame in frames]
         
-        return results
+        start = time.perf_counter()
+        outputs = backend.split_batch(backend.forward(backend.blob_batch(frames)), len(frames))
+        self._record_latency(backend, time.perf_counter() - start, len(frames))
+        
+        return [
+            backend.decode(detections, frame.shape[1], frame.shape[0], self.confidence_threshold)
+            for frame, detections in zip(frames, outputs)
+        ]
+    
+    def _record_latency(self, backend, seconds, frames):
+        track_ml_inference(backend.name, seconds)
+        with self._lock:
+            latency = self._latency.setdefault(backend.name, {'frames': 0, 'seconds': 0.0})
+            latency['frames'] += frames
+            latency['seconds'] += seconds
     
-    def _detect_objects_simple(self, frame):
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    def detector_stats(self):
+        """Per-backend frames detected and mean wall time per frame (including batching waits)"""
+        with self._lock:
+            return {
+                name: {
+                    'frames': latency['frames'],
+                    'mean_ms': round(latency['seconds'] / latency['frames'] * 1000, 2) if latency['frames'] else None
+                }
+                for name, latency in self._latency.items()
+            }
+    
+    def _detect_objects_simple(self, frame, gray=None):
+        face_cascade = self.face_cascade
+        if face_cascade is None:
+            return []
+        
+        if gray is None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         faces = face_cascade.detectMultiScale(gray, 1.3, 5)
         
         results = []
@@ -96,17 +216,25 @@ class MLService:
         
         return results
     
-    def detect_faces(self, frame):
-        if self.face_cascade is None:
+    def detect_faces(self, frame, gray=None, min_size=None, max_size=None, roi=None):
+        if roi is not None:
+            return self._within_roi(roi, frame, gray, lambda f, g: self.detect_faces(f, g, min_size, max_size))
+        
+        face_cascade = self.face_cascade
+        if face_cascade is None:
             return []
         
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         
-        faces = self.face_cascade.detectMultiScale(
+        # Learned face sizes bound the pyramid: no scales smaller or larger than a face can be
+        min_size = min_size or DEFAULT_MIN_FACE_SIZE
+        faces = face_cascade.detectMultiScale(
             gray,
             scaleFactor=1.1,
             minNeighbors=5,
-            minSize=(30, 30)
+            minSize=(min_size, min_size),
+            maxSize=(max_size, max_size) if max_size else (0, 0)
         )
         
         results = []
@@ -119,13 +247,16 @@ class MLService:
         return results
     
     def _get_coco_classes(self):
-        return ['person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat',
-                'traffic light', 'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat',
-                'dog', 'horse', 'sheep', 'cow', 'elephant', 'bear', 'zebra', 'giraffe', 'backpack',
-                'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee', 'skis', 'snowboard', 'sports ball',
-                'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard', 'tennis racket',
-                'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple',
-                'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake', 'chair',
-                'couch', 'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop', 'mouse', 'remote',
-                'keyboard', 'cell phone', 'microwave', 'oven', 'toaster', 'sink', 'refrigerator', 'book',
-                'clock', 'vase', 'scissors', 'teddy bear', 'hair drier', 'toothbrush']
+        return COCO_CLASSES
+
+
+_ml_service = None
+_ml_service_lock = threading.Lock()
+
+def get_ml_service():
+    """Process-wide MLService; its models come from the shared model registry and it owns the detector batchers"""
+    global _ml_service
+    with _ml_service_lock:
+        if _ml_service is None:
+            _ml_service = MLService()
+        return _ml_service
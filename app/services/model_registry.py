@@ -0,0 +1,179 @@
+"""
+Model Registry
+Process-wide cache of the OpenCV detection models
+
+Each model is loaded once per process, on first use, under its own lock, so
+concurrent requests and Celery tasks share one copy instead of reading the
+weights from disk again. Load time, an estimate of the model's memory and the
+warm-up inference time are recorded per model.
+"""
+
+import logging
+import threading
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+from app.services.detector_backends import DetectorBackend, YoloBackend
+from app.services.metrics import update_model_stats
+
+logger = logging.getLogger(__name__)
+
+FACE_CASCADE = 'face_cascade'
+YOLO = 'yolo'
+
+
+def _file_size(*paths) -> int:
+    return sum(Path(path).stat().st_size for path in paths if path and Path(path).exists())
+
+
+class ModelRegistry:
+    """Lazily loaded, shared models keyed by name"""
+
+    def __init__(self, model_path: str = 'ml_models', input_size: int = 416):
+        self.model_path = Path(model_path)
+        self.input_size = input_size
+        self._loaders = {}
+        self._models = {}
+        self._stats = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+        self.register(FACE_CASCADE, self._load_face_cascade, self._warm_up_cascade)
+        self.register(YOLO, self._load_yolo, self._warm_up_yolo)
+
+    @classmethod
+    def from_config(cls, config) -> 'ModelRegistry':
+        return cls(config.get('ML_MODEL_PATH', 'ml_models'), config.get('DETECTOR_INPUT_SIZE', 416))
+
+    def register(self, name: str, loader, warm_up=None):
+        """
+        loader() returns (model, memory_bytes), or (None, 0) when the model is not installed;
+        warm_up(model) runs one dummy inference
+        """
+        with self._lock:
+            self._loaders[name] = (loader, warm_up)
+            self._locks.setdefault(name, threading.Lock())
+            self._models.pop(name, None)
+
+    def get(self, name: str):
+        """The loaded model, or None when it is unavailable"""
+        if name in self._models:
+            return self._models[name]
+
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f'Unknown model: {name}')
+            lock = self._locks[name]
+
+        with lock:
+            if name not in self._models:
+                self._models[name] = self._load(name)
+        return self._models[name]
+
+    def detector(self, model):
+        """Loaded DetectorBackend for an MLModel row (None when its weights are missing)"""
+        name = f'detector:{model.id}:{model.version}'
+        with self._lock:
+            if name not in self._loaders:
+                backend = DetectorBackend.from_model(model)
+                self._loaders[name] = (lambda: self._load_backend(backend), lambda loaded: loaded.warm_up())
+                self._locks[name] = threading.Lock()
+        return self.get(name)
+
+    def _load(self, name: str):
+        loader, _ = self._loaders[name]
+        stats = {'loaded': False, 'load_seconds': 0.0, 'memory_bytes': 0, 'warmup_seconds': None, 'error': None}
+
+        start = time.perf_counter()
+        try:
+            model, memory_bytes = loader()
+        except Exception as e:
+            logger.error(f'Error loading model {name}: {e}')
+            model, memory_bytes = None, 0
+            stats['error'] = str(e)
+        stats['load_seconds'] = round(time.perf_counter() - start, 4)
+        stats['memory_bytes'] = int(memory_bytes)
+        stats['loaded'] = model is not None
+
+        self._stats[name] = stats
+        if model is not None:
+            update_model_stats(name, stats['load_seconds'], stats['memory_bytes'])
+            logger.info(f'Loaded model {name} in {stats["load_seconds"]}s (~{stats["memory_bytes"]} bytes)')
+        return model
+
+    def warm_up(self, names=None) -> dict:
+        """Load the given (default: all) models and run one dummy inference on each"""
+        for name in names or list(self._loaders):
+            model = self.get(name)
+            _, warm_up = self._loaders[name]
+            if model is None or warm_up is None:
+                continue
+            start = time.perf_counter()
+            try:
+                warm_up(model)
+                self._stats[name]['warmup_seconds'] = round(time.perf_counter() - start, 4)
+            except Exception as e:
+                logger.error(f'Error warming up model {name}: {e}')
+                self._stats[name]['error'] = str(e)
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def _load_face_cascade(self):
+        path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        cascade = cv2.CascadeClassifier(path)
+        if cascade.empty():
+            return None, 0
+        return cascade, _file_size(path)
+
+    def _load_yolo(self):
+        return self._load_backend(YoloBackend(
+            'yolov3', self.model_path / 'yolov3.weights', self.model_path / 'yolov3.cfg',
+            input_size=self.input_size
+        ))
+
+    @staticmethod
+    def _load_backend(backend: DetectorBackend):
+        if not Path(backend.weights).exists():
+            return None, 0
+        backend.load()
+        return backend, backend.memory_bytes() or _file_size(backend.weights, backend.config)
+
+    @staticmethod
+    def _warm_up_cascade(cascade):
+        cascade.detectMultiScale(np.zeros((64, 64), dtype=np.uint8))
+
+    @staticmethod
+    def _warm_up_yolo(backend):
+        backend.warm_up()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """The process-wide model registry, configured from the current app"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            from flask import current_app, has_app_context
+            _registry = ModelRegistry.from_config(current_app.config if has_app_context() else {})
+        return _registry
+
+
+def start_model_warm_up(app) -> threading.Thread:
+    """Load and warm up every model in the background so the first frame does not pay for it"""
+    def run():
+        with app.app_context():
+            from app.services.ml_service import get_ml_service
+            registry = get_model_registry()
+            get_ml_service().load_active_detectors()
+            stats = registry.warm_up()
+        app.logger.info(f'ML models warmed up: {stats}')
+
+    thread = threading.Thread(target=run, name='ml-model-warm-up', daemon=True)
+    thread.start()
+    return thread
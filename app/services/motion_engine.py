@@ -0,0 +1,217 @@
+"""
+Motion Engine
+Per-camera background model behind CameraService.detect_motion and
+get_motion_regions
+
+Frames are downscaled to MOTION_FRAME_WIDTH before anything else, blurred,
+and compared against a background model instead of only the previous frame:
+a running average (cv2.accumulateWeighted, MOTION_LEARNING_RATE) or OpenCV's
+MOG2 subtractor (MOTION_BACKGROUND_MODEL = 'mog2'). Slow lighting drift is
+absorbed by the model; a change covering more than
+MOTION_MAX_CHANGED_FRACTION of the frame at once (lights switching, auto
+exposure) resets the background rather than reporting motion.
+
+Each frame is analysed once: the boolean and the region query for the same
+frame share one result, and every intermediate image lives in a buffer
+allocated once per camera and resolution. Per-camera models live in a
+CameraStateStore, so idle cameras and cameras over the memory budget are
+evicted.
+"""
+
+import threading
+import weakref
+import cv2
+import numpy as np
+from app.services.camera_state import CameraStateStore
+
+BACKGROUND_MODELS = ('average', 'mog2')
+# MOG2 keeps up to 5 gaussians per pixel (weight, mean, variance as float32)
+MOG2_BYTES_PER_PIXEL = 5 * 3 * 4
+
+
+class MotionResult:
+    """Motion found in one frame; regions are in full-resolution pixels"""
+
+    __slots__ = ('motion', 'regions', 'changed_fraction', 'reset')
+
+    def __init__(self, motion: bool = False, regions: list = None, changed_fraction: float = 0.0,
+                 reset: bool = False):
+        self.motion = motion
+        self.regions = regions or []
+        self.changed_fraction = changed_fraction
+        self.reset = reset
+
+
+class _CameraModel:
+    """Background model and preallocated buffers of one camera at one resolution"""
+
+    def __init__(self, shape: tuple, small_shape: tuple, model: str, history: int, var_threshold: float):
+        self.shape = shape
+        height, width = small_shape
+        self.small = np.empty((height, width), dtype=np.uint8)
+        self.blurred = np.empty((height, width), dtype=np.uint8)
+        self.delta = np.empty((height, width), dtype=np.uint8)
+        self.mask = np.empty((height, width), dtype=np.uint8)
+        self.dilated = np.empty((height, width), dtype=np.uint8)
+        self.background = np.empty((height, width), dtype=np.float32)
+        self.background_u8 = np.empty((height, width), dtype=np.uint8)
+        self.subtractor = None
+        if model == 'mog2':
+            self.subtractor = cv2.createBackgroundSubtractorMOG2(history, var_threshold, detectShadows=False)
+        self.initialised = False
+        self.last_source = None
+        self.last_result = None
+        self.lock = threading.Lock()
+
+    def memory_bytes(self) -> int:
+        buffers = (self.small, self.blurred, self.delta, self.mask, self.dilated,
+                   self.background, self.background_u8)
+        size = sum(buffer.nbytes for buffer in buffers)
+        if self.subtractor is not None:
+            size += self.mask.size * MOG2_BYTES_PER_PIXEL
+        return size
+
+
+class MotionEngine:
+    """Background-model motion detection with one cached result per camera frame"""
+
+    def __init__(self, threshold: int = 25, min_area: int = 500, frame_width: int = 320,
+                 model: str = 'average', learning_rate: float = 0.05, max_changed_fraction: float = 0.6,
+                 blur_kernel: int = 21, history: int = 500, state_store: CameraStateStore = None):
+        if model not in BACKGROUND_MODELS:
+            raise ValueError(f'Unknown motion background model {model!r}; expected one of {BACKGROUND_MODELS}')
+        self.threshold = threshold
+        self.min_area = min_area
+        self.frame_width = frame_width
+        self.model = model
+        self.learning_rate = learning_rate
+        self.max_changed_fraction = max_changed_fraction
+        self.blur_kernel = blur_kernel
+        self.history = history
+        self._cameras = state_store if state_store is not None else CameraStateStore(name='motion')
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> 'MotionEngine':
+        return cls(
+            threshold=config.get('MOTION_THRESHOLD', 25),
+            min_area=config.get('MOTION_MIN_AREA', 500),
+            frame_width=config.get('MOTION_FRAME_WIDTH', 320),
+            model=config.get('MOTION_BACKGROUND_MODEL', 'average'),
+            learning_rate=config.get('MOTION_LEARNING_RATE', 0.05),
+            max_changed_fraction=config.get('MOTION_MAX_CHANGED_FRACTION', 0.6),
+            state_store=CameraStateStore.from_config(config, name='motion')
+        )
+
+    def analyze(self, camera_id, gray, source=None) -> MotionResult:
+        """
+        Motion in a grayscale frame; calling it again for the same source
+        array (default: gray itself, e.g. the BGR frame it came from) returns
+        the cached result without touching the background model
+        """
+        source = gray if source is None else source
+        state = self._state(camera_id, gray.shape[:2])
+        with state.lock:
+            if state.last_source is not None and state.last_source() is source:
+                return state.last_result
+
+            result = self._update(state, gray)
+            state.last_source = weakref.ref(source)
+            state.last_result = result
+            return result
+
+    def clear(self, camera_id):
+        self._cameras.pop(camera_id)
+
+    def cameras(self) -> list:
+        return self._cameras.keys()
+
+    def stats(self) -> dict:
+        return self._cameras.stats()
+
+    def _state(self, camera_id, shape: tuple) -> _CameraModel:
+        with self._lock:
+            state = self._cameras.get(camera_id)
+            if state is None or state.shape != shape:
+                state = self._cameras.put(camera_id, _CameraModel(
+                    shape, self._small_shape(shape), self.model, self.history, self.threshold
+                ))
+            return state
+
+    def _small_shape(self, shape: tuple) -> tuple:
+        height, width = shape
+        if not self.frame_width or width <= self.frame_width:
+            return height, width
+        return max(1, round(height * self.frame_width / width)), self.frame_width
+
+    def _kernel(self, scale: float) -> tuple:
+        # The blur covers the same share of the scene whatever the working resolution
+        size = max(3, int(round(self.blur_kernel * scale)) | 1)
+        return size, size
+
+    def _update(self, state: _CameraModel, gray) -> MotionResult:
+        height, width = state.shape
+        small_height, small_width = state.small.shape
+        scale = small_width / width
+
+        if scale < 1.0:
+            cv2.resize(gray, (small_width, small_height), dst=state.small, interpolation=cv2.INTER_AREA)
+            source = state.small
+        else:
+            source = gray
+        cv2.GaussianBlur(source, self._kernel(scale), 0, dst=state.blurred)
+
+        if not state.initialised:
+            self._reset(state)
+            return MotionResult()
+
+        if state.subtractor is not None:
+            state.subtractor.apply(state.blurred, fgmask=state.mask, learningRate=self._mog2_rate())
+        else:
+            cv2.convertScaleAbs(state.background, dst=state.background_u8)
+            cv2.absdiff(state.background_u8, state.blurred, dst=state.delta)
+            cv2.threshold(state.delta, self.threshold, 255, cv2.THRESH_BINARY, dst=state.mask)
+
+        changed_fraction = cv2.countNonZero(state.mask) / state.mask.size
+        if self.max_changed_fraction and changed_fraction > self.max_changed_fraction:
+            # Global change: lighting, not something moving
+            self._reset(state)
+            return MotionResult(changed_fraction=changed_fraction, reset=True)
+
+        if state.subtractor is None:
+            cv2.accumulateWeighted(state.blurred, state.background, self.learning_rate)
+
+        # Two dilations at full resolution; fewer at the working resolution so regions do not inflate
+        cv2.dilate(state.mask, None, dst=state.dilated, iterations=max(1, round(2 * scale)))
+        contours, _ = cv2.findContours(state.dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        # min_area is in full-resolution pixels
+        area_scale = 1.0 / (scale * scale)
+        regions = []
+        for contour in contours:
+            area = cv2.contourArea(contour) * area_scale
+            if area <= self.min_area:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            x0, y0 = int(x / scale), int(y / scale)
+            regions.append({
+                'x': x0,
+                'y': y0,
+                'width': min(width, int(np.ceil((x + w) / scale))) - x0,
+                'height': min(height, int(np.ceil((y + h) / scale))) - y0,
+                'area': int(area)
+            })
+
+        return MotionResult(bool(regions), regions, changed_fraction)
+
+    def _reset(self, state: _CameraModel):
+        """Make the current (blurred, downscaled) frame the background"""
+        if state.subtractor is not None:
+            state.subtractor.apply(state.blurred, fgmask=state.mask, learningRate=1.0)
+        else:
+            state.background[...] = state.blurred
+        state.initialised = True
+
+    def _mog2_rate(self) -> float:
+        # -1 lets MOG2 derive the rate from its history
+        return self.learning_rate if self.learning_rate else -1
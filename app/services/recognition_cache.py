@@ -0,0 +1,151 @@
+"""
+Recognition Cache
+Short-lived LRU of recognition results keyed by (camera_id, perceptual hash
+of the face crop)
+
+Mobile cameras resend near-identical frames several times per second; a face
+whose crop hashes within FACE_RECOGNITION_CACHE_MAX_DISTANCE bits of one seen
+on the same camera less than FACE_RECOGNITION_CACHE_TTL seconds ago reuses
+that result instead of being encoded and matched again.
+
+Lookups whose result drives door control pass max_distance=0: only an exact
+hash match is reused there, so a different person stepping into the same
+framing cannot inherit a resident's result. Fuzzy reuse is for display-only
+paths.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+from flask import current_app, has_app_context
+from app.services.metrics import track_recognition_cache
+
+
+def face_crop_hash(image, location, hash_size: int = 8) -> int:
+    """
+    Difference hash (dHash) of a face crop
+    image: RGB or BGR array, location: (top, right, bottom, left)
+    Returns a hash_size * hash_size bit integer
+    """
+    top, right, bottom, left = location
+    crop = image[max(0, top):max(top + 1, bottom), max(0, left):max(left + 1, right)]
+    if crop.ndim == 3:
+        crop = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(crop, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class RecognitionCache:
+    """Thread-safe TTL + LRU cache of per-face recognition results"""
+
+    def __init__(self, ttl: float = 2.0, max_size: int = 1024, max_distance: int = 4):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_distance = max_distance
+        # {(camera_id, phash): (expires_at, result, cost_seconds)}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, config) -> 'RecognitionCache':
+        return cls(
+            ttl=config.get('FACE_RECOGNITION_CACHE_TTL', 2.0),
+            max_size=config.get('FACE_RECOGNITION_CACHE_SIZE', 1024),
+            max_distance=config.get('FACE_RECOGNITION_CACHE_MAX_DISTANCE', 4)
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def _find(self, camera_id, phash, now, max_distance: int):
+        key = (camera_id, phash)
+        if key in self._entries:
+            return key
+        if max_distance <= 0:
+            return None
+        best_key, best_distance = None, max_distance + 1
+        for candidate in self._entries:
+            if candidate[0] != camera_id or self._entries[candidate][0] <= now:
+                continue
+            distance = (candidate[1] ^ phash).bit_count()
+            if distance < best_distance:
+                best_key, best_distance = candidate, distance
+        return best_key
+
+    def get(self, camera_id, phash: int, max_distance: int = None):
+        """Cached recognition result for a face, or None; max_distance overrides FACE_RECOGNITION_CACHE_MAX_DISTANCE"""
+        if not self.enabled:
+            return None
+
+        if max_distance is None:
+            max_distance = self.max_distance
+        now = time.monotonic()
+        with self._lock:
+            key = self._find(camera_id, phash, now, max_distance)
+            entry = self._entries.get(key) if key is not None else None
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry[2]
+
+        track_recognition_cache(entry is not None, entry[2] if entry else 0.0)
+        return copy.deepcopy(entry[1]) if entry else None
+
+    def put(self, camera_id, phash: int, result: dict, cost: float = 0.0):
+        """Store a recognition result; cost is the encode + match time it took"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[(camera_id, phash)] = (time.monotonic() + self.ttl, copy.deepcopy(result), cost)
+            self._entries.move_to_end((camera_id, phash))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self, camera_id=None):
+        """Drop cached results (all cameras, or one)"""
+        with self._lock:
+            if camera_id is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == camera_id]:
+                    del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'saved_seconds': round(self.saved_seconds, 3)
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_recognition_cache() -> RecognitionCache:
+    """The process-wide recognition cache, configured from the current app"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = current_app.config if has_app_context() else {}
+            _cache = RecognitionCache.from_config(config)
+        return _cache
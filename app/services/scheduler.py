@@ -1,6 +1,8 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from app.models import AutomationRule, db
+from app.services.camera_state import sweep_camera_states
 from app.services.rule_engine import RuleEngine
 from datetime import datetime
 import logging
@@ -24,9 +26,30 @@ class AutomationScheduler:
         
         with app.app_context():
             self.load_scheduled_rules()
+        self.schedule_camera_state_sweep(app.config.get('CAMERA_STATE_SWEEP_INTERVAL', 60))
         
         logger.info('Automation scheduler started')
     
+    def schedule_camera_state_sweep(self, interval: float):
+        """Expire idle per-camera state every interval seconds (0 = never)"""
+        if not interval:
+            return
+        self.scheduler.add_job(
+            func=self.sweep_camera_states,
+            trigger=IntervalTrigger(seconds=interval),
+            id='camera_state_sweep',
+            replace_existing=True,
+            name='Camera state sweep'
+        )
+    
+    def sweep_camera_states(self):
+        try:
+            dropped = sweep_camera_states()
+            if dropped:
+                logger.info(f'Dropped state of {dropped} idle cameras')
+        except Exception as e:
+            logger.error(f'Error sweeping camera state: {e}')
+    
     def load_scheduled_rules(self):
         rules = AutomationRule.query.filter(
             AutomationRule.is_active == True,
@@ -0,0 +1,410 @@
+"""
+Stream Ingestion
+Server-side pull of Camera.stream_url (RTSP, HTTP/MJPEG or a local video file)
+
+Each active camera with a stream_url gets one decoding thread that reads the
+stream with cv2.VideoCapture. The thread grabs every frame to keep the
+stream's buffer drained, but only decodes STREAM_SAMPLE_FPS frames per second.
+Sampled frames go into a drop-oldest FrameIngestion buffer and are analysed
+by FrameAnalysisEngine on its worker pool, with detections persisted by the
+DetectionWriter. A slow analysis therefore never stalls the decoder.
+
+When a stream cannot be opened or stops delivering frames, the worker
+reconnects with exponential backoff (STREAM_BACKOFF_INITIAL doubling up to
+STREAM_BACKOFF_MAX seconds). Local video files are paced at their own frame
+rate and loop, which lets a recording stand in for a camera.
+
+Ingestion runs in one dedicated process (stream_ingestion_worker.py), never in
+the web or Celery workers, so each stream is pulled once however many of those
+are running. That process re-reads the camera list every STREAM_SYNC_INTERVAL
+seconds to pick up cameras added, edited or removed through the web app.
+
+Each worker publishes its health (state, frames, reconnects, last frame time
+and last error) to Redis, so tasks.check_camera_health in the Celery workers
+can read it. Without Redis the health is only visible in-process.
+"""
+
+import atexit
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+import cv2
+import redis
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+STATE_CONNECTING = 'connecting'
+STATE_STREAMING = 'streaming'
+STATE_RECONNECTING = 'reconnecting'
+STATE_STOPPED = 'stopped'
+
+
+def is_file_source(url: str) -> bool:
+    return '://' not in url or url.startswith('file://')
+
+
+class StreamHealthStore:
+    """Per-camera stream health in Redis (shared with Celery), falling back to this process"""
+
+    KEY = 'safehome:stream_health:{}'
+    # After a Redis error, stay on the in-process copy this long before trying again
+    RETRY_SECONDS = 30.0
+
+    def __init__(self, redis_url: str = None, ttl: int = 300):
+        self.redis_url = redis_url
+        self.ttl = ttl
+        self._local = {}
+        self._client = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> 'StreamHealthStore':
+        return cls(config.get('STREAM_HEALTH_REDIS_URL'), int(config.get('STREAM_HEALTH_TTL', 300)))
+
+    def _redis(self):
+        if not self.redis_url or time.monotonic() < self._retry_at:
+            return None
+        with self._lock:
+            if self._client is None:
+                self._client = redis.Redis.from_url(self.redis_url, socket_connect_timeout=0.5, socket_timeout=0.5)
+            return self._client
+
+    def _redis_failed(self, e):
+        logger.warning(f'Stream health falling back to in-process storage: {e}')
+        self._retry_at = time.monotonic() + self.RETRY_SECONDS
+
+    def set(self, camera_id, health: dict):
+        self._local[camera_id] = health
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.setex(self.KEY.format(camera_id), self.ttl, json.dumps(health))
+        except redis.RedisError as e:
+            self._redis_failed(e)
+
+    def get(self, camera_id):
+        """Latest health dict of a camera's stream worker, None when no worker reported one"""
+        client = self._redis()
+        if client is not None:
+            try:
+                value = client.get(self.KEY.format(camera_id))
+                return json.loads(value) if value else None
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        return self._local.get(camera_id)
+
+    def delete(self, camera_id):
+        self._local.pop(camera_id, None)
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.delete(self.KEY.format(camera_id))
+        except redis.RedisError as e:
+            self._redis_failed(e)
+
+
+class StreamWorker:
+    """Decoding thread of one camera stream"""
+
+    def __init__(self, camera_id, url: str, on_frame, health_store: StreamHealthStore, sample_fps: float = 2.0,
+                 backoff_initial: float = 1.0, backoff_max: float = 60.0, capture_factory=cv2.VideoCapture):
+        """on_frame(camera_id, frame) receives each sampled BGR frame on the worker thread"""
+        self.camera_id = camera_id
+        self.url = url
+        self.on_frame = on_frame
+        self.health_store = health_store
+        self.sample_fps = sample_fps
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.capture_factory = capture_factory
+        self.health = {
+            'camera_id': camera_id,
+            'state': STATE_CONNECTING,
+            'frames': 0,
+            'reconnects': 0,
+            'last_frame_at': None,
+            'last_error': None,
+            'backoff': 0.0,
+            'updated_at': None
+        }
+        self._stop = threading.Event()
+        self._thread = None
+        self._published_at = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f'stream-{self.camera_id}', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._update(state=STATE_STOPPED)
+
+    @property
+    def alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _update(self, force: bool = True, **fields):
+        self.health.update(fields)
+        self.health['updated_at'] = time.time()
+        # Per-frame updates reach the shared store at most once a second
+        now = time.monotonic()
+        if force or now - self._published_at >= 1.0:
+            self._published_at = now
+            self.health_store.set(self.camera_id, dict(self.health))
+
+    def _run(self):
+        backoff = self.backoff_initial
+        while not self._stop.is_set():
+            self._update(state=STATE_CONNECTING)
+            capture = self._open()
+            if capture is None:
+                error = 'Could not open stream'
+                frames = 0
+            else:
+                self._update(state=STATE_STREAMING, last_error=None, backoff=0.0)
+                error, frames = self._read(capture)
+                capture.release()
+            if self._stop.is_set():
+                break
+
+            if error is None:
+                # A local file reached its end: loop it straight away
+                continue
+            if frames:
+                backoff = self.backoff_initial
+            self.health['reconnects'] += 1
+            self._update(state=STATE_RECONNECTING, last_error=error, backoff=backoff)
+            logger.warning(f'Camera {self.camera_id} stream: {error}; reconnecting in {backoff:.1f}s')
+            if self._stop.wait(backoff):
+                break
+            backoff = min(backoff * 2, self.backoff_max)
+
+    def _open(self):
+        url = self.url[len('file://'):] if self.url.startswith('file://') else self.url
+        try:
+            capture = self.capture_factory(url)
+        except Exception as e:
+            logger.error(f'Error opening camera {self.camera_id} stream: {e}')
+            return None
+        if not capture.isOpened():
+            capture.release()
+            return None
+        # Keep as few frames as possible queued inside the backend
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return capture
+
+    def _read(self, capture) -> tuple:
+        """Grab and sample frames until the stream fails; returns (error or None at end of file, frames sampled)"""
+        file_source = is_file_source(self.url)
+        frame_interval = 0.0
+        if file_source:
+            fps = capture.get(cv2.CAP_PROP_FPS)
+            frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+        sample_interval = 1.0 / self.sample_fps if self.sample_fps else 0.0
+
+        sampled = 0
+        next_sample = 0.0
+        next_frame = time.monotonic()
+        while not self._stop.is_set():
+            if frame_interval:
+                # Play files in real time instead of as fast as they decode
+                delay = next_frame - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+                next_frame = max(next_frame + frame_interval, time.monotonic() - frame_interval)
+
+            if not capture.grab():
+                return (None if file_source and sampled else 'Stream ended or read failed'), sampled
+
+            now = time.monotonic()
+            if now < next_sample:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok or frame is None:
+                return 'Frame decode failed', sampled
+            next_sample = now + sample_interval
+            sampled += 1
+
+            self._update(force=False, frames=self.health['frames'] + 1, last_frame_at=time.time())
+            try:
+                self.on_frame(self.camera_id, frame)
+            except Exception as e:
+                logger.error(f'Error handling camera {self.camera_id} frame: {e}')
+        return None, sampled
+
+
+class StreamIngestion:
+    """One StreamWorker per active camera with a stream_url, feeding frame analysis"""
+
+    def __init__(self, app=None, sample_fps: float = 2.0, backoff_initial: float = 1.0, backoff_max: float = 60.0,
+                 analysis_workers: int = 2, health_store: StreamHealthStore = None,
+                 capture_factory=cv2.VideoCapture, handler=None):
+        from app.services.frame_ingestion import FrameIngestion
+        self.app = app
+        self.sample_fps = sample_fps
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.capture_factory = capture_factory
+        self.health_store = health_store or StreamHealthStore()
+        # Newest sampled frame per camera only: a slow analysis drops frames instead of lagging
+        self.frames = FrameIngestion(handler or self.analyze_frame, workers=analysis_workers, buffer_size=1, app=app)
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, app=None, **kwargs) -> 'StreamIngestion':
+        return cls(
+            app=app,
+            sample_fps=config.get('STREAM_SAMPLE_FPS', 2.0),
+            backoff_initial=config.get('STREAM_BACKOFF_INITIAL', 1.0),
+            backoff_max=config.get('STREAM_BACKOFF_MAX', 60.0),
+            analysis_workers=config.get('STREAM_ANALYSIS_WORKERS', 2),
+            health_store=get_stream_health_store(),
+            **kwargs
+        )
+
+    def start_camera(self, camera_id, url: str) -> StreamWorker:
+        """(Re)start the worker of a camera; a running worker on the same URL is kept"""
+        with self._lock:
+            worker = self._workers.get(camera_id)
+            if worker is not None and worker.url == url and worker.alive:
+                return worker
+        if worker is not None:
+            self.stop_camera(camera_id)
+
+        worker = StreamWorker(
+            camera_id, url, self.frames.submit, self.health_store,
+            sample_fps=self.sample_fps, backoff_initial=self.backoff_initial,
+            backoff_max=self.backoff_max, capture_factory=self.capture_factory
+        )
+        with self._lock:
+            self._workers[camera_id] = worker
+        worker.start()
+        logger.info(f'Started stream ingestion for camera {camera_id}')
+        return worker
+
+    def stop_camera(self, camera_id):
+        with self._lock:
+            worker = self._workers.pop(camera_id, None)
+        if worker is not None:
+            worker.stop()
+            self.frames.discard(camera_id)
+            self.health_store.delete(camera_id)
+
+    def refresh_camera(self, camera):
+        """Start, restart or stop a camera's worker after its row changed"""
+        if camera.is_active and camera.stream_url:
+            self.start_camera(camera.id, camera.stream_url)
+        else:
+            self.stop_camera(camera.id)
+
+    def sync(self):
+        """Run workers for exactly the active cameras with a stream_url"""
+        from app.models import Camera
+        cameras = Camera.query.filter(Camera.is_active.is_(True), Camera.stream_url.isnot(None),
+                                      Camera.stream_url != '').all()
+        wanted = {camera.id: camera.stream_url for camera in cameras}
+        for camera_id in set(self.cameras()) - set(wanted):
+            self.stop_camera(camera_id)
+        for camera_id, url in wanted.items():
+            self.start_camera(camera_id, url)
+
+    def cameras(self) -> list:
+        with self._lock:
+            return list(self._workers)
+
+    def status(self, camera_id):
+        with self._lock:
+            worker = self._workers.get(camera_id)
+        if worker is None:
+            return None
+        return {**worker.health, 'ingestion': self.frames.stats(camera_id)}
+
+    @staticmethod
+    def analyze_frame(camera_id, frame):
+        """Analyse one pulled frame and queue its detections (runs on a FrameIngestion worker)"""
+        from app.models import Camera, db
+        from app.services.detection_writer import detection_rows, get_detection_writer
+        from app.services.frame_analysis import get_analysis_engine
+
+        camera = db.session.get(Camera, camera_id)
+        if camera is None or not camera.is_active:
+            return
+        results = get_analysis_engine().analyze(camera, frame)
+        now = datetime.utcnow()
+        get_detection_writer().add(camera_id, detection_rows(camera_id, results, now),
+                                   motion=results['motion'], timestamp=now)
+
+    def stop(self):
+        for camera_id in self.cameras():
+            self.stop_camera(camera_id)
+        self.frames.stop()
+
+
+_health_store = None
+_ingestion = None
+_ingestion_lock = threading.Lock()
+
+
+def get_stream_health_store() -> StreamHealthStore:
+    global _health_store
+    with _ingestion_lock:
+        if _health_store is None:
+            config = current_app.config if has_app_context() else {}
+            _health_store = StreamHealthStore.from_config(config)
+        return _health_store
+
+
+def get_stream_ingestion():
+    """The running StreamIngestion of this process, or None when ingestion is disabled"""
+    return _ingestion
+
+
+def start_stream_ingestion(app) -> StreamIngestion:
+    """Start pulling every active camera's stream_url in this process"""
+    global _ingestion
+    with app.app_context():
+        ingestion = StreamIngestion.from_config(app.config, app=app)
+        with _ingestion_lock:
+            if _ingestion is not None:
+                return _ingestion
+            _ingestion = ingestion
+        ingestion.sync()
+    app.logger.info(f'Stream ingestion started for {len(ingestion.cameras())} cameras')
+    return ingestion
+
+
+def run_stream_ingestion(app, stop: threading.Event = None, sync_interval: float = None):
+    """Pull streams until stop is set, re-syncing the camera list every STREAM_SYNC_INTERVAL seconds"""
+    stop = stop or threading.Event()
+    if sync_interval is None:
+        sync_interval = app.config.get('STREAM_SYNC_INTERVAL', 30)
+    ingestion = start_stream_ingestion(app)
+    try:
+        while not stop.wait(sync_interval):
+            with app.app_context():
+                try:
+                    ingestion.sync()
+                except Exception as e:
+                    logger.error(f'Stream ingestion sync failed: {e}')
+    finally:
+        stop_stream_ingestion()
+
+
+def stop_stream_ingestion():
+    global _ingestion
+    with _ingestion_lock:
+        ingestion, _ingestion = _ingestion, None
+    if ingestion is not None:
+        ingestion.stop()
+
+
+atexit.register(stop_stream_ingestion)
@@ -54,15 +54,17 @@ async function processFrame(cameraId) {
     const ctx = canvas.getContext('2d');
     ctx.drawImage(video, 0, 0);
     
-    const frameData = canvas.toDataURL('image/jpeg', 0.8);
+    // Send the raw JPEG bytes (no base64 data URL)
+    const frameBlob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.8));
+    if (!frameBlob) return;
     
     try {
         const response = await fetch(`/camera/${cameraId}/process-frame`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json',
+                'Content-Type': 'application/octet-stream',
             },
-            body: JSON.stringify({ frame: frameData })
+            body: frameBlob
         });
         
         const data = await response.json();
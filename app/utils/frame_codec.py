@@ -0,0 +1,42 @@
+"""
+Camera frame transport helpers
+
+Frames arrive either as raw encoded image bytes (Socket.IO binary
+attachments, application/octet-stream or multipart uploads) or, for older
+clients, as base64 strings / data:image URLs. Both decode straight from the
+buffer with cv2.imdecode, without an intermediate PIL image.
+"""
+
+import base64
+import binascii
+import cv2
+import numpy as np
+
+BINARY_FRAME_TYPES = (bytes, bytearray, memoryview)
+
+
+def is_binary_frame(data) -> bool:
+    return isinstance(data, BINARY_FRAME_TYPES)
+
+
+def frame_bytes(data):
+    """Encoded image bytes of a binary frame or a base64 / data URL string (None if invalid)"""
+    if is_binary_frame(data):
+        return data
+    if not isinstance(data, str) or not data:
+        return None
+
+    if data.startswith('data:'):
+        data = data.split(',', 1)[1] if ',' in data else ''
+    try:
+        return base64.b64decode(data)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def decode_frame(data, flags: int = cv2.IMREAD_COLOR):
+    """Decode a frame (see frame_bytes) to a BGR array; None if it is not a valid image"""
+    encoded = frame_bytes(data)
+    if not encoded:
+        return None
+    return cv2.imdecode(np.frombuffer(encoded, dtype=np.uint8), flags)
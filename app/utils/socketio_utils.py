@@ -18,4 +18,19 @@ def send_alert_to_user(user_id, alert_data):
                      room=f'user_{user_id}',
                      namespace='/alerts')
     except Exception as e:
-        print(f"Error sending real-time notification: {e}")
\ No newline at end of file
+        print(f"Error sending real-time notification: {e}")
+
+def send_enrollment_progress(user_id, job_id, stage, data=None):
+    """Send face enrollment job progress to user via WebSocket"""
+    try:
+        # Import here to avoid circular imports
+        from app import socketio
+
+        progress = {'job_id': job_id, 'stage': stage}
+        progress.update(data or {})
+
+        socketio.emit('enrollment_progress', progress,
+                     room=f'user_{user_id}',
+                     namespace='/alerts')
+    except Exception as e:
+        print(f"Error sending enrollment progress: {e}")
@@ -21,4 +21,12 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'tasks.check_camera_health',
         'schedule': crontab(minute=30),
     },
+    'compact-face-encodings-daily': {
+        'task': 'tasks.compact_face_encodings',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'learn-face-sizes-daily': {
+        'task': 'tasks.learn_face_sizes',
+        'schedule': crontab(hour=3, minute=45),
+    },
 }
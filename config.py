@@ -15,6 +15,8 @@ class Config:
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL)
     CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', REDIS_URL)
+    # Lets Celery workers emit Socket.IO events to connected clients (e.g. redis://localhost:6379/0)
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
     
     MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
@@ -29,9 +31,84 @@ class Config:
     PERMANENT_SESSION_LIFETIME = timedelta(minutes=30)
     
     ML_MODEL_PATH = 'ml_models'
+    # Network input of the legacy ml_models/yolov3 detector (320, 416 or 608); detector
+    # backends registered as MLModel rows set their own input_size in model_metadata
+    DETECTOR_INPUT_SIZE = int(os.getenv('DETECTOR_INPUT_SIZE', 416))
+    # Load the detection models and run one warm-up inference in the background at startup
+    ML_WARMUP_ON_STARTUP = os.getenv('ML_WARMUP_ON_STARTUP', 'true').lower() == 'true'
+    # YOLO micro-batching: concurrent frames (any camera) share one forward pass of up to
+    # ML_BATCH_SIZE frames, waiting at most ML_BATCH_WAIT_MS for a batch to fill (1 = off)
+    ML_BATCH_SIZE = int(os.getenv('ML_BATCH_SIZE', 4))
+    ML_BATCH_WAIT_MS = float(os.getenv('ML_BATCH_WAIT_MS', 10))
+    # A caller waiting longer than ML_BATCH_TIMEOUT_MS for its batch runs its frame directly
+    ML_BATCH_TIMEOUT_MS = float(os.getenv('ML_BATCH_TIMEOUT_MS', 2000))
     DETECTION_CONFIDENCE = 0.5
     MOTION_THRESHOLD = 25
-    FRAME_SKIP = 2
+    # Motion is found against a per-camera background model ('average' = running average,
+    # 'mog2' = OpenCV MOG2) on frames downscaled to MOTION_FRAME_WIDTH; MOTION_MIN_AREA is in
+    # full-resolution pixels, and a change over MOTION_MAX_CHANGED_FRACTION of the frame
+    # (lights, exposure) resets the background instead of counting as motion
+    MOTION_BACKGROUND_MODEL = os.getenv('MOTION_BACKGROUND_MODEL', 'average')
+    MOTION_LEARNING_RATE = float(os.getenv('MOTION_LEARNING_RATE', 0.05))
+    MOTION_FRAME_WIDTH = int(os.getenv('MOTION_FRAME_WIDTH', 320))
+    MOTION_MIN_AREA = int(os.getenv('MOTION_MIN_AREA', 500))
+    MOTION_MAX_CHANGED_FRACTION = float(os.getenv('MOTION_MAX_CHANGED_FRACTION', 0.6))
+    # Per-camera motion state is dropped after CAMERA_STATE_TTL idle seconds, and least recently
+    # used cameras first once all cameras together exceed CAMERA_STATE_MEMORY_BUDGET_MB; idle
+    # state is swept every CAMERA_STATE_SWEEP_INTERVAL seconds even when no frames arrive
+    CAMERA_STATE_TTL = float(os.getenv('CAMERA_STATE_TTL', 600))
+    CAMERA_STATE_MEMORY_BUDGET_MB = float(os.getenv('CAMERA_STATE_MEMORY_BUDGET_MB', 64))
+    CAMERA_STATE_SWEEP_INTERVAL = float(os.getenv('CAMERA_STATE_SWEEP_INTERVAL', 60))
+    # Received frames are sampled per camera (frame_sampler): every FRAME_SKIP-th frame,
+    # every FRAME_SKIP_ACTIVE-th for FRAME_ACTIVE_HOLD seconds after motion or a tracked face,
+    # and one per FRAME_IDLE_INTERVAL seconds after FRAME_IDLE_AFTER quiet seconds (0 = never idle)
+    FRAME_SKIP = int(os.getenv('FRAME_SKIP', 2))
+    FRAME_SKIP_ACTIVE = int(os.getenv('FRAME_SKIP_ACTIVE', 1))
+    FRAME_IDLE_INTERVAL = float(os.getenv('FRAME_IDLE_INTERVAL', 5))
+    FRAME_IDLE_AFTER = float(os.getenv('FRAME_IDLE_AFTER', 60))
+    FRAME_ACTIVE_HOLD = float(os.getenv('FRAME_ACTIVE_HOLD', 10))
+    
+    # Motion-gated inference: object/face detectors only run on frames with motion (on
+    # padded crops of the motion regions while they cover at most MOTION_GATE_CROP_MAX_AREA
+    # of the frame), plus a full-frame pass every MOTION_GATE_HEARTBEAT seconds
+    MOTION_GATED_INFERENCE = os.getenv('MOTION_GATED_INFERENCE', 'false').lower() == 'true'
+    MOTION_GATE_HEARTBEAT = float(os.getenv('MOTION_GATE_HEARTBEAT', 30))
+    MOTION_GATE_CROP_MAX_AREA = float(os.getenv('MOTION_GATE_CROP_MAX_AREA', 0.5))
+    MOTION_GATE_CROP_PADDING = int(os.getenv('MOTION_GATE_CROP_PADDING', 32))
+    
+    # Streamed camera frames: per-camera drop-oldest buffer analysed by a worker pool
+    # (0 workers = analyse inline in the Socket.IO handler)
+    FRAME_INGESTION_WORKERS = int(os.getenv('FRAME_INGESTION_WORKERS', 2))
+    FRAME_BUFFER_SIZE = int(os.getenv('FRAME_BUFFER_SIZE', 2))
+    # Live frames are relayed to viewers at their chosen tier: 'full' (as sent by the camera) or
+    # JPEG re-encoded once per frame at FRAME_RELAY_SD_WIDTH / FRAME_RELAY_THUMB_WIDTH; viewers that
+    # acknowledge frames are skipped while FRAME_RELAY_MAX_IN_FLIGHT frames are unacknowledged
+    FRAME_RELAY_SD_WIDTH = int(os.getenv('FRAME_RELAY_SD_WIDTH', 640))
+    FRAME_RELAY_THUMB_WIDTH = int(os.getenv('FRAME_RELAY_THUMB_WIDTH', 320))
+    FRAME_RELAY_JPEG_QUALITY = int(os.getenv('FRAME_RELAY_JPEG_QUALITY', 70))
+    FRAME_RELAY_MAX_IN_FLIGHT = int(os.getenv('FRAME_RELAY_MAX_IN_FLIGHT', 2))
+    FRAME_RELAY_ACK_TIMEOUT = float(os.getenv('FRAME_RELAY_ACK_TIMEOUT', 5))
+    # Detection rows are buffered and bulk-inserted every DETECTION_WRITER_BATCH_SIZE rows or
+    # DETECTION_WRITER_INTERVAL_MS (0 = write synchronously per frame); beyond
+    # DETECTION_WRITER_MAX_PENDING buffered rows the oldest are dropped and counted as lost
+    DETECTION_WRITER_BATCH_SIZE = int(os.getenv('DETECTION_WRITER_BATCH_SIZE', 500))
+    DETECTION_WRITER_INTERVAL_MS = int(os.getenv('DETECTION_WRITER_INTERVAL_MS', 500))
+    DETECTION_WRITER_MAX_PENDING = int(os.getenv('DETECTION_WRITER_MAX_PENDING', 20000))
+    # Server-side pull of Camera.stream_url, run by stream_ingestion_worker.py as a single
+    # process: one decoding thread per camera sampling STREAM_SAMPLE_FPS frames/s into
+    # STREAM_ANALYSIS_WORKERS analysis threads, reconnecting with backoff doubling from
+    # STREAM_BACKOFF_INITIAL to STREAM_BACKOFF_MAX seconds, and re-reading the camera list
+    # every STREAM_SYNC_INTERVAL seconds. Worker health is shared with Celery through Redis;
+    # check_camera_health alerts on streams that are reconnecting or have not delivered a
+    # frame for STREAM_STALE_SECONDS
+    STREAM_SYNC_INTERVAL = float(os.getenv('STREAM_SYNC_INTERVAL', 30))
+    STREAM_SAMPLE_FPS = float(os.getenv('STREAM_SAMPLE_FPS', 2))
+    STREAM_ANALYSIS_WORKERS = int(os.getenv('STREAM_ANALYSIS_WORKERS', 2))
+    STREAM_BACKOFF_INITIAL = float(os.getenv('STREAM_BACKOFF_INITIAL', 1))
+    STREAM_BACKOFF_MAX = float(os.getenv('STREAM_BACKOFF_MAX', 60))
+    STREAM_HEALTH_REDIS_URL = os.getenv('STREAM_HEALTH_REDIS_URL', REDIS_URL)
+    STREAM_HEALTH_TTL = int(os.getenv('STREAM_HEALTH_TTL', 300))
+    STREAM_STALE_SECONDS = float(os.getenv('STREAM_STALE_SECONDS', 120))
     
     # Firebase Configuration
     FIREBASE_CREDENTIALS_PATH = os.getenv('FIREBASE_CREDENTIALS_PATH')
@@ -44,6 +121,47 @@ class Config:
     MIN_FACE_ENCODINGS = int(os.getenv('MIN_FACE_ENCODINGS', 2))
     MAX_FACES_PER_FRAME = int(os.getenv('MAX_FACES_PER_FRAME', 5))
     
+    # Face localisation runs on a copy downscaled by this factor (1.0 = full resolution),
+    # never narrower than FACE_DETECTION_MIN_WIDTH; encodings always use full-resolution crops
+    FACE_DETECTION_SCALE = float(os.getenv('FACE_DETECTION_SCALE', 0.5))
+    FACE_DETECTION_MIN_WIDTH = int(os.getenv('FACE_DETECTION_MIN_WIDTH', 320))
+    # Daily tasks.learn_face_sizes sets each camera's face size range from this many days of
+    # face detections (once it has FACE_SIZE_MIN_SAMPLES); the range bounds the Haar pyramid
+    # and replaces FACE_DETECTION_SCALE for that camera
+    FACE_SIZE_LEARNING_DAYS = int(os.getenv('FACE_SIZE_LEARNING_DAYS', 30))
+    FACE_SIZE_MIN_SAMPLES = int(os.getenv('FACE_SIZE_MIN_SAMPLES', 50))
+    
+    # Process pool for face encoding (0 = encode inline in the request thread)
+    FACE_ENCODING_POOL_SIZE = int(os.getenv('FACE_ENCODING_POOL_SIZE', 2))
+    FACE_ENCODING_TIMEOUT = float(os.getenv('FACE_ENCODING_TIMEOUT', 15))
+    
+    # Face gallery index: 'exact', 'ivf' (approximate) or 'auto' (ivf above IVF_MIN_SIZE encodings)
+    FACE_GALLERY_BACKEND = os.getenv('FACE_GALLERY_BACKEND', 'auto')
+    FACE_GALLERY_IVF_MIN_SIZE = int(os.getenv('FACE_GALLERY_IVF_MIN_SIZE', 5000))
+    FACE_GALLERY_IVF_NPROBE = int(os.getenv('FACE_GALLERY_IVF_NPROBE', 8))
+    FACE_GALLERY_PATH = os.getenv('FACE_GALLERY_PATH', os.path.join(ML_MODEL_PATH, 'face_gallery'))
+    
+    # Reuse a recognition result for a face re-seen on the same camera within TTL seconds
+    # (crop dHash within MAX_DISTANCE bits); TTL = 0 disables the cache
+    FACE_RECOGNITION_CACHE_TTL = float(os.getenv('FACE_RECOGNITION_CACHE_TTL', 2.0))
+    FACE_RECOGNITION_CACHE_SIZE = int(os.getenv('FACE_RECOGNITION_CACHE_SIZE', 1024))
+    FACE_RECOGNITION_CACHE_MAX_DISTANCE = int(os.getenv('FACE_RECOGNITION_CACHE_MAX_DISTANCE', 4))
+    
+    # Streaming cameras: track faces by box IoU and recognise each track once,
+    # re-verifying every FACE_TRACK_REVERIFY_SECONDS; tracks unseen for MAX_AGE seconds end the visit
+    FACE_TRACKING_ENABLED = os.getenv('FACE_TRACKING_ENABLED', 'true').lower() == 'true'
+    FACE_TRACK_IOU_THRESHOLD = float(os.getenv('FACE_TRACK_IOU_THRESHOLD', 0.3))
+    FACE_TRACK_MAX_AGE = float(os.getenv('FACE_TRACK_MAX_AGE', 2.0))
+    FACE_TRACK_REVERIFY_SECONDS = float(os.getenv('FACE_TRACK_REVERIFY_SECONDS', 10.0))
+    
+    # Nightly compaction: persons with more encodings are matched against this many k-medoid
+    # prototypes; a compaction losing more identification accuracy than MAX_ACCURACY_DROP is discarded
+    FACE_PROTOTYPES_PER_PERSON = int(os.getenv('FACE_PROTOTYPES_PER_PERSON', 5))
+    FACE_COMPACTION_MAX_ACCURACY_DROP = float(os.getenv('FACE_COMPACTION_MAX_ACCURACY_DROP', 0.01))
+    
+    # Run /face/enroll as a Celery pipeline (progress is pushed over Socket.IO)
+    FACE_ENROLLMENT_ASYNC = os.getenv('FACE_ENROLLMENT_ASYNC', 'true').lower() == 'true'
+    
     # Notification Settings
     ENABLE_PUSH_NOTIFICATIONS = os.getenv('ENABLE_PUSH_NOTIFICATIONS', 'true').lower() == 'true'
     ENABLE_EMAIL_NOTIFICATIONS = os.getenv('ENABLE_EMAIL_NOTIFICATIONS', 'true').lower() == 'true'
@@ -67,6 +185,15 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///safehome_test.db'
     WTF_CSRF_ENABLED = False
+    FACE_GALLERY_PATH = None
+    FACE_ENCODING_POOL_SIZE = 0
+    FACE_ENROLLMENT_ASYNC = False
+    FRAME_INGESTION_WORKERS = 0
+    FRAME_SKIP = 1
+    FRAME_IDLE_AFTER = 0
+    DETECTION_WRITER_INTERVAL_MS = 0
+    STREAM_HEALTH_REDIS_URL = None
+    ML_WARMUP_ON_STARTUP = False
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,71 @@
+"""Store face encodings as packed little-endian float32 binary
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import numpy as np
+import json
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9f1d27b64'
+down_revision = '55e01ad1395f'
+branch_labels = None
+depends_on = None
+
+ENCODING_DTYPE = np.dtype('<f4')
+
+
+def _face_encodings_exists():
+    return 'face_encodings' in sa.inspect(op.get_bind()).get_table_names()
+
+
+def _convert(source_column, target_column, source_type, target_type, convert):
+    bind = op.get_bind()
+    table = sa.table(
+        'face_encodings',
+        sa.column('id', sa.Integer),
+        sa.column(source_column, source_type),
+        sa.column(target_column, target_type)
+    )
+    rows = bind.execute(sa.select(table.c.id, table.c[source_column])).fetchall()
+    if rows:
+        bind.execute(
+            table.update()
+            .where(table.c.id == sa.bindparam('row_id'))
+            .values({target_column: sa.bindparam('value')}),
+            [{'row_id': row_id, 'value': convert(value)} for row_id, value in rows]
+        )
+
+
+def _json_to_blob(value):
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=ENCODING_DTYPE).tobytes()
+
+
+def _blob_to_json(value):
+    return np.frombuffer(value, dtype=ENCODING_DTYPE).tolist()
+
+
+def upgrade():
+    if not _face_encodings_exists():
+        return
+    
+    op.add_column('face_encodings', sa.Column('encoding_bin', sa.LargeBinary(length=512), nullable=True))
+    _convert('encoding', 'encoding_bin', sa.JSON(), sa.LargeBinary(), _json_to_blob)
+    
+    with op.batch_alter_table('face_encodings') as batch_op:
+        batch_op.drop_column('encoding')
+        batch_op.alter_column('encoding_bin', new_column_name='encoding', nullable=False)
+
+
+def downgrade():
+    if not _face_encodings_exists():
+        return
+    
+    op.add_column('face_encodings', sa.Column('encoding_json', sa.JSON(), nullable=True))
+    _convert('encoding', 'encoding_json', sa.LargeBinary(), sa.JSON(), _blob_to_json)
+    
+    with op.batch_alter_table('face_encodings') as batch_op:
+        batch_op.drop_column('encoding')
+        batch_op.alter_column('encoding_json', new_column_name='encoding', nullable=False)
@@ -0,0 +1,44 @@
+"""Add face prototypes (compacted per-person encodings)
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2b5a91f03'
+down_revision = 'a3c9f1d27b64'
+branch_labels = None
+depends_on = None
+
+
+def _table_names():
+    return sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade():
+    tables = _table_names()
+    # Face tables are created by db.create_all on installs that predate their migrations
+    if 'face_persons' not in tables or 'face_prototypes' in tables:
+        return
+
+    op.create_table(
+        'face_prototypes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('person_id', sa.Integer(), nullable=False),
+        sa.Column('source_encoding_id', sa.Integer(), nullable=True),
+        sa.Column('encoding', sa.LargeBinary(length=512), nullable=False),
+        sa.Column('weight', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['person_id'], ['face_persons.id']),
+        sa.ForeignKeyConstraint(['source_encoding_id'], ['face_encodings.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_face_prototypes_person_id'), 'face_prototypes', ['person_id'], unique=False)
+
+
+def downgrade():
+    if 'face_prototypes' not in _table_names():
+        return
+
+    op.drop_index(op.f('ix_face_prototypes_person_id'), table_name='face_prototypes')
+    op.drop_table('face_prototypes')
@@ -0,0 +1,35 @@
+"""Per-camera object detector backend (cameras.detector_model_id)
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd4f8a2c6e913'
+down_revision = 'c7e2b5a91f03'
+branch_labels = None
+depends_on = None
+
+
+def _camera_columns():
+    return [column['name'] for column in sa.inspect(op.get_bind()).get_columns('cameras')]
+
+
+def upgrade():
+    if 'detector_model_id' in _camera_columns():
+        return
+
+    with op.batch_alter_table('cameras') as batch_op:
+        batch_op.add_column(sa.Column('detector_model_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            'fk_cameras_detector_model_id', 'ml_models', ['detector_model_id'], ['id'], ondelete='SET NULL'
+        )
+
+
+def downgrade():
+    if 'detector_model_id' not in _camera_columns():
+        return
+
+    with op.batch_alter_table('cameras') as batch_op:
+        batch_op.drop_constraint('fk_cameras_detector_model_id', type_='foreignkey')
+        batch_op.drop_column('detector_model_id')
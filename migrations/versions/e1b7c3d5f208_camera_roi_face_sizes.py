@@ -0,0 +1,38 @@
+"""Per-camera detection ROI and learned face size range
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e1b7c3d5f208'
+down_revision = 'd4f8a2c6e913'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ('detection_roi', 'face_min_size', 'face_max_size')
+
+
+def _camera_columns():
+    return [column['name'] for column in sa.inspect(op.get_bind()).get_columns('cameras')]
+
+
+def upgrade():
+    existing = _camera_columns()
+
+    with op.batch_alter_table('cameras') as batch_op:
+        if 'detection_roi' not in existing:
+            batch_op.add_column(sa.Column('detection_roi', sa.JSON(), nullable=True))
+        if 'face_min_size' not in existing:
+            batch_op.add_column(sa.Column('face_min_size', sa.Integer(), nullable=True))
+        if 'face_max_size' not in existing:
+            batch_op.add_column(sa.Column('face_max_size', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    existing = _camera_columns()
+
+    with op.batch_alter_table('cameras') as batch_op:
+        for column in COLUMNS:
+            if column in existing:
+                batch_op.drop_column(column)
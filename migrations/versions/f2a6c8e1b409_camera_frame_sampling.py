@@ -0,0 +1,38 @@
+"""Per-camera frame sampling overrides
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f2a6c8e1b409'
+down_revision = 'e1b7c3d5f208'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ('frame_skip', 'active_frame_skip', 'idle_frame_interval')
+
+
+def _camera_columns():
+    return [column['name'] for column in sa.inspect(op.get_bind()).get_columns('cameras')]
+
+
+def upgrade():
+    existing = _camera_columns()
+
+    with op.batch_alter_table('cameras') as batch_op:
+        if 'frame_skip' not in existing:
+            batch_op.add_column(sa.Column('frame_skip', sa.Integer(), nullable=True))
+        if 'active_frame_skip' not in existing:
+            batch_op.add_column(sa.Column('active_frame_skip', sa.Integer(), nullable=True))
+        if 'idle_frame_interval' not in existing:
+            batch_op.add_column(sa.Column('idle_frame_interval', sa.Float(), nullable=True))
+
+
+def downgrade():
+    existing = _camera_columns()
+
+    with op.batch_alter_table('cameras') as batch_op:
+        for column in COLUMNS:
+            if column in existing:
+                batch_op.drop_column(column)
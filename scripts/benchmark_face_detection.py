@@ -0,0 +1,92 @@
+"""
+Latency and recall of downscale-then-detect face localisation
+
+For every image, faces are located at 1x, 0.5x and 0.25x detection scale
+(after resizing the image to --width, 1920 by default, to mimic a 1080p
+door camera). Recall is measured against the 1x detections (IoU >= 0.5),
+and the encoding drift column is the mean distance between the 128-d
+encodings computed from the mapped-back boxes and from the 1x boxes.
+
+Usage: python scripts/benchmark_face_detection.py IMAGE_OR_DIR [...] [--width 1920] [--scales 1 0.5 0.25]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+import cv2
+import numpy as np
+import face_recognition
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.face_recognition_service import FaceRecognitionService
+
+
+def iou(a, b):
+    top, right, bottom, left = max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area = lambda box: (box[1] - box[3]) * (box[2] - box[0])
+    union = area(a) + area(b) - inter
+    return inter / union if union else 0.0
+
+
+def load_images(paths, width):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for ext in ('jpg', 'jpeg', 'png'):
+                files.extend(sorted(glob.glob(os.path.join(path, f'*.{ext}'))))
+        else:
+            files.append(path)
+
+    for path in files:
+        image = face_recognition.load_image_file(path)
+        if width:
+            factor = width / image.shape[1]
+            image = cv2.resize(image, (0, 0), fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+        yield path, image
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0, 0.5, 0.25])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    stats = {scale: {'ms': [], 'found': 0, 'matched': 0, 'drift': []} for scale in args.scales}
+    reference_total = 0
+
+    for path, image in load_images(args.paths, args.width):
+        reference = face_recognition.face_locations(image, model='hog')
+        reference_encodings = face_recognition.face_encodings(image, reference)
+        reference_total += len(reference)
+
+        for scale in args.scales:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                locations = FaceRecognitionService.locate_faces(image, scale=scale)
+            stats[scale]['ms'].append((time.perf_counter() - start) / args.repeat * 1000)
+            stats[scale]['found'] += len(locations)
+
+            encodings = face_recognition.face_encodings(image, locations)
+            for ref_location, ref_encoding in zip(reference, reference_encodings):
+                overlaps = [iou(ref_location, location) for location in locations]
+                if overlaps and max(overlaps) >= 0.5:
+                    best = int(np.argmax(overlaps))
+                    stats[scale]['matched'] += 1
+                    stats[scale]['drift'].append(float(np.linalg.norm(encodings[best] - ref_encoding)))
+
+    print(f"{'scale':>6} {'ms/image':>9} {'faces':>6} {'recall':>7} {'enc drift':>10}")
+    for scale in args.scales:
+        s = stats[scale]
+        recall = s['matched'] / reference_total if reference_total else float('nan')
+        drift = np.mean(s['drift']) if s['drift'] else float('nan')
+        print(f"{scale:>6.2f} {np.mean(s['ms']):>9.1f} {s['found']:>6} {recall:>7.3f} {drift:>10.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Recall vs latency benchmark for the face gallery index backends
+
+Builds synthetic galleries (2 encodings per identity, face_recognition-like
+spread) and compares the exact brute-force index with the IVF index.
+Recall@1 is measured against the exact nearest identity.
+
+Usage: python scripts/benchmark_face_gallery.py [--sizes 1000 10000 100000] [--nprobe 4 8 16]
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.face_gallery_index import ExactGalleryIndex, IVFGalleryIndex, ENCODING_SIZE
+
+
+def synthetic_gallery(identities, per_person=2, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.09, (identities, ENCODING_SIZE)).astype(np.float32)
+    vectors = np.repeat(centers, per_person, axis=0)
+    vectors += rng.normal(0, 0.02, vectors.shape).astype(np.float32)
+    person_ids = np.repeat(np.arange(identities), per_person)
+
+    # Probe with fresh captures of enrolled people
+    probe_ids = rng.choice(identities, min(identities, 500), replace=False)
+    queries = centers[probe_ids] + rng.normal(0, 0.02, (len(probe_ids), ENCODING_SIZE)).astype(np.float32)
+    return vectors, person_ids, queries
+
+
+def time_search(index, queries, batch=1):
+    found = []
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        found.append(index.search(queries[i:i + batch])[1])
+    elapsed = time.perf_counter() - start
+    return np.concatenate(found), elapsed / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16])
+    args = parser.parse_args()
+
+    print(f"{'identities':>10} {'backend':>12} {'build s':>8} {'ms/query':>9} {'recall@1':>9}")
+    for size in args.sizes:
+        vectors, person_ids, queries = synthetic_gallery(size)
+
+        exact = ExactGalleryIndex()
+        start = time.perf_counter()
+        exact.build(vectors, person_ids)
+        build_time = time.perf_counter() - start
+        truth, latency = time_search(exact, queries)
+        print(f"{size:>10} {'exact':>12} {build_time:>8.2f} {latency:>9.3f} {1.0:>9.3f}")
+
+        ivf = IVFGalleryIndex()
+        start = time.perf_counter()
+        ivf.build(vectors, person_ids)
+        build_time = time.perf_counter() - start
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            found, latency = time_search(ivf, queries)
+            recall = float((found == truth).mean())
+            print(f"{size:>10} {f'ivf/{nprobe}':>12} {build_time:>8.2f} {latency:>9.3f} {recall:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
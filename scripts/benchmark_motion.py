@@ -0,0 +1,103 @@
+"""
+Frames-per-second benchmark of motion detection at 480p and 1080p
+
+Compares the old two-frame differencing (full-resolution blur, absdiff,
+threshold, dilate, contours, called once for detect_motion and again for
+get_motion_regions) with MotionEngine's running-average and MOG2 models on
+downscaled frames, answering both queries from one analysis.
+
+Frames are synthetic: a static noisy scene with a square moving across it.
+
+Usage: python scripts/benchmark_motion.py [--frames 200] [--width 320] [--resolutions 480 1080]
+"""
+
+import argparse
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.camera_service import CameraService
+from app.services.motion_engine import MotionEngine
+
+RESOLUTIONS = {480: (854, 480), 720: (1280, 720), 1080: (1920, 1080)}
+
+
+def make_frames(width, height, count, seed=0):
+    rng = np.random.default_rng(seed)
+    background = rng.integers(60, 120, (height, width, 3), dtype=np.uint8)
+    size = height // 6
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        x = int((width - size) * (i % 50) / 50)
+        frame[height // 3:height // 3 + size, x:x + size] = 230
+        frames.append(frame)
+    return frames
+
+
+class LegacyMotion:
+    """CameraService before the motion engine: both queries redo the full pipeline"""
+
+    def __init__(self, threshold=25, min_area=500):
+        self.previous = None
+        self.threshold = threshold
+        self.min_area = min_area
+
+    def _contours(self, frame):
+        gray = cv2.GaussianBlur(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (21, 21), 0)
+        previous, self.previous = self.previous, gray
+        if previous is None:
+            return []
+        thresh = cv2.threshold(cv2.absdiff(previous, gray), self.threshold, 255, cv2.THRESH_BINARY)[1]
+        thresh = cv2.dilate(thresh, None, iterations=2)
+        contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return [contour for contour in contours if cv2.contourArea(contour) > self.min_area]
+
+    def detect_motion(self, camera_id, frame):
+        return bool(self._contours(frame))
+
+    def get_motion_regions(self, camera_id, frame):
+        return [cv2.boundingRect(contour) for contour in self._contours(frame)]
+
+
+def bench(service, frames):
+    start = time.perf_counter()
+    detected = 0
+    for frame in frames:
+        motion = service.detect_motion(1, frame)
+        service.get_motion_regions(1, frame)
+        detected += motion
+    elapsed = time.perf_counter() - start
+    return len(frames) / elapsed, detected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--width', type=int, default=320, help='MOTION_FRAME_WIDTH')
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[480, 1080], choices=sorted(RESOLUTIONS))
+    args = parser.parse_args()
+
+    print(f'cv2 {cv2.__version__}, {cv2.getNumThreads()} threads, {args.frames} frames, '
+          f'detect_motion + get_motion_regions per frame\n')
+    print(f"{'input':>6} {'engine':<24} {'fps':>8} {'motion frames':>14}")
+
+    for resolution in args.resolutions:
+        frames = make_frames(*RESOLUTIONS[resolution], args.frames)
+        engines = {
+            'two-frame (legacy)': LegacyMotion(),
+            f'average @ {args.width}px': CameraService(MotionEngine(frame_width=args.width)),
+            f'mog2 @ {args.width}px': CameraService(MotionEngine(frame_width=args.width, model='mog2')),
+            'average @ full res': CameraService(MotionEngine(frame_width=0))
+        }
+        for name, service in engines.items():
+            fps, detected = bench(service, frames)
+            print(f"{resolution:>5}p {name:<24} {fps:>8.1f} {detected:>14}")
+
+
+if __name__ == '__main__':
+    main()
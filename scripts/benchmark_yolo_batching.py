@@ -0,0 +1,116 @@
+"""
+CPU throughput of batched YOLO inference
+
+Part 1 forwards blobFromImages batches of 1, 2, 4, ... frames straight
+through the network and reports frames/s and per-batch latency. Part 2
+simulates --cameras concurrent streams submitting single frames through
+MLService's micro-batcher (ML_BATCH_SIZE / ML_BATCH_WAIT_MS) and reports the
+end-to-end throughput and the batch sizes it actually formed.
+
+Needs ml_models/yolov3.weights and yolov3.cfg (or --model-path).
+
+Usage: python scripts/benchmark_yolo_batching.py [IMAGE_OR_DIR ...] [--batch-sizes 1 2 4 8 16]
+       [--cameras 8] [--wait-ms 10] [--seconds 10]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.ml_service import MLService
+from app.services.model_registry import ModelRegistry, YOLO
+
+
+def load_frames(paths, count=16, seed=0):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for ext in ('jpg', 'jpeg', 'png'):
+                files.extend(sorted(glob.glob(os.path.join(path, f'*.{ext}'))))
+        else:
+            files.append(path)
+
+    frames = [frame for frame in (cv2.imread(path) for path in files) if frame is not None]
+    if not frames:
+        # Synthetic 720p frames: throughput does not depend on the content
+        rng = np.random.default_rng(seed)
+        frames = [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(count)]
+    return [frames[i % len(frames)] for i in range(max(count, len(frames)))]
+
+
+def bench_direct(yolo, frames, batch_sizes, repeat):
+    print(f"{'batch':>6} {'ms/batch':>9} {'ms/frame':>9} {'frames/s':>9}")
+    for batch_size in batch_sizes:
+        batch = frames[:batch_size]
+        yolo.forward(yolo.blob_batch(batch))
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            yolo.forward(yolo.blob_batch(batch))
+        elapsed = (time.perf_counter() - start) / repeat
+        print(f"{batch_size:>6} {elapsed * 1000:>9.1f} {elapsed * 1000 / batch_size:>9.1f} {batch_size / elapsed:>9.1f}")
+
+
+def bench_batcher(registry, frames, cameras, batch_size, wait_ms, seconds):
+    service = MLService(registry, batch_size=batch_size, batch_wait_ms=wait_ms)
+    counts = [0] * cameras
+    deadline = time.monotonic() + seconds
+
+    def stream(camera):
+        i = camera
+        while time.monotonic() < deadline:
+            service.detect_objects(frames[i % len(frames)])
+            counts[camera] += 1
+            i += cameras
+
+    threads = [threading.Thread(target=stream, args=(camera,)) for camera in range(cameras)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    batcher = service.batcher_for()
+    stats = batcher.stats() if batcher else {'mean_batch_size': 1.0, 'largest_batch': 1}
+    print(f"{cameras:>8} {batch_size:>6} {sum(counts) / elapsed:>9.1f} "
+          f"{stats['mean_batch_size']:>10.2f} {stats['largest_batch']:>8}")
+    if batcher:
+        batcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*')
+    parser.add_argument('--model-path', default='ml_models')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--cameras', type=int, default=8)
+    parser.add_argument('--wait-ms', type=float, default=10)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.model_path)
+    yolo = registry.get(YOLO)
+    if yolo is None:
+        sys.exit(f'YOLO weights not found in {args.model_path}')
+
+    frames = load_frames(args.paths, count=max(args.batch_sizes + [args.cameras]))
+    print(f'cv2 {cv2.__version__}, {cv2.getNumThreads()} threads, {len(frames)} frames\n')
+
+    bench_direct(yolo, frames, args.batch_sizes, args.repeat)
+
+    print(f"\n{'cameras':>8} {'batch':>6} {'frames/s':>9} {'mean batch':>10} {'largest':>8}")
+    for batch_size in args.batch_sizes:
+        bench_batcher(registry, frames, args.cameras, batch_size, args.wait_ms, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Looping MJPEG stand-in for an IP camera
+
+Serves multipart/x-mixed-replace JPEG frames over HTTP, from a video file
+(looped) or, without one, a synthetic scene with a square moving across it.
+Point a camera's stream_url at http://HOST:PORT/stream.mjpg to exercise
+stream ingestion without real hardware. --drop-after N closes every
+connection after N frames to exercise reconnects.
+
+Usage: python scripts/mjpeg_test_server.py [VIDEO] [--port 8081] [--fps 10]
+       [--width 640 --height 480] [--drop-after 0]
+"""
+
+import argparse
+import itertools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import numpy as np
+
+BOUNDARY = 'frame'
+
+
+def synthetic_frames(width, height):
+    background = np.random.default_rng(0).integers(40, 90, (height, width, 3), dtype=np.uint8)
+    size = height // 5
+    for i in itertools.count():
+        frame = background.copy()
+        x = (i * 8) % max(1, width - size)
+        frame[height // 3:height // 3 + size, x:x + size] = 230
+        cv2.putText(frame, str(i), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        yield frame
+
+
+def video_frames(path):
+    while True:
+        capture = cv2.VideoCapture(path)
+        ok, frame = capture.read()
+        if not ok:
+            raise SystemExit(f'Cannot read {path}')
+        while ok:
+            yield frame
+            ok, frame = capture.read()
+        capture.release()
+
+
+class FrameSource:
+    """Encodes frames at a fixed rate; every client gets the latest JPEG"""
+
+    def __init__(self, frames, fps):
+        self.frames = frames
+        self.interval = 1.0 / fps
+        self.jpeg = None
+        self.sequence = 0
+        self.condition = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        next_frame = time.monotonic()
+        for frame in self.frames:
+            ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+            with self.condition:
+                self.jpeg = encoded.tobytes()
+                self.sequence += 1
+                self.condition.notify_all()
+            next_frame += self.interval
+            time.sleep(max(0.0, next_frame - time.monotonic()))
+
+    def wait(self, after):
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence > after, timeout=5)
+            return self.sequence, self.jpeg
+
+
+def make_handler(source, drop_after):
+    class MjpegHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ('/', '/stream.mjpg'):
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+
+            sequence, sent = 0, 0
+            try:
+                while not drop_after or sent < drop_after:
+                    sequence, jpeg = source.wait(sequence)
+                    if jpeg is None:
+                        continue
+                    self.wfile.write(f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+                                     f'Content-Length: {len(jpeg)}\r\n\r\n'.encode())
+                    self.wfile.write(jpeg)
+                    self.wfile.write(b'\r\n')
+                    sent += 1
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return MjpegHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video', nargs='?')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--fps', type=float, default=10)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--drop-after', type=int, default=0, help='close each connection after N frames')
+    args = parser.parse_args()
+
+    frames = video_frames(args.video) if args.video else synthetic_frames(args.width, args.height)
+    source = FrameSource(frames, args.fps)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(source, args.drop_after))
+    print(f'Serving MJPEG on http://{args.host}:{args.port}/stream.mjpg')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Latency and accuracy report for the object detector backends
+
+Runs every active detector MLModel row (plus the legacy ml_models/yolov3
+network when present) on the given images and reports load time, memory,
+per-frame latency (p50/p95, decoding included) and precision/recall/F1 at
+IoU >= 0.5.
+
+Accuracy is measured against --annotations, a JSON file mapping image file
+names to [{"class": "person", "bbox": [x, y, w, h]}, ...]; without it, the
+--reference backend's detections (default: the largest-input backend) are
+used as ground truth, which measures agreement rather than accuracy. VOC
+label names are mapped to their COCO equivalents before matching.
+
+With --save, F1 is written to MLModel.accuracy and the p50 latency to
+model_metadata['latency_ms'].
+
+Usage: python scripts/report_detector_backends.py IMAGE_OR_DIR [...] [--annotations labels.json]
+       [--reference NAME] [--repeat 3] [--save]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.services.ml_service import MLService
+from app.services.model_registry import ModelRegistry, YOLO
+
+VOC_TO_COCO = {
+    'aeroplane': 'airplane', 'motorbike': 'motorcycle', 'sofa': 'couch', 'tvmonitor': 'tv',
+    'diningtable': 'dining table', 'pottedplant': 'potted plant'
+}
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter = max(0, min(ax + aw, bx + bw) - max(ax, bx)) * max(0, min(ay + ah, by + bh) - max(ay, by))
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def label(name):
+    return VOC_TO_COCO.get(name, name)
+
+
+def match(detections, truth, threshold=0.5):
+    """(true positives, false positives, false negatives), greedy by confidence"""
+    unmatched = list(truth)
+    tp = 0
+    for detection in sorted(detections, key=lambda d: -d.get('confidence', 1.0)):
+        candidates = [
+            (iou(detection['bbox'], t['bbox']), i) for i, t in enumerate(unmatched)
+            if label(t['class']) == label(detection['class'])
+        ]
+        best = max(candidates, default=(0.0, None))
+        if best[0] >= threshold:
+            tp += 1
+            unmatched.pop(best[1])
+    return tp, len(detections) - tp, len(unmatched)
+
+
+def load_images(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for ext in ('jpg', 'jpeg', 'png'):
+                files.extend(sorted(glob.glob(os.path.join(path, f'*.{ext}'))))
+        else:
+            files.append(path)
+    for path in files:
+        image = cv2.imread(path)
+        if image is not None:
+            yield os.path.basename(path), image
+
+
+def run_backend(service, backend, images, repeat):
+    latencies, detections = [], {}
+    for name, image in images:
+        blob = backend.blob(image)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            outputs = backend.forward(blob)
+            found = backend.decode(outputs, image.shape[1], image.shape[0], service.confidence_threshold)
+            latencies.append((time.perf_counter() - start) * 1000)
+        detections[name] = found
+    return latencies, detections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--annotations')
+    parser.add_argument('--reference')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', action='store_true')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+    with app.app_context():
+        registry = ModelRegistry.from_config(app.config)
+        service = MLService(registry, batch_size=1)
+
+        backends = {}
+        models = {model.name: model for model in service.detector_models()}
+        for model in models.values():
+            backend = registry.detector(model)
+            if backend is None:
+                print(f'skipping {model.name}: weights not found at {model.file_path}')
+                continue
+            backends[model.name] = backend
+        legacy = registry.get(YOLO)
+        if legacy is not None:
+            backends.setdefault(legacy.name, legacy)
+        if not backends:
+            sys.exit('No detector backend could be loaded')
+
+        images = list(load_images(args.paths))
+        if not images:
+            sys.exit('No images found')
+        for backend in backends.values():
+            backend.warm_up()
+
+        results = {name: run_backend(service, backend, images, args.repeat) for name, backend in backends.items()}
+
+        if args.annotations:
+            with open(args.annotations) as f:
+                truth = json.load(f)
+            truth_source = args.annotations
+        else:
+            reference = args.reference or max(backends, key=lambda name: backends[name].input_size)
+            truth = results[reference][1]
+            truth_source = f'{reference} detections'
+
+        load_stats = registry.stats()
+        print(f'{len(images)} images, ground truth: {truth_source}\n')
+        print(f"{'backend':<24} {'type':<5} {'input':>5} {'load s':>7} {'MB':>7} {'p50 ms':>7} {'p95 ms':>7} "
+              f"{'fps':>6} {'prec':>6} {'recall':>6} {'F1':>6}")
+
+        for name, (latencies, detections) in results.items():
+            backend = backends[name]
+            tp = fp = fn = 0
+            for image_name, _ in images:
+                counts = match(detections[image_name], truth.get(image_name, []))
+                tp, fp, fn = tp + counts[0], fp + counts[1], fn + counts[2]
+            precision = tp / (tp + fp) if tp + fp else 1.0
+            recall = tp / (tp + fn) if tp + fn else 1.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+            key = f'detector:{backend.model_id}:{backend.version}' if backend.model_id else YOLO
+            stats = load_stats.get(key, {})
+            p50, p95 = np.percentile(latencies, [50, 95])
+            print(f"{name:<24} {backend.model_type:<5} {backend.input_size:>5} {stats.get('load_seconds', 0):>7.2f} "
+                  f"{stats.get('memory_bytes', 0) / 1e6:>7.1f} {p50:>7.1f} {p95:>7.1f} {1000 / p50:>6.1f} "
+                  f"{precision:>6.3f} {recall:>6.3f} {f1:>6.3f}")
+
+            if args.save and name in models:
+                model = models[name]
+                model.accuracy = round(f1, 4)
+                model.model_metadata = {**(model.model_metadata or {}), 'latency_ms': round(float(p50), 2)}
+
+        if args.save:
+            db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
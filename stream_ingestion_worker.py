@@ -0,0 +1,16 @@
+from app import create_app
+from app.services.stream_ingestion import run_stream_ingestion
+import os
+import signal
+import threading
+
+# Run as a single process: every instance pulls every camera's stream
+app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+if __name__ == '__main__':
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        run_stream_ingestion(app, stop)
+    except KeyboardInterrupt:
+        pass
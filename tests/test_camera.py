@@ -1,6 +1,6 @@
 import pytest
 from app import create_app, db
-from app.models import User, Camera, Detection
+from app.models import User, Camera, Detection, MLModel
 import base64
 
 @pytest.fixture
@@ -84,6 +84,54 @@ class TestCamera:
             assert camera.name == 'New Name'
             assert camera.location == 'New Location'
     
+    def test_update_camera_detector(self, auth_client):
+        with auth_client.application.app_context():
+            user = User.query.filter_by(email='test@example.com').first()
+            camera = Camera(user_id=user.id, name='Drive')
+            detector = MLModel(name='mobilenet-ssd', model_type='ssd', version='1',
+                               file_path='ml_models/mobilenet.caffemodel', is_active=True,
+                               model_metadata={'input_size': 320})
+            retired = MLModel(name='yolo-old', model_type='yolo', version='0',
+                              file_path='ml_models/yolov3.weights', is_active=False)
+            db.session.add_all([camera, detector, retired])
+            db.session.commit()
+            camera_id, detector_id, retired_id = camera.id, detector.id, retired.id
+        
+        listed = auth_client.get('/camera/detectors').get_json()['detectors']
+        assert [d['name'] for d in listed] == ['mobilenet-ssd']
+        assert listed[0]['input_size'] == 320
+        
+        response = auth_client.put(f'/camera/{camera_id}/update', json={'detector_model_id': retired_id})
+        assert response.status_code == 400
+        
+        response = auth_client.put(f'/camera/{camera_id}/update', json={'detector_model_id': detector_id})
+        assert response.status_code == 200
+        
+        with auth_client.application.app_context():
+            assert Camera.query.get(camera_id).detector_model_id == detector_id
+    
+    def test_update_camera_detection_roi(self, auth_client):
+        with auth_client.application.app_context():
+            user = User.query.filter_by(email='test@example.com').first()
+            camera = Camera(user_id=user.id, name='Porch')
+            db.session.add(camera)
+            db.session.commit()
+            camera_id = camera.id
+        
+        response = auth_client.put(f'/camera/{camera_id}/update', json={'detection_roi': [[[0.1, 0.1], [1.5, 0.1]]]})
+        assert response.status_code == 400
+        
+        roi = [[[0.25, 0.0], [0.75, 0.0], [0.75, 1.0], [0.25, 1.0]]]
+        response = auth_client.put(f'/camera/{camera_id}/update', json={'detection_roi': roi})
+        assert response.status_code == 200
+        
+        with auth_client.application.app_context():
+            assert Camera.query.get(camera_id).detection_roi == roi
+        
+        response = auth_client.put(f'/camera/{camera_id}/update', json={'detection_roi': None})
+        with auth_client.application.app_context():
+            assert Camera.query.get(camera_id).detection_roi is None
+    
     def test_delete_camera(self, auth_client):
         with auth_client.application.app_context():
             user = User.query.filter_by(email='test@example.com').first()
@@ -137,3 +185,92 @@ class TestCamera:
         response = auth_client.get('/camera/99999/stats')
         
         assert response.status_code == 404
+
+def jpeg_frame():
+    import cv2
+    import numpy as np
+    ok, encoded = cv2.imencode('.jpg', np.full((48, 64, 3), 128, dtype=np.uint8))
+    return encoded.tobytes()
+
+class TestProcessFrame:
+    
+    @pytest.fixture
+    def camera_id(self, auth_client):
+        with auth_client.application.app_context():
+            user = User.query.filter_by(email='test@example.com').first()
+            camera = Camera(user_id=user.id, name='Porch', motion_enabled=True,
+                            object_detection_enabled=False, face_detection_enabled=False)
+            db.session.add(camera)
+            db.session.commit()
+            return camera.id
+    
+    def test_octet_stream_frame(self, auth_client, camera_id):
+        response = auth_client.post(f'/camera/{camera_id}/process-frame',
+            data=jpeg_frame(),
+            content_type='application/octet-stream'
+        )
+        
+        assert response.status_code == 200
+        assert response.get_json()['success'] == True
+    
+    def test_frame_updates_last_detection(self, auth_client, camera_id):
+        response = auth_client.post(f'/camera/{camera_id}/process-frame',
+            data=jpeg_frame(),
+            content_type='application/octet-stream'
+        )
+        
+        assert response.status_code == 200
+        with auth_client.application.app_context():
+            assert Camera.query.get(camera_id).last_detection is not None
+    
+    def test_multipart_frame(self, auth_client, camera_id):
+        import io
+        response = auth_client.post(f'/camera/{camera_id}/process-frame',
+            data={'frame': (io.BytesIO(jpeg_frame()), 'frame.jpg')},
+            content_type='multipart/form-data'
+        )
+        
+        assert response.status_code == 200
+        assert response.get_json()['success'] == True
+    
+    def test_legacy_base64_frame(self, auth_client, camera_id):
+        frame = 'data:image/jpeg;base64,' + base64.b64encode(jpeg_frame()).decode()
+        response = auth_client.post(f'/camera/{camera_id}/process-frame',
+            json={'frame': frame}
+        )
+        
+        assert response.status_code == 200
+        assert response.get_json()['success'] == True
+    
+    def test_invalid_frame(self, auth_client, camera_id):
+        response = auth_client.post(f'/camera/{camera_id}/process-frame',
+            data=b'not an image',
+            content_type='application/octet-stream'
+        )
+        
+        assert response.status_code == 400
+    
+    def test_missing_frame(self, auth_client, camera_id):
+        response = auth_client.post(f'/camera/{camera_id}/process-frame', json={})
+        
+        assert response.status_code == 400
+
+class TestFrameCodec:
+    
+    def test_binary_and_base64_frames_decode_alike(self):
+        from app.utils.frame_codec import decode_frame
+        raw = jpeg_frame()
+        
+        binary = decode_frame(raw)
+        legacy = decode_frame('data:image/jpeg;base64,' + base64.b64encode(raw).decode())
+        plain = decode_frame(base64.b64encode(raw).decode())
+        
+        assert binary.shape == (48, 64, 3)
+        assert (binary == legacy).all() and (binary == plain).all()
+    
+    def test_invalid_frames(self):
+        from app.utils.frame_codec import decode_frame
+        
+        assert decode_frame(b'') is None
+        assert decode_frame('data:image/jpeg;base64,@@@') is None
+        assert decode_frame(None) is None
@@ -0,0 +1,106 @@
+import pytest
+from unittest.mock import patch
+from app import create_app, db, socketio
+from app.models import User, Camera
+from app.services.camera_stream_manager import CameraStreamManager, register_camera_socketio_handlers
+from app.services.frame_relay import get_frame_relay
+
+@pytest.fixture
+def app():
+    # No app context stays pushed: handlers must each resolve their own session user
+    app = create_app('testing')
+    # Handlers added after the first app's init_app are not carried over to this app's server
+    if 'camera:frame' not in socketio.server.handlers.get('/', {}):
+        register_camera_socketio_handlers(socketio)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def add_user(username):
+    user = User(username=username, email=f'{username}@example.com')
+    user.set_password('Test@123456')
+    user.is_verified = True
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def socket_client(app, email=None):
+    """Socket.IO client sharing a Flask test client's session (logged in when email is given)"""
+    client = app.test_client()
+    if email:
+        client.post('/auth/login', data={'email': email, 'password': 'Test@123456'})
+    return socketio.test_client(app, flask_test_client=client)
+
+@pytest.fixture
+def cameras(app):
+    with app.app_context():
+        owner_id = add_user('owner')
+        other_id = add_user('intruder')
+        camera = Camera(user_id=owner_id, name='Front door', face_detection_enabled=True)
+        db.session.add(camera)
+        db.session.commit()
+        camera_id = camera.id
+    yield {'camera_id': camera_id, 'owner_id': owner_id, 'other_id': other_id}
+    with app.app_context():
+        CameraStreamManager.unregister_camera_stream(camera_id)
+
+class TestCameraSocketAuthorisation:
+
+    def test_register_ignores_client_supplied_user_id(self, app, cameras):
+        client = socket_client(app, 'intruder@example.com')
+
+        client.emit('camera:register', {'camera_id': cameras['camera_id'], 'user_id': cameras['owner_id']})
+
+        assert cameras['camera_id'] not in CameraStreamManager.active_streams
+
+    def test_anonymous_client_cannot_register(self, app, cameras):
+        client = socket_client(app)
+
+        client.emit('camera:register', {'camera_id': cameras['camera_id'], 'user_id': cameras['owner_id']})
+
+        assert cameras['camera_id'] not in CameraStreamManager.active_streams
+
+    def test_only_registering_client_may_send_frames(self, app, cameras):
+        camera_id = cameras['camera_id']
+        publisher = socket_client(app, 'owner@example.com')
+        publisher.emit('camera:register', {'camera_id': camera_id})
+        assert CameraStreamManager.active_streams[camera_id]['user_id'] == cameras['owner_id']
+        forger = socket_client(app, 'intruder@example.com')
+
+        with patch('app.services.frame_ingestion.FrameIngestion.submit') as submit:
+            forger.emit('camera:frame', {'camera_id': camera_id, 'frame': b'\xff\xd8forged'})
+            submit.assert_not_called()
+
+            publisher.emit('camera:frame', {'camera_id': camera_id, 'frame': b'\xff\xd8frame'})
+            submit.assert_called_once()
+
+    def test_other_client_cannot_end_stream(self, app, cameras):
+        camera_id = cameras['camera_id']
+        publisher = socket_client(app, 'owner@example.com')
+        publisher.emit('camera:register', {'camera_id': camera_id})
+        other = socket_client(app, 'owner@example.com')
+
+        other.emit('camera:disconnect', {'camera_id': camera_id})
+
+        assert camera_id in CameraStreamManager.active_streams
+        publisher.disconnect()
+        assert camera_id not in CameraStreamManager.active_streams
+
+    def test_watch_requires_owner_session(self, app, cameras):
+        intruder = socket_client(app, 'intruder@example.com')
+
+        intruder.emit('camera:watch', {'camera_id': cameras['camera_id'], 'user_id': cameras['owner_id']})
+
+        assert get_frame_relay().viewers(cameras['camera_id']) == 0
+
+    def test_owner_watches_until_disconnect(self, app, cameras):
+        owner = socket_client(app, 'owner@example.com')
+
+        owner.emit('camera:watch', {'camera_id': cameras['camera_id']})
+        assert get_frame_relay().viewers(cameras['camera_id']) == 1
+
+        owner.disconnect()
+        assert get_frame_relay().viewers(cameras['camera_id']) == 0
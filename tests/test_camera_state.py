@@ -0,0 +1,107 @@
+import pytest
+import numpy as np
+from unittest.mock import patch
+from prometheus_client import REGISTRY
+from app import create_app
+from app.services.camera_state import CameraStateStore, sweep_camera_states
+from app.services.camera_stream_manager import CameraStreamManager
+from app.services.camera_service import get_camera_service
+from app.services.motion_engine import MotionEngine
+
+class State:
+    def __init__(self, size):
+        self.size = size
+
+    def memory_bytes(self):
+        return self.size
+
+def gauge(store, camera_id):
+    return REGISTRY.get_sample_value('safehome_camera_state_bytes', {'store': store, 'camera_id': str(camera_id)})
+
+class TestCameraStateStore:
+
+    def test_least_recently_used_evicted_over_budget(self):
+        store = CameraStateStore(ttl=0, memory_budget=300, name='lru-test')
+        for camera_id in (1, 2, 3):
+            store.put(camera_id, State(100))
+        store.get(1)
+
+        store.put(4, State(100))
+
+        assert store.keys() == [3, 1, 4]
+        assert store.stats()['evictions']['memory'] == 1
+        assert store.memory_bytes() == 300
+
+    def test_entry_larger_than_budget_is_kept_alone(self):
+        store = CameraStateStore(ttl=0, memory_budget=100, name='big-test')
+        store.put(1, State(50))
+
+        store.put(2, State(500))
+
+        assert store.keys() == [2]
+
+    def test_idle_cameras_expire(self):
+        store = CameraStateStore(ttl=60, memory_budget=0, name='ttl-test')
+        with patch('app.services.camera_state.time.monotonic', return_value=1000.0):
+            store.put(1, State(10))
+            store.put(2, State(10))
+        with patch('app.services.camera_state.time.monotonic', return_value=1050.0):
+            store.get(2)
+
+        with patch('app.services.camera_state.time.monotonic', return_value=1070.0):
+            assert store.get(1) is None
+            assert store.sweep() == []
+            assert store.keys() == [2]
+
+        with patch('app.services.camera_state.time.monotonic', return_value=1200.0):
+            assert store.sweep() == [2]
+        assert store.stats()['evictions']['ttl'] == 2
+
+    def test_idle_cameras_swept_without_further_access(self):
+        stores = [CameraStateStore(ttl=60, memory_budget=0, name=f'sweep-test-{i}') for i in range(2)]
+        with patch('app.services.camera_state.time.monotonic', return_value=1000.0):
+            for store in stores:
+                store.put(1, State(10))
+
+        with patch('app.services.camera_state.time.monotonic', return_value=1100.0):
+            assert sweep_camera_states() >= 2
+
+        assert [len(store) for store in stores] == [0, 0]
+
+    def test_memory_gauge_per_camera(self):
+        store = CameraStateStore(ttl=0, memory_budget=0, name='gauge-test')
+        store.put(7, State(1234))
+
+        assert gauge('gauge-test', 7) == 1234
+
+        store.pop(7)
+        assert gauge('gauge-test', 7) is None
+
+class TestMotionState:
+
+    def test_motion_models_are_stored_at_reduced_resolution(self):
+        engine = MotionEngine(frame_width=320, state_store=CameraStateStore(ttl=0, memory_budget=0, name='motion-test'))
+        engine.analyze(1, np.zeros((1080, 1920), dtype=np.uint8))
+
+        # Seven 320x180 buffers, one of them float32
+        assert engine.stats()['memory_bytes'] == 320 * 180 * (6 + 4)
+
+    def test_motion_state_respects_budget(self):
+        store = CameraStateStore(ttl=0, memory_budget=320 * 180 * 10 * 2, name='motion-budget-test')
+        engine = MotionEngine(frame_width=320, state_store=store)
+        for camera_id in range(5):
+            engine.analyze(camera_id, np.zeros((720, 1280), dtype=np.uint8))
+
+        assert engine.cameras() == [3, 4]
+
+    def test_unregister_stream_drops_motion_state(self):
+        app = create_app('testing')
+        with app.app_context():
+            service = get_camera_service()
+            service.detect_motion(42, np.zeros((120, 160, 3), dtype=np.uint8))
+            CameraStreamManager.register_camera_stream(42, user_id=1)
+            assert 42 in service.motion_engine.cameras()
+
+            CameraStreamManager.unregister_camera_stream(42)
+
+            assert 42 not in service.motion_engine.cameras()
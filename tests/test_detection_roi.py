@@ -0,0 +1,192 @@
+import pytest
+import cv2
+import numpy as np
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+from app import create_app, db
+from app.models import User, Camera, Detection
+from app.services.camera_service import CameraService
+from app.services.detection_roi import (
+    DetectionRoi, camera_detection_settings, invalidate_camera_settings, learn_face_sizes, roi_for, validate_roi
+)
+from app.services.face_recognition_service import FaceRecognitionService
+from app.services.frame_analysis import FrameAnalysisEngine
+from app.services.ml_service import MLService
+
+# Right half of the frame
+RIGHT_HALF = [[[0.5, 0.0], [1.0, 0.0], [1.0, 1.0], [0.5, 1.0]]]
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        invalidate_camera_settings()
+        yield app
+        db.session.remove()
+        db.drop_all()
+        invalidate_camera_settings()
+
+@pytest.fixture
+def camera(app):
+    user = User(username='roitest', email='roi@example.com')
+    user.set_password('Test@123456')
+    db.session.add(user)
+    db.session.flush()
+
+    camera = Camera(user_id=user.id, name='Door', face_detection_enabled=True, detection_roi=RIGHT_HALF)
+    db.session.add(camera)
+    db.session.commit()
+    return camera
+
+def make_camera(roi=None, objects=False, faces=True, face_min_size=None, face_max_size=None):
+    return SimpleNamespace(id=1, motion_enabled=False, object_detection_enabled=objects,
+                           face_detection_enabled=faces, detection_roi=roi,
+                           face_min_size=face_min_size, face_max_size=face_max_size)
+
+class TestDetectionRoi:
+
+    def test_validate_roi(self):
+        assert validate_roi(None) is None
+        assert validate_roi([]) is None
+        assert validate_roi(RIGHT_HALF) == RIGHT_HALF
+
+        for bad in ('everywhere', [[[0, 0], [1, 0]]], [[[0, 0], [1, 0], [2, 1]]], [[[0, 0], [1, 0], [1]]]):
+            with pytest.raises(ValueError):
+                validate_roi(bad)
+
+    def test_bounds_and_filter(self):
+        roi = DetectionRoi(RIGHT_HALF, 160, 120)
+
+        assert roi.bounds == (80, 0, 80, 120)
+        detections = [{'bbox': [10, 10, 20, 20]}, {'bbox': [100, 10, 20, 20]}]
+        assert roi.filter(detections) == [detections[1]]
+        assert roi.filter_locations([(10, 30, 30, 10), (10, 120, 30, 100)]) == [(10, 120, 30, 100)]
+        assert roi.restrict((0, 0, 100, 50)) == (80, 0, 20, 50)
+        assert roi.restrict((0, 0, 40, 40)) is None
+
+    def test_roi_is_cached_per_frame_size(self):
+        assert roi_for(None, 160, 120) is None
+        assert roi_for(RIGHT_HALF, 160, 120) is roi_for(RIGHT_HALF, 160, 120)
+        assert roi_for(RIGHT_HALF, 320, 240).bounds == (160, 0, 160, 240)
+
+class TestRoiRestrictedDetection:
+
+    @pytest.fixture
+    def engine(self):
+        return FrameAnalysisEngine(CameraService(), MLService())
+
+    def test_detectors_only_see_roi_bounds(self, engine):
+        shapes = []
+
+        def detect_faces(frame, gray=None, **kwargs):
+            shapes.append(frame.shape[:2])
+            return [{'confidence': 0.9, 'bbox': [0, 0, 20, 20]}, {'confidence': 0.9, 'bbox': [-30, 0, 20, 20]}]
+
+        with patch.object(engine.ml_service, 'detect_faces', side_effect=detect_faces):
+            results = engine.analyze(make_camera(RIGHT_HALF), np.zeros((120, 160, 3), dtype=np.uint8))
+
+        assert shapes == [(120, 80)]
+        # Mapped back to frame coordinates; the box centred left of the ROI is dropped
+        assert results['faces'] == [{'confidence': 0.9, 'bbox': [80, 0, 20, 20]}]
+
+    def test_face_size_bounds_do_not_reach_object_fallback(self, engine):
+        person = {'class': 'person', 'confidence': 0.8, 'bbox': [5, 5, 60, 60]}
+        with patch.object(engine.ml_service, 'detector_for', return_value=None), \
+             patch.object(MLService, 'yolo', None), \
+             patch.object(engine.ml_service, '_detect_objects_simple', return_value=[person]) as simple, \
+             patch.object(engine.ml_service, 'detect_faces',
+                          return_value=[{'confidence': 0.9, 'bbox': [5, 5, 30, 30]}]) as faces:
+            results = engine.analyze(make_camera(objects=True, face_min_size=24, face_max_size=90),
+                                     np.zeros((120, 160, 3), dtype=np.uint8))
+
+        assert faces.call_count == 1
+        assert faces.call_args.kwargs['min_size'] == 24 and faces.call_args.kwargs['max_size'] == 90
+        # The object fallback keeps its own cascade settings, on the frame's shared grayscale
+        assert simple.call_count == 1 and simple.call_args.kwargs['gray'] is not None
+        assert results['objects'] == [person]
+        assert len(results['faces']) == 1
+
+    def test_ml_service_roi_argument(self):
+        service = MLService()
+        frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        roi = roi_for(RIGHT_HALF, 160, 120)
+
+        with patch.object(service, '_detect_objects_simple',
+                          return_value=[{'class': 'person', 'confidence': 0.8, 'bbox': [4, 4, 10, 10]}]) as simple, \
+             patch.object(MLService, 'yolo', None):
+            objects = service.detect_objects(frame, roi=roi)
+
+        assert simple.call_args.args[0].shape[:2] == (120, 80)
+        assert objects == [{'class': 'person', 'confidence': 0.8, 'bbox': [84, 4, 10, 10]}]
+
+    def test_batch_task_builds_roi_per_resolution(self, app, monkeypatch):
+        monkeypatch.setenv('FLASK_ENV', 'testing')
+        from app import celery_tasks
+        shapes = [(120, 160), (160, 120), (120, 160), (240, 320)]
+        frames_data = [cv2.imencode('.jpg', np.zeros(shape + (3,), dtype=np.uint8))[1].tobytes() for shape in shapes]
+        batches = []
+
+        def detect_objects_batch(frames, backend=None, roi=None):
+            batches.append(([frame.shape[:2] for frame in frames], roi))
+            return [[{'shape': frame.shape[:2]}] for frame in frames]
+
+        camera = SimpleNamespace(detection_roi=RIGHT_HALF)
+        with patch.object(Camera, 'query') as query, \
+             patch.object(MLService, 'detector_for', return_value=None), \
+             patch.object(MLService, 'detect_objects_batch', side_effect=detect_objects_batch):
+            query.get.return_value = camera
+            results = celery_tasks.process_detection_batch(1, frames_data)
+
+        for batch_shapes, roi in batches:
+            height, width = batch_shapes[0]
+            assert set(batch_shapes) == {(height, width)}
+            assert roi is roi_for(RIGHT_HALF, width, height)
+        assert sorted(len(batch_shapes) for batch_shapes, _ in batches) == [1, 1, 2]
+        assert [result['objects'][0]['shape'] for result in results] == shapes
+
+class TestCameraFaceSettings:
+
+    def test_learn_face_sizes(self, app, camera):
+        widths = list(range(40, 140))
+        db.session.add_all([
+            Detection(camera_id=camera.id, detection_type='face', confidence=0.9, bbox_x=0, bbox_y=0,
+                      bbox_width=width, bbox_height=width, timestamp=datetime.utcnow())
+            for width in widths
+        ])
+        db.session.commit()
+
+        report = learn_face_sizes(camera.id, min_samples=50)
+
+        assert report['samples'] == 100
+        low, high = np.percentile(widths, [2, 98])
+        assert report['face_min_size'] == int(low * 0.8)
+        assert report['face_max_size'] == int(np.ceil(high * 1.25))
+        settings = camera_detection_settings(camera.id)
+        assert settings['face_min_size'] == report['face_min_size']
+        assert settings['roi'] == RIGHT_HALF
+
+    def test_too_few_samples_leaves_sizes_unset(self, app, camera):
+        report = learn_face_sizes(camera.id, min_samples=50)
+
+        assert report['samples'] == 0 and report['face_min_size'] is None
+
+    def test_locate_faces_for_camera(self, app, camera):
+        camera.face_min_size, camera.face_max_size = 160, 60
+        db.session.commit()
+        invalidate_camera_settings(camera.id)
+        image = np.zeros((120, 160, 3), dtype=np.uint8)
+        calls = []
+
+        def locate_faces(rgb_image, scale=None, min_width=None):
+            calls.append((rgb_image.shape[:2], scale))
+            return [(10, 40, 50, 0), (10, 70, 90, 0)]
+
+        with patch.object(FaceRecognitionService, 'locate_faces', side_effect=locate_faces):
+            locations = FaceRecognitionService.locate_faces_for_camera(camera.id, image)
+
+        assert calls == [((120, 80), 0.5)]
+        # Offset back into the frame; the 70 px face is wider than face_max_size
+        assert locations == [(10, 120, 50, 80)]
@@ -0,0 +1,121 @@
+import pytest
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from app import create_app, db
+from app.models import User, Camera, Detection
+from app.services.detection_writer import DetectionWriter, detection_rows
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def cameras(app):
+    user = User(username='writertest', email='writer@example.com')
+    user.set_password('Test@123456')
+    db.session.add(user)
+    db.session.flush()
+
+    cameras = [Camera(user_id=user.id, name=f'Camera {i}') for i in range(2)]
+    db.session.add_all(cameras)
+    db.session.commit()
+    return [camera.id for camera in cameras]
+
+def frame_results(objects=1, faces=1):
+    return {
+        'objects': [{'class': 'person', 'confidence': 0.9, 'bbox': [i, i, 10, 10]} for i in range(objects)],
+        'faces': [{'confidence': 0.8, 'bbox': [i, i, 20, 20]} for i in range(faces)]
+    }
+
+class TestDetectionWriter:
+
+    def test_detection_rows(self):
+        timestamp = datetime(2024, 1, 1)
+        rows = detection_rows(3, frame_results(objects=2, faces=1), timestamp)
+
+        assert [row['detection_type'] for row in rows] == ['object', 'object', 'face']
+        assert rows[0] == {'camera_id': 3, 'detection_type': 'object', 'object_class': 'person',
+                           'confidence': 0.9, 'bbox_x': 0, 'bbox_y': 0, 'bbox_width': 10,
+                           'bbox_height': 10, 'timestamp': timestamp}
+        assert rows[2]['object_class'] is None
+
+    def test_flush_writes_rows_and_camera_timestamps(self, app, cameras):
+        writer = DetectionWriter(batch_size=100, interval=60, app=app)
+        first, second = cameras
+        earlier = datetime.utcnow() - timedelta(minutes=5)
+        later = datetime.utcnow()
+
+        writer.add(first, detection_rows(first, frame_results()), motion=True, timestamp=earlier)
+        writer.add(first, detection_rows(first, frame_results(faces=0)), timestamp=later)
+        writer.add(second, [], timestamp=later)
+
+        assert writer.pending() == 3
+        assert Detection.query.count() == 0
+
+        with patch.object(db.session, 'commit', wraps=db.session.commit) as commit:
+            assert writer.flush() == 3
+        writer.stop()
+
+        assert commit.call_count == 1
+        assert Detection.query.filter_by(camera_id=first).count() == 3
+        first_camera, second_camera = db.session.get(Camera, first), db.session.get(Camera, second)
+        assert first_camera.last_motion == earlier and first_camera.last_detection == later
+        assert second_camera.last_motion is None and second_camera.last_detection == later
+        assert writer.stats()['written'] == 3 and writer.stats()['flushes'] == 1
+
+    def test_background_flush_at_batch_size(self, app, cameras):
+        writer = DetectionWriter(batch_size=4, interval=60, app=app)
+        try:
+            writer.add(cameras[0], detection_rows(cameras[0], frame_results(objects=3, faces=1)))
+
+            deadline = time.monotonic() + 5
+            while writer.stats()['written'] < 4 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            writer.stop()
+
+        assert writer.stats()['written'] == 4
+        assert Detection.query.count() == 4
+
+    def test_stop_flushes_buffer(self, app, cameras):
+        writer = DetectionWriter(batch_size=100, interval=60, app=app)
+        writer.add(cameras[0], detection_rows(cameras[0], frame_results()))
+
+        writer.stop()
+
+        assert Detection.query.count() == 2
+        assert writer.stats()['pending'] == 0
+
+    def test_overflow_drops_oldest_rows(self, app, cameras):
+        writer = DetectionWriter(batch_size=100, interval=60, max_pending=100, app=app)
+        rows = detection_rows(cameras[0], frame_results(objects=110, faces=0))
+
+        writer.add(cameras[0], rows)
+        writer.stop()
+
+        assert writer.stats()['lost'] == 10
+        assert db.session.query(db.func.min(Detection.bbox_x)).scalar() == 10
+
+    def test_failed_flush_counts_lost_rows(self, app, cameras):
+        writer = DetectionWriter(batch_size=100, interval=60, app=app)
+        writer.add(cameras[0], detection_rows(cameras[0], frame_results()))
+
+        with patch.object(DetectionWriter, '_write', side_effect=RuntimeError('database is locked')):
+            assert writer.flush() == 0
+
+        assert writer.stats()['lost'] == 2 and writer.stats()['pending'] == 0
+
+    def test_synchronous_mode_writes_on_add(self, app, cameras):
+        writer = DetectionWriter(interval=0)
+
+        writer.add(cameras[0], detection_rows(cameras[0], frame_results()), motion=True)
+
+        assert Detection.query.count() == 2
+        assert db.session.get(Camera, cameras[0]).last_motion is not None
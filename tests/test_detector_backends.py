@@ -0,0 +1,221 @@
+import time
+import cv2
+import numpy as np
+import pytest
+from app import create_app, db
+from app.models import User, Camera, MLModel
+from app.services.detector_backends import (
+    COCO_CLASSES, DetectorBackend, YoloBackend, SsdBackend, VOC_CLASSES, decode_yolo
+)
+from app.services.ml_service import MLService
+from app.services.model_registry import ModelRegistry
+
+TINY_YOLO_CFG = """[net]
+width=320
+height=320
+channels=3
+
+[convolutional]
+filters=255
+size=1
+stride=32
+pad=0
+activation=linear
+
+[yolo]
+mask=0,1,2
+anchors=10,13, 16,30, 33,23
+classes=80
+num=3
+"""
+
+@pytest.fixture
+def tiny_yolo(tmp_path):
+    """Darknet YOLO with a single 1x1 convolution: real cv2.dnn outputs in milliseconds"""
+    cfg = tmp_path / 'tiny.cfg'
+    weights = tmp_path / 'tiny.weights'
+    cfg.write_text(TINY_YOLO_CFG)
+    with open(weights, 'wb') as f:
+        np.array([0, 2, 0], dtype=np.int32).tofile(f)
+        np.array([0], dtype=np.int64).tofile(f)
+        np.zeros(255, dtype=np.float32).tofile(f)
+        np.random.default_rng(0).normal(0, 2, 255 * 3).astype(np.float32).tofile(f)
+    return str(weights), str(cfg)
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def frames(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 255, (240, 320, 3), dtype=np.uint8) for _ in range(count)]
+
+class TestYoloBackend:
+
+    def test_batched_forward_matches_single_frames(self, tiny_yolo):
+        backend = YoloBackend('tiny', *tiny_yolo, input_size=320).load()
+        batch = frames(3)
+
+        outputs = backend.split_batch(backend.forward(backend.blob_batch(batch)), len(batch))
+
+        for frame, output in zip(batch, outputs):
+            single = backend.forward(backend.blob(frame))
+            assert np.allclose(output[0], single[0], atol=1e-5)
+            assert backend.decode(output, 320, 240, 0.3) == backend.decode(single, 320, 240, 0.3)
+
+    def test_unsupported_input_size(self, tiny_yolo):
+        with pytest.raises(ValueError):
+            YoloBackend('tiny', *tiny_yolo, input_size=300)
+
+class TestSsdBackend:
+
+    def test_decode_and_split(self):
+        backend = SsdBackend('ssd', 'mobilenet.caffemodel', 'mobilenet.prototxt', input_size=320)
+        rows = np.array([
+            [0, 15, 0.9, 0.1, 0.2, 0.5, 0.8],
+            [0, 7, 0.3, 0.0, 0.0, 1.0, 1.0],
+            [1, 12, 0.7, -0.1, 0.5, 0.4, 1.2]
+        ], dtype=np.float32).reshape(1, 1, 3, 7)
+
+        first, second = backend.split_batch([rows], 2)
+
+        assert backend.decode(first, 200, 100) == [{'class': 'person', 'confidence': pytest.approx(0.9), 'bbox': [20, 20, 80, 60]}]
+        assert backend.decode(second, 200, 100)[0]['class'] == VOC_CLASSES[12]
+        assert backend.decode(second, 200, 100)[0]['bbox'] == [0, 50, 80, 50]
+
+class TestDetectorSelection:
+
+    @pytest.fixture
+    def detectors(self, app, tiny_yolo):
+        weights, cfg = tiny_yolo
+        user = User(username='detector', email='detector@example.com')
+        user.set_password('Test@123456')
+        db.session.add(user)
+        db.session.flush()
+
+        small = MLModel(name='yolo-tiny-320', model_type='yolo', version='1', file_path=weights,
+                        is_active=True, model_metadata={'config': cfg, 'input_size': 320})
+        large = MLModel(name='yolo-tiny-416', model_type='yolo', version='1', file_path=weights,
+                        is_active=True, model_metadata={'config': cfg, 'input_size': 416})
+        retired = MLModel(name='yolo-old', model_type='yolo', version='0', file_path=weights,
+                          is_active=False, model_metadata={'config': cfg})
+        anomaly = MLModel(name='anomaly', model_type='isolation_forest', version='1', file_path='x', is_active=True)
+        db.session.add_all([small, large, retired, anomaly])
+        db.session.flush()
+
+        camera = Camera(user_id=user.id, name='Drive')
+        db.session.add(camera)
+        db.session.commit()
+        return camera, small, large, retired
+
+    def test_default_is_newest_active_detector(self, detectors, tmp_path):
+        camera, small, large, _ = detectors
+        service = MLService(ModelRegistry(str(tmp_path)))
+
+        assert [m.name for m in service.detector_models()] == ['yolo-tiny-416', 'yolo-tiny-320']
+        assert service.detector_for(camera).name == 'yolo-tiny-416'
+
+    def test_camera_selects_backend(self, detectors, tmp_path):
+        camera, small, large, retired = detectors
+        service = MLService(ModelRegistry(str(tmp_path)))
+
+        camera.detector_model_id = small.id
+        backend = service.detector_for(camera)
+        assert backend.name == 'yolo-tiny-320' and backend.input_size == 320
+
+        camera.detector_model_id = retired.id
+        assert service.detector_for(camera).name == 'yolo-tiny-416'
+
+    def test_detection_through_selected_backend(self, detectors, tmp_path):
+        camera, small, _, _ = detectors
+        service = MLService(ModelRegistry(str(tmp_path)), batch_size=1)
+        camera.detector_model_id = small.id
+
+        backend = service.detector_for(camera)
+        service.detect_objects(frames(1)[0], backend=backend)
+
+        assert service.detector_stats()['yolo-tiny-320']['frames'] == 1
+        assert service.registry.stats()[f'detector:{small.id}:1']['memory_bytes'] > 0
+
+    def test_from_model(self, detectors):
+        _, small, _, _ = detectors
+        backend = DetectorBackend.from_model(small)
+
+        assert isinstance(backend, YoloBackend)
+        assert backend.blob_params() == ((320, 320), 1 / 255.0, True, (0, 0, 0))
+        assert backend.model_id == small.id
+
+def loop_decode(detections, width, height, threshold=0.5):
+    """The per-row YOLO decoding MLService used before it was vectorised"""
+    boxes, confidences, class_ids = [], [], []
+    for detection in detections:
+        for obj in detection:
+            scores = obj[5:]
+            class_id = np.argmax(scores)
+            confidence = scores[class_id]
+            if confidence > threshold:
+                center_x = int(obj[0] * width)
+                center_y = int(obj[1] * height)
+                w = int(obj[2] * width)
+                h = int(obj[3] * height)
+                boxes.append([int(center_x - w / 2), int(center_y - h / 2), w, h])
+                confidences.append(float(confidence))
+                class_ids.append(class_id)
+
+    indices = cv2.dnn.NMSBoxes(boxes, confidences, threshold, 0.4)
+    classes = COCO_CLASSES
+    return [
+        {'class': classes[class_ids[i]], 'confidence': confidences[i], 'bbox': boxes[i]}
+        for i in np.asarray(indices, dtype=np.int64).flatten()
+    ]
+
+def yolov3_output(seed=0, objects=25):
+    """YOLOv3 416x416 output layers (13x13, 26x26, 52x52 grids, 3 anchors): 10647 rows"""
+    rng = np.random.default_rng(seed)
+    layers = []
+    for grid in (13, 26, 52):
+        rows = np.zeros((grid * grid * 3, 85), dtype=np.float32)
+        rows[:, :4] = rng.random((len(rows), 4), dtype=np.float32) * [1, 1, 0.3, 0.3]
+        rows[:, 4:] = rng.random((len(rows), 81), dtype=np.float32) * 0.3
+        hits = rng.choice(len(rows), objects, replace=False)
+        rows[hits, 5 + rng.integers(0, 80, objects)] = rng.uniform(0.4, 1.0, objects)
+        # Edge boxes: negative corners exercise int() truncation toward zero
+        rows[hits[:3], 0] = 0.01
+        layers.append(rows)
+    return layers
+
+class TestVectorisedDecoding:
+
+    @pytest.mark.parametrize('seed', [0, 1, 2])
+    def test_matches_loop_decoding(self, seed):
+        outputs = yolov3_output(seed)
+
+        assert decode_yolo(outputs, 1280, 720, COCO_CLASSES) == loop_decode(outputs, 1280, 720)
+
+    def test_no_candidates(self):
+        outputs = [np.zeros((507, 85), dtype=np.float32)]
+
+        assert decode_yolo(outputs, 640, 480, COCO_CLASSES) == []
+
+    @pytest.mark.slow
+    def test_faster_than_loop_decoding(self):
+        outputs = yolov3_output()
+
+        def best_of(fn, repeat=5):
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - start)
+            return min(times)
+
+        loop = best_of(lambda: loop_decode(outputs, 1280, 720))
+        vectorised = best_of(lambda: decode_yolo(outputs, 1280, 720, COCO_CLASSES))
+
+        assert loop / vectorised > 5, f'only {loop / vectorised:.1f}x faster than loop decoding'
@@ -0,0 +1,127 @@
+import pytest
+import numpy as np
+from app import create_app, db
+from app.models import User, Camera, FacePerson, FaceEncoding, FacePrototype
+from app.services.encoding_compaction import EncodingCompactionService, k_medoids
+from app.services.face_recognition_service import FaceRecognitionService
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        FaceRecognitionService.invalidate_gallery()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def household(app):
+    """Alice enrolled from 12 photos in 3 looks (e.g. glasses, hat), Bob from 2"""
+    rng = np.random.default_rng(3)
+
+    user = User(username='compacttest', email='compact@example.com')
+    user.set_password('Test@123456')
+    db.session.add(user)
+    db.session.flush()
+
+    camera = Camera(user_id=user.id, name='Front Door')
+    alice = FacePerson(user_id=user.id, name='Alice', relation='family', is_resident=True)
+    bob = FacePerson(user_id=user.id, name='Bob', relation='family', is_resident=True)
+    db.session.add_all([camera, alice, bob])
+    db.session.flush()
+
+    alice_center = rng.normal(0, 0.1, FaceRecognitionService.ENCODING_SIZE)
+    looks = [alice_center + rng.normal(0, 0.03, FaceRecognitionService.ENCODING_SIZE) for _ in range(3)]
+    for look in looks:
+        for _ in range(4):
+            db.session.add(FaceEncoding(
+                person_id=alice.id, encoding=look + rng.normal(0, 0.01, FaceRecognitionService.ENCODING_SIZE)
+            ))
+
+    bob_center = rng.normal(0, 0.1, FaceRecognitionService.ENCODING_SIZE)
+    for _ in range(2):
+        db.session.add(FaceEncoding(
+            person_id=bob.id, encoding=bob_center + rng.normal(0, 0.01, FaceRecognitionService.ENCODING_SIZE)
+        ))
+
+    db.session.commit()
+    return {
+        'user_id': user.id, 'camera_id': camera.id,
+        'alice_id': alice.id, 'bob_id': bob.id, 'looks': looks, 'bob_center': bob_center
+    }
+
+class TestKMedoids:
+
+    def test_small_sets_are_kept_whole(self):
+        medoids, assignment = k_medoids(np.eye(3, 128, dtype=np.float32), 5)
+        assert medoids.tolist() == [0, 1, 2]
+        assert assignment.tolist() == [0, 1, 2]
+
+    def test_one_medoid_per_cluster(self):
+        rng = np.random.default_rng(0)
+        centers = rng.normal(0, 1, (3, 128)).astype(np.float32)
+        vectors = np.repeat(centers, 5, axis=0) + rng.normal(0, 0.01, (15, 128)).astype(np.float32)
+
+        medoids, assignment = k_medoids(vectors, 3)
+
+        assert sorted(medoids // 5) == [0, 1, 2]
+        assert np.bincount(assignment).tolist() == [5, 5, 5]
+
+class TestEncodingCompaction:
+
+    def test_compaction_bounds_gallery_and_keeps_raw_rows(self, household):
+        report = EncodingCompactionService.compact_user(household['user_id'], max_prototypes=3)
+
+        assert report['committed'] is True
+        assert report['persons_compacted'] == 1
+        assert report['gallery_size_before'] == 14
+        assert report['gallery_size_after'] == 5
+        assert report['raw_accuracy'] == report['compact_accuracy'] == 1.0
+        assert report['accuracy_delta'] == 0.0
+
+        prototypes = FacePrototype.query.filter_by(person_id=household['alice_id']).all()
+        assert sorted(p.weight for p in prototypes) == [4, 4, 4]
+        assert FaceEncoding.query.filter_by(person_id=household['alice_id']).count() == 12
+        assert FacePrototype.query.filter_by(person_id=household['bob_id']).count() == 0
+
+    def test_recognition_uses_prototypes(self, household):
+        EncodingCompactionService.compact_user(household['user_id'], max_prototypes=3)
+
+        assert len(FaceRecognitionService.get_gallery(household['user_id'])) == 5
+        for look in household['looks']:
+            result = FaceRecognitionService.recognize_face(household['camera_id'], look)
+            assert result['person_id'] == household['alice_id']
+        result = FaceRecognitionService.recognize_face(household['camera_id'], household['bob_center'])
+        assert result['person_id'] == household['bob_id']
+
+    def test_new_encodings_fall_back_to_raw_rows(self, household):
+        EncodingCompactionService.compact_user(household['user_id'], max_prototypes=3)
+        db.session.add(FaceEncoding(person_id=household['alice_id'], encoding=household['looks'][0]))
+        db.session.commit()
+
+        assert len(FaceRecognitionService.get_gallery(household['user_id'])) == 15
+
+    def test_accuracy_loss_rolls_back(self, household):
+        report = EncodingCompactionService.compact_user(
+            household['user_id'], max_prototypes=1, max_accuracy_drop=-1.0
+        )
+
+        assert report['committed'] is False
+        assert report['accuracy_delta'] is not None
+        assert FacePrototype.query.count() == 0
+
+    def test_dry_run_reports_without_writing(self, household):
+        reports = EncodingCompactionService.compact_all(max_prototypes=3, dry_run=True)
+
+        assert [r['gallery_size_after'] for r in reports] == [5]
+        assert reports[0]['committed'] is False
+        assert FacePrototype.query.count() == 0
+
+    def test_delete_person_removes_prototypes(self, household):
+        EncodingCompactionService.compact_user(household['user_id'], max_prototypes=3)
+        FaceRecognitionService.delete_enrolled_person(household['alice_id'], household['user_id'])
+
+        assert FacePrototype.query.count() == 0
+        assert len(FaceRecognitionService.get_gallery(household['user_id'])) == 2
@@ -0,0 +1,78 @@
+import os
+import pytest
+from unittest.mock import patch
+from app.services.face_encoding_pool import FaceEncodingPool
+from app.services.face_recognition_service import FaceRecognitionService
+
+IMAGES = [
+    os.path.join(os.path.dirname(__file__), 'tmp', 'image1.jpg'),
+    os.path.join(os.path.dirname(__file__), 'tmp', 'image2.jpg')
+]
+
+class TestFaceEncodingPool:
+
+    def test_disabled_pool_encodes_inline(self):
+        pool = FaceEncodingPool(size=0)
+
+        with patch.object(FaceRecognitionService, 'encode_image_file', side_effect=lambda p: [p]) as encode:
+            results = pool.encode_files(IMAGES)
+
+        assert results == [[IMAGES[0]], [IMAGES[1]]]
+        assert encode.call_count == 2
+
+    def test_daemonic_process_encodes_inline(self):
+        pool = FaceEncodingPool(size=2)
+
+        with patch('app.services.face_encoding_pool.multiprocessing.current_process') as current, \
+             patch.object(FaceRecognitionService, 'encode_image_file', side_effect=lambda p: [p]):
+            current.return_value.daemon = True
+            assert pool.encode_files(IMAGES) == [[IMAGES[0]], [IMAGES[1]]]
+
+        assert pool._executor is None
+
+    def test_pool_that_cannot_start_falls_back_inline(self):
+        pool = FaceEncodingPool(size=2)
+        progress = []
+        failure = AssertionError('daemonic processes are not allowed to have children')
+
+        with patch('app.services.face_encoding_pool.ProcessPoolExecutor.submit', side_effect=failure), \
+             patch.object(FaceRecognitionService, 'encode_image_file', side_effect=lambda p: [p]):
+            results = pool.encode_files(IMAGES, progress_callback=lambda done, total, _: progress.append(done))
+
+        assert results == [[IMAGES[0]], [IMAGES[1]]]
+        assert progress == [1, 2]
+        assert pool.enabled is False and pool._executor is None
+
+    @pytest.mark.slow
+    def test_pool_encodes_files_in_order(self):
+        pool = FaceEncodingPool(size=2)
+        try:
+            expected = [FaceRecognitionService.encode_image_file(path, scale=1.0) for path in IMAGES]
+            assert pool.encode_files(IMAGES, timeout=120) == expected
+        finally:
+            pool.shutdown()
+
+        assert pool._executor is None
+
+    @pytest.mark.slow
+    def test_pool_locates_then_encodes_frame(self):
+        import face_recognition
+        pool = FaceEncodingPool(size=1)
+        image = face_recognition.load_image_file(IMAGES[0])
+        try:
+            locations = pool.locate_faces(image, timeout=120)
+            encodings = pool.encode_locations(image, locations, timeout=120)
+        finally:
+            pool.shutdown()
+
+        assert len(encodings) == len(locations)
+        assert pool.encode_locations(image, []) == []
+
+    @pytest.mark.slow
+    def test_pool_timeout(self):
+        pool = FaceEncodingPool(size=1)
+        try:
+            with pytest.raises(TimeoutError):
+                pool.encode_file(IMAGES[0], timeout=0.001)
+        finally:
+            pool.shutdown()
@@ -0,0 +1,95 @@
+import pytest
+import numpy as np
+from unittest.mock import patch
+from app.services.face_gallery_index import (
+    ExactGalleryIndex, IVFGalleryIndex, GalleryIndex, create_gallery_index, ENCODING_SIZE
+)
+
+def synthetic_gallery(identities, per_person=2, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.1, (identities, ENCODING_SIZE)).astype(np.float32)
+    vectors = np.repeat(centers, per_person, axis=0)
+    vectors += rng.normal(0, 0.01, vectors.shape).astype(np.float32)
+    person_ids = np.repeat(np.arange(identities), per_person)
+    return centers, vectors, person_ids
+
+@pytest.fixture(params=['exact', 'ivf'])
+def index(request):
+    return create_gallery_index(request.param)
+
+class TestGalleryIndex:
+
+    def test_empty_search(self, index):
+        distances, person_ids = index.search(np.zeros((2, ENCODING_SIZE)))
+
+        assert list(person_ids) == [-1, -1]
+
+    def test_finds_enrolled_identities(self, index):
+        centers, vectors, person_ids = synthetic_gallery(500)
+        index.build(vectors, person_ids)
+
+        _, found = index.search(centers[:50])
+
+        assert (found == np.arange(50)).mean() >= 0.95
+
+    def test_incremental_add_and_remove(self, index):
+        centers, vectors, person_ids = synthetic_gallery(200)
+        index.build(vectors, person_ids)
+
+        newcomer = np.full((1, ENCODING_SIZE), 0.3, dtype=np.float32)
+        index.add(999, np.repeat(newcomer, 2, axis=0))
+        assert index.search(newcomer)[1][0] == 999
+        assert len(index) == 402
+
+        index.remove(999)
+        assert 999 not in index.person_ids
+        assert len(index) == 400
+
+    def test_save_and_load_roundtrip(self, index, tmp_path):
+        centers, vectors, person_ids = synthetic_gallery(100)
+        index.build(vectors, person_ids)
+        index.signature = (200, 200)
+
+        path = str(tmp_path / 'gallery.npz')
+        index.save(path)
+        loaded = GalleryIndex.load(path)
+
+        assert type(loaded) is type(index)
+        assert loaded.signature == (200, 200)
+        np.testing.assert_array_equal(loaded.search(centers)[1], index.search(centers)[1])
+
+    def test_ivf_matches_exact_search(self):
+        centers, vectors, person_ids = synthetic_gallery(2000, seed=3)
+        exact = ExactGalleryIndex()
+        ivf = IVFGalleryIndex(nprobe=8)
+        exact.build(vectors, person_ids)
+        ivf.build(vectors, person_ids)
+
+        queries = centers[:200] + np.random.default_rng(4).normal(0, 0.01, (200, ENCODING_SIZE))
+        recall = (ivf.search(queries)[1] == exact.search(queries)[1]).mean()
+
+        assert recall >= 0.9
+
+    def test_ivf_add_and_remove_match_a_rebuild(self):
+        centers, vectors, person_ids = synthetic_gallery(400, seed=5)
+        ivf = IVFGalleryIndex()
+        ivf.build(vectors, person_ids)
+        newcomers = synthetic_gallery(3, per_person=4, seed=6)[1]
+
+        with patch.object(IVFGalleryIndex, '_layout') as layout:
+            ivf.add(1000, newcomers[:4])
+            ivf.add(1001, newcomers[4:])
+            ivf.remove(7)
+            ivf.remove(1000)
+        layout.assert_not_called()
+
+        keep = person_ids != 7
+        rebuilt = IVFGalleryIndex()
+        rebuilt.build(np.concatenate([vectors[keep], newcomers[4:]]),
+                      np.concatenate([person_ids[keep], np.full(8, 1001)]), centroids=ivf._state['centroids'])
+        for key in ('vectors', 'person_ids', 'sq_norms', 'offsets'):
+            np.testing.assert_array_equal(ivf._state[key], rebuilt._state[key])
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            create_gallery_index('hnsw')
@@ -0,0 +1,464 @@
+import pytest
+import io
+import os
+import warnings
+import numpy as np
+from unittest.mock import patch
+from PIL import Image
+from app import create_app, db
+from app.models import User, Camera, FacePerson, FaceEncoding, AccessLog
+from app.services.face_recognition_service import FaceRecognitionService
+
+def noise_image(size=64, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (size, size, 3), dtype=np.uint8)
+
+def png_bytes(size=64):
+    buffer = io.BytesIO()
+    Image.fromarray(noise_image(size)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return buffer
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        FaceRecognitionService.invalidate_gallery()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def household(app):
+    """User with one camera and two enrolled persons (3 encodings each)"""
+    rng = np.random.default_rng(42)
+
+    user = User(username='facetest', email='face@example.com')
+    user.set_password('Test@123456')
+    db.session.add(user)
+    db.session.flush()
+
+    camera = Camera(user_id=user.id, name='Front Door')
+    db.session.add(camera)
+
+    centers = {}
+    for name in ('Alice', 'Bob'):
+        person = FacePerson(user_id=user.id, name=name, relation='family', is_resident=True)
+        db.session.add(person)
+        db.session.flush()
+
+        center = rng.normal(0, 0.1, FaceRecognitionService.ENCODING_SIZE)
+        centers[name] = (person.id, center)
+        for _ in range(3):
+            noisy = center + rng.normal(0, 0.01, FaceRecognitionService.ENCODING_SIZE)
+            db.session.add(FaceEncoding(person_id=person.id, encoding=noisy.tolist()))
+
+    db.session.commit()
+    return {'user_id': user.id, 'camera_id': camera.id, 'centers': centers}
+
+class TestFaceGallery:
+
+    def test_gallery_is_contiguous_float32_matrix(self, household):
+        gallery = FaceRecognitionService.get_gallery(household['user_id'])
+
+        assert gallery.matrix.shape == (6, FaceRecognitionService.ENCODING_SIZE)
+        assert gallery.matrix.dtype == np.float32
+        assert gallery.matrix.flags['C_CONTIGUOUS']
+        assert len(gallery.person_ids) == 6
+
+    def test_gallery_is_reused(self, household):
+        first = FaceRecognitionService.get_gallery(household['user_id'])
+        second = FaceRecognitionService.get_gallery(household['user_id'])
+
+        assert first is second
+
+    def test_recognize_face_matches_closest_person(self, household):
+        bob_id, bob_center = household['centers']['Bob']
+
+        result = FaceRecognitionService.recognize_face(household['camera_id'], bob_center.tolist())
+
+        assert result['is_known'] is True
+        assert result['person_id'] == bob_id
+        assert result['person_name'] == 'Bob'
+
+    def test_recognize_face_unknown(self, household):
+        stranger = np.full(FaceRecognitionService.ENCODING_SIZE, 0.5)
+
+        result = FaceRecognitionService.recognize_face(household['camera_id'], stranger.tolist())
+
+        assert result['is_known'] is False
+
+    def test_delete_invalidates_gallery(self, household):
+        bob_id, bob_center = household['centers']['Bob']
+        FaceRecognitionService.get_gallery(household['user_id'])
+
+        result = FaceRecognitionService.delete_enrolled_person(bob_id, household['user_id'])
+        assert result['success'] is True
+
+        gallery = FaceRecognitionService.get_gallery(household['user_id'])
+        assert bob_id not in gallery.person_ids
+
+        result = FaceRecognitionService.recognize_face(household['camera_id'], bob_center.tolist())
+        assert result.get('person_id') != bob_id
+
+    def test_gallery_notices_rows_added_elsewhere(self, household):
+        FaceRecognitionService.get_gallery(household['user_id'])
+        alice_id, alice_center = household['centers']['Alice']
+
+        db.session.add(FaceEncoding(person_id=alice_id, encoding=alice_center.tolist()))
+        db.session.commit()
+
+        gallery = FaceRecognitionService.get_gallery(household['user_id'])
+        assert len(gallery.person_ids) == 7
+
+class TestFaceEncodingStorage:
+
+    def test_encoding_is_packed_float32(self, household):
+        encoding = FaceEncoding.query.first()
+
+        assert isinstance(encoding.encoding, bytes)
+        assert len(encoding.encoding) == 4 * FaceRecognitionService.ENCODING_SIZE
+        assert encoding.vector.dtype == np.dtype('<f4')
+        assert encoding.vector.shape == (FaceRecognitionService.ENCODING_SIZE,)
+
+    def test_find_closest_match_accepts_packed_encodings(self, household):
+        alice_id, alice_center = household['centers']['Alice']
+        known = [enc.encoding for enc in FaceEncoding.query.filter_by(person_id=alice_id)]
+
+        result = FaceRecognitionService.find_closest_match(alice_center.tolist(), known)
+
+        assert result['is_match'] is True
+
+    def test_enrolled_persons_expose_vector_views(self, household):
+        persons = FaceRecognitionService.get_enrolled_persons(household['user_id'], include_encodings=True)
+
+        assert all(len(p['encodings']) == 3 for p in persons)
+        assert all(not vec.flags['OWNDATA'] for p in persons for vec in p['encodings'])
+
+class TestBatchRecognition:
+
+    def test_batch_matches_each_face(self, household):
+        alice_id, alice_center = household['centers']['Alice']
+        bob_id, bob_center = household['centers']['Bob']
+        stranger = np.full(FaceRecognitionService.ENCODING_SIZE, 0.5)
+
+        results = FaceRecognitionService.recognize_faces_batch(
+            household['camera_id'], [bob_center, stranger, alice_center]
+        )
+
+        assert [r.get('person_id') for r in results] == [bob_id, None, alice_id]
+        assert results[1]['is_known'] is False
+
+    def test_batch_agrees_with_brute_force_distances(self, household):
+        gallery = FaceRecognitionService.get_gallery(household['user_id'])
+        queries = np.random.default_rng(7).normal(0, 0.1, (4, FaceRecognitionService.ENCODING_SIZE))
+
+        matches = FaceRecognitionService.match_gallery_batch(list(queries), gallery)
+
+        for query, match in zip(queries, matches):
+            expected = np.linalg.norm(gallery.matrix - query.astype(np.float32), axis=1).min()
+            assert match['distance'] == pytest.approx(float(expected), abs=1e-4)
+
+    def test_batch_is_capped_at_max_faces_per_frame(self, app, household):
+        app.config['MAX_FACES_PER_FRAME'] = 2
+        _, alice_center = household['centers']['Alice']
+
+        results = FaceRecognitionService.recognize_faces_batch(household['camera_id'], [alice_center] * 5)
+
+        assert len(results) == 2
+
+    def test_recognize_route_logs_every_face(self, app, client, household, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        user = User.query.get(household['user_id'])
+        user.is_verified = True
+        db.session.commit()
+        client.post('/auth/login', data={'email': 'face@example.com', 'password': 'Test@123456'})
+
+        _, alice_center = household['centers']['Alice']
+        stranger = np.full(FaceRecognitionService.ENCODING_SIZE, 0.5)
+
+        with patch.object(FaceRecognitionService, 'locate_faces', return_value=[(0, 10, 10, 0), (20, 30, 30, 20)]), \
+             patch('face_recognition.face_encodings', return_value=[alice_center, stranger]):
+            response = client.post('/face/recognize', data={
+                'camera_id': str(household['camera_id']),
+                'image': (png_bytes(), 'door.png')
+            }, content_type='multipart/form-data')
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['face_count'] == 2
+        assert data['faces'][0]['recognition']['person_name'] == 'Alice'
+        assert data['faces'][1]['recognition']['is_known'] is False
+        assert AccessLog.query.filter_by(camera_id=household['camera_id']).count() == 2
+
+    def test_recognize_route_makes_one_door_decision(self, app, client, household, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        user = User.query.get(household['user_id'])
+        user.is_verified = True
+        db.session.commit()
+        client.post('/auth/login', data={'email': 'face@example.com', 'password': 'Test@123456'})
+
+        _, alice_center = household['centers']['Alice']
+        _, bob_center = household['centers']['Bob']
+        stranger = np.full(FaceRecognitionService.ENCODING_SIZE, 0.5)
+        door_opened = {'action': 'door_opened', 'access_granted': True}
+
+        with patch.object(FaceRecognitionService, 'locate_faces',
+                          return_value=[(0, 10, 10, 0), (20, 30, 30, 20), (40, 50, 50, 40)]), \
+             patch('face_recognition.face_encodings', return_value=[stranger, alice_center, bob_center]), \
+             patch('app.services.door_control_service.DoorControlService.process_recognition',
+                   return_value=door_opened) as process:
+            response = client.post('/face/recognize', data={
+                'camera_id': str(household['camera_id']),
+                'image': (png_bytes(), 'door.png')
+            }, content_type='multipart/form-data')
+
+        data = response.get_json()
+        process.assert_called_once()
+        decided = process.call_args[0][0]['person_name']
+        assert decided in ('Alice', 'Bob')
+        assert data['recognition']['person_name'] == decided
+        assert data['door_action'] == door_opened
+        assert [face['door_action']['action'] for face in data['faces']].count('door_opened') == 1
+        assert AccessLog.query.filter_by(camera_id=household['camera_id'], access_granted=True).count() == 1
+        assert AccessLog.query.filter_by(camera_id=household['camera_id']).count() == 3
+
+class TestRecognitionCache:
+
+    def test_repeat_frame_is_served_from_cache(self, household):
+        _, alice_center = household['centers']['Alice']
+        frame = noise_image()
+
+        with patch.object(FaceRecognitionService, 'locate_faces', return_value=[(8, 40, 40, 8)]), \
+             patch('face_recognition.face_encodings', return_value=[alice_center]) as encode:
+            first = FaceRecognitionService.recognize_frame(household['camera_id'], frame)
+            second = FaceRecognitionService.recognize_frame(household['camera_id'], frame)
+
+        assert encode.call_count == 1
+        assert first[0]['cached'] is False and second[0]['cached'] is True
+        assert second[0]['recognition'] == first[0]['recognition']
+        assert second[0]['recognition']['person_name'] == 'Alice'
+
+    def test_access_control_reuses_only_exact_matches(self, household):
+        _, alice_center = household['centers']['Alice']
+        frame = noise_image()
+
+        with patch.object(FaceRecognitionService, 'locate_faces', return_value=[(8, 40, 40, 8)]), \
+             patch('app.services.face_recognition_service.face_crop_hash', side_effect=[0b1000, 0b1001, 0b1001]), \
+             patch('face_recognition.face_encodings', return_value=[alice_center]) as encode:
+            FaceRecognitionService.recognize_frame(household['camera_id'], frame)
+            display = FaceRecognitionService.recognize_frame(household['camera_id'], frame)
+            door = FaceRecognitionService.recognize_frame(household['camera_id'], frame, access_control=True)
+
+        assert display[0]['cached'] is True
+        assert door[0]['cached'] is False
+        assert encode.call_count == 2
+
+    def test_cache_is_per_camera(self, household):
+        _, alice_center = household['centers']['Alice']
+        frame = noise_image()
+
+        with patch.object(FaceRecognitionService, 'locate_faces', return_value=[(8, 40, 40, 8)]), \
+             patch('face_recognition.face_encodings', return_value=[alice_center]) as encode:
+            FaceRecognitionService.recognize_frame(household['camera_id'], frame)
+            FaceRecognitionService.recognize_frame(household['camera_id'] + 1, frame)
+
+        assert encode.call_count == 2
+
+    def test_enrollment_clears_cached_results(self, household):
+        newcomer = np.full(FaceRecognitionService.ENCODING_SIZE, 0.3)
+        frame = noise_image()
+
+        with patch.object(FaceRecognitionService, 'locate_faces', return_value=[(8, 40, 40, 8)]), \
+             patch('face_recognition.face_encodings', return_value=[newcomer]):
+            before = FaceRecognitionService.recognize_frame(household['camera_id'], frame)
+            with patch.object(FaceRecognitionService, 'encode_image_file',
+                              return_value=[{'encoding': newcomer.tolist(), 'location': (0, 10, 10, 0)}]):
+                FaceRecognitionService.enroll_person(household['user_id'], 'Carol', ['a.jpg', 'b.jpg'])
+            after = FaceRecognitionService.recognize_frame(household['camera_id'], frame)
+
+        assert before[0]['recognition']['is_known'] is False
+        assert after[0]['cached'] is False
+        assert after[0]['recognition']['person_name'] == 'Carol'
+
+class TestGalleryMaintenance:
+
+    def test_enroll_adds_to_cached_gallery_incrementally(self, household):
+        gallery = FaceRecognitionService.get_gallery(household['user_id'])
+        newcomer = np.full(FaceRecognitionService.ENCODING_SIZE, 0.3)
+        faces = [{'encoding': newcomer.tolist(), 'location': (0, 10, 10, 0)}]
+
+        with patch.object(FaceRecognitionService, 'encode_image_file', return_value=faces):
+            result = FaceRecognitionService.enroll_person(household['user_id'], 'Carol', ['a.jpg', 'b.jpg'])
+
+        assert result['success'] is True
+        assert FaceRecognitionService.get_gallery(household['user_id']) is gallery
+        assert len(gallery) == 8
+        assert FaceRecognitionService.recognize_face(household['camera_id'], newcomer)['person_name'] == 'Carol'
+
+    def test_rows_committed_elsewhere_during_update_are_not_skipped(self, household):
+        FaceRecognitionService.get_gallery(household['user_id'])
+        newcomer = np.full(FaceRecognitionService.ENCODING_SIZE, 0.3)
+        visitor = np.full(FaceRecognitionService.ENCODING_SIZE, -0.3)
+        faces = [{'encoding': newcomer.tolist(), 'location': (0, 10, 10, 0)}]
+        update_gallery = FaceRecognitionService._update_gallery
+
+        def enrolled_elsewhere_first(*args, **kwargs):
+            # Another process commits a person after this enrollment's commit, before the gallery update
+            dave = FacePerson(user_id=household['user_id'], name='Dave', relation='friend', is_resident=False)
+            db.session.add(dave)
+            db.session.flush()
+            db.session.add(FaceEncoding(person_id=dave.id, encoding=visitor.tolist()))
+            db.session.commit()
+            return update_gallery(*args, **kwargs)
+
+        with patch.object(FaceRecognitionService, 'encode_image_file', return_value=faces), \
+             patch.object(FaceRecognitionService, '_update_gallery', side_effect=enrolled_elsewhere_first):
+            FaceRecognitionService.enroll_person(household['user_id'], 'Carol', ['a.jpg', 'b.jpg'])
+
+        assert FaceRecognitionService.recognize_face(household['camera_id'], visitor)['person_name'] == 'Dave'
+        assert FaceRecognitionService.recognize_face(household['camera_id'], newcomer)['person_name'] == 'Carol'
+
+    def test_gallery_is_persisted_and_reloaded(self, app, household, tmp_path):
+        app.config['FACE_GALLERY_PATH'] = str(tmp_path)
+        gallery = FaceRecognitionService.get_gallery(household['user_id'])
+        assert (tmp_path / f"user_{household['user_id']}.npz").exists()
+
+        FaceRecognitionService.invalidate_gallery()
+        reloaded = FaceRecognitionService.get_gallery(household['user_id'])
+
+        assert reloaded is not gallery
+        assert reloaded.signature == gallery.signature
+        np.testing.assert_array_equal(reloaded.person_ids, gallery.person_ids)
+
+    def test_signature_counts_encodings_and_prototypes(self, household):
+        max_id = db.session.query(db.func.max(FaceEncoding.id)).scalar()
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            signature = FaceRecognitionService._gallery_signature(household['user_id'])
+
+        assert signature == (6, max_id, 0, None)
+
+    def test_ivf_backend_used_for_large_galleries(self, app, household):
+        app.config['FACE_GALLERY_IVF_MIN_SIZE'] = 4
+        bob_id, bob_center = household['centers']['Bob']
+
+        assert FaceRecognitionService.get_gallery(household['user_id']).backend == 'ivf'
+        assert FaceRecognitionService.recognize_face(household['camera_id'], bob_center)['person_id'] == bob_id
+
+class TestEnrollmentJob:
+
+    def _login(self, client, household):
+        user = User.query.get(household['user_id'])
+        user.is_verified = True
+        db.session.commit()
+        client.post('/auth/login', data={'email': 'face@example.com', 'password': 'Test@123456'})
+
+    def test_enroll_reports_progress_per_image(self, household):
+        faces = [{'encoding': np.full(FaceRecognitionService.ENCODING_SIZE, 0.3).tolist(), 'location': (0, 10, 10, 0)}]
+        stages = []
+
+        with patch.object(FaceRecognitionService, 'encode_image_file', return_value=faces):
+            result = FaceRecognitionService.enroll_person(
+                household['user_id'], 'Carol', ['a.jpg', 'b.jpg'],
+                progress_callback=lambda stage, **data: stages.append((stage, data))
+            )
+
+        assert result['success'] is True
+        assert [stage for stage, _ in stages] == ['encoding', 'encoding', 'encodings_stored']
+        assert stages[1][1] == {'images_encoded': 2, 'total_images': 2, 'faces_found': 2}
+        assert stages[2][1] == {'person_id': result['person_id'], 'encoding_count': 2}
+
+    def test_enroll_route_queues_job_when_async(self, app, client, household, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        app.config['FACE_ENROLLMENT_ASYNC'] = True
+        self._login(client, household)
+
+        with patch('app.routes.face.enqueue_enrollment', return_value='job-1') as enqueue:
+            response = client.post('/face/enroll', data={
+                'person_name': 'Carol',
+                'images': [(io.BytesIO(b'fake'), 'a.jpg'), (io.BytesIO(b'fake'), 'b.jpg')]
+            }, content_type='multipart/form-data')
+
+        assert response.status_code == 202
+        assert response.get_json() == {'success': True, 'job_id': 'job-1', 'status': 'queued'}
+        assert len(enqueue.call_args[0][2]) == 2
+        assert FacePerson.query.filter_by(name='Carol').count() == 0
+
+    def test_enroll_route_falls_back_inline_without_broker(self, app, client, household, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        app.config['FACE_ENROLLMENT_ASYNC'] = True
+        self._login(client, household)
+        faces = [{'encoding': np.full(FaceRecognitionService.ENCODING_SIZE, 0.3).tolist(), 'location': (0, 10, 10, 0)}]
+
+        with patch('app.routes.face.enqueue_enrollment', side_effect=ConnectionError('broker down')), \
+             patch.object(FaceRecognitionService, 'encode_image_file', return_value=faces):
+            response = client.post('/face/enroll', data={
+                'person_name': 'Carol',
+                'images': [(io.BytesIO(b'fake'), 'a.jpg'), (io.BytesIO(b'fake'), 'b.jpg')]
+            }, content_type='multipart/form-data')
+
+        assert response.status_code == 201
+        assert response.get_json()['encoding_count'] == 2
+
+    def test_enroll_task_encodes_inline_in_prefork_worker(self, household, tmp_path, monkeypatch):
+        monkeypatch.setenv('FLASK_ENV', 'testing')
+        from app import celery_tasks
+        from app.services.face_encoding_pool import FaceEncodingPool
+        paths = []
+        for name in ('a.jpg', 'b.jpg'):
+            (tmp_path / name).write_bytes(b'fake')
+            paths.append(str(tmp_path / name))
+        faces = [{'encoding': np.full(FaceRecognitionService.ENCODING_SIZE, 0.3).tolist(), 'location': (0, 10, 10, 0)}]
+
+        # A pool sized as in the default config, inside a daemonic billiard child
+        with patch('app.services.face_encoding_pool.get_encoding_pool', return_value=FaceEncodingPool(size=2)), \
+             patch('app.services.face_encoding_pool.multiprocessing.current_process') as current, \
+             patch.object(FaceRecognitionService, 'encode_image_file', return_value=faces), \
+             patch.object(celery_tasks.enroll_person, 'update_state'), \
+             patch('app.utils.socketio_utils.send_enrollment_progress'):
+            current.return_value.daemon = True
+            result = celery_tasks.enroll_person.run(household['user_id'], 'Carol', paths, job_id='job-1')
+
+        assert celery_tasks.flask_app.config['FACE_ENCODING_POOL_SIZE'] == 0
+        assert result['success'] is True
+        assert result['encoding_count'] == 2
+        assert all(os.path.exists(path) for path in paths)
+
+class TestFaceLocalisation:
+
+    def test_boxes_are_mapped_back_to_original_resolution(self, app):
+        frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+        with patch('face_recognition.face_locations', return_value=[(100, 300, 250, 150)]) as locate:
+            locations = FaceRecognitionService.locate_faces(frame, scale=0.25)
+
+        assert locate.call_args[0][0].shape == (270, 480, 3)
+        assert locations == [(400, 1200, 1000, 600)]
+
+    def test_small_images_are_not_shrunk_below_min_width(self, app):
+        app.config['FACE_DETECTION_MIN_WIDTH'] = 320
+        image = np.zeros((200, 200, 3), dtype=np.uint8)
+
+        with patch('face_recognition.face_locations', return_value=[]) as locate:
+            FaceRecognitionService.locate_faces(image, scale=0.5)
+
+        assert locate.call_args[0][0].shape == (200, 200, 3)
+
+    def test_encodings_use_full_resolution_image(self, app):
+        app.config['FACE_DETECTION_SCALE'] = 0.5
+        frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+        with patch('face_recognition.face_locations', return_value=[(10, 60, 60, 10)]), \
+             patch('face_recognition.face_encodings', return_value=[np.zeros(128)]) as encode:
+            results = FaceRecognitionService.encode_opencv_frame(frame)
+
+        assert encode.call_args[0][0].shape == (1080, 1920, 3)
+        assert encode.call_args[0][1] == [(20, 120, 120, 20)]
+        assert results[0]['location'] == (20, 120, 120, 20)
@@ -0,0 +1,152 @@
+import pytest
+import numpy as np
+from unittest.mock import patch
+from app import create_app, db
+from app.models import User, Camera, FacePerson, FaceEncoding, AccessLog
+from app.services.camera_stream_manager import CameraStreamManager
+from app.services.face_recognition_service import FaceRecognitionService
+from app.services.face_tracker import FaceTracker, box_iou
+
+FRAME = np.zeros((120, 160, 3), dtype=np.uint8)
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        FaceRecognitionService.invalidate_gallery()
+        CameraStreamManager.face_trackers.clear()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def household(app):
+    """User with one streaming camera and one enrolled resident"""
+    rng = np.random.default_rng(7)
+
+    user = User(username='tracktest', email='track@example.com')
+    user.set_password('Test@123456')
+    db.session.add(user)
+    db.session.flush()
+
+    camera = Camera(user_id=user.id, name='Porch', face_detection_enabled=True)
+    person = FacePerson(user_id=user.id, name='Alice', relation='family', is_resident=True)
+    db.session.add_all([camera, person])
+    db.session.flush()
+
+    center = rng.normal(0, 0.1, FaceRecognitionService.ENCODING_SIZE)
+    for _ in range(2):
+        noisy = center + rng.normal(0, 0.01, FaceRecognitionService.ENCODING_SIZE)
+        db.session.add(FaceEncoding(person_id=person.id, encoding=noisy.tolist()))
+
+    db.session.commit()
+    return {'camera_id': camera.id, 'person_id': person.id, 'center': center}
+
+def stream(camera_id, boxes_per_frame, encodings, start=0.0, step=0.1):
+    """Feed frames with the given face boxes; returns (per-frame results, encode mock)"""
+    results = []
+    with patch.object(FaceRecognitionService, 'locate_faces', side_effect=boxes_per_frame), \
+         patch('face_recognition.face_encodings', side_effect=lambda image, locations: encodings[:len(locations)]) as encode:
+        for i in range(len(boxes_per_frame)):
+            results.append(CameraStreamManager.track_faces(camera_id, FRAME, now=start + i * step))
+    return results, encode
+
+class TestFaceTracker:
+
+    def test_box_iou(self):
+        iou = box_iou([(0, 10, 10, 0)], [(0, 10, 10, 0), (0, 15, 10, 5), (50, 60, 60, 50)])
+        np.testing.assert_allclose(iou[0], [1.0, 1 / 3, 0.0], rtol=1e-6)
+
+    def test_moving_face_keeps_its_track(self):
+        tracker = FaceTracker()
+        first = tracker.update([(10, 50, 50, 10)], now=0.0)[0]
+        second = tracker.update([(12, 53, 52, 13)], now=0.1)[0]
+
+        assert second is first
+        assert second.frames == 2
+
+    def test_two_faces_are_not_swapped(self):
+        tracker = FaceTracker()
+        left, right = tracker.update([(10, 40, 40, 10), (10, 110, 40, 80)], now=0.0)
+        tracks = tracker.update([(11, 112, 41, 82), (11, 42, 41, 12)], now=0.1)
+
+        assert tracks == [right, left]
+
+    def test_stale_tracks_expire(self):
+        tracker = FaceTracker(max_age=1.0)
+        first = tracker.update([(10, 50, 50, 10)], now=0.0)[0]
+        again = tracker.update([(10, 50, 50, 10)], now=1.5)[0]
+
+        assert again is not first
+        assert tracker.stats()['active_tracks'] == 1
+
+    def test_reverify_interval(self):
+        tracker = FaceTracker(reverify_interval=5.0)
+        track = tracker.update([(10, 50, 50, 10)], now=0.0)[0]
+        assert tracker.needs_recognition(track, now=0.0)
+
+        tracker.mark_recognized(track, {'is_known': False}, now=0.0)
+        assert not tracker.needs_recognition(track, now=4.9)
+        assert tracker.needs_recognition(track, now=5.0)
+
+class TestStreamFaceTracking:
+
+    def test_one_recognition_and_access_log_per_visit(self, household):
+        frames = [[(10, 60, 60, 10 + i)] for i in range(30)]
+        results, encode = stream(household['camera_id'], frames, [household['center']])
+
+        assert encode.call_count == 1
+        assert all(r[0]['recognition']['person_name'] == 'Alice' for r in results)
+        assert AccessLog.query.filter_by(camera_id=household['camera_id']).count() == 1
+        assert results[-1][0]['access_log_id'] is not None
+        assert FacePerson.query.get(household['person_id']).recognition_count == 1
+
+    def test_track_is_reverified_without_new_visit(self, app, household):
+        app.config['FACE_TRACK_REVERIFY_SECONDS'] = 1.0
+        frames = [[(10, 60, 60, 10)] for _ in range(25)]
+        _, encode = stream(household['camera_id'], frames, [household['center']])
+
+        assert encode.call_count == 3
+        assert AccessLog.query.filter_by(camera_id=household['camera_id']).count() == 1
+
+    def test_returning_after_gap_is_a_new_visit(self, household):
+        frames = [[(10, 60, 60, 10)]] * 3
+        stream(household['camera_id'], frames, [household['center']], start=0.0)
+        stream(household['camera_id'], frames, [household['center']], start=10.0)
+
+        assert AccessLog.query.filter_by(camera_id=household['camera_id']).count() == 2
+
+    def test_unknown_visitor_logged_once(self, household):
+        stranger = np.full(FaceRecognitionService.ENCODING_SIZE, 0.5)
+        frames = [[(10, 60, 60, 10), (10, 150, 60, 100)]] * 10
+        results, _ = stream(household['camera_id'], frames, [household['center'], stranger])
+
+        logs = AccessLog.query.filter_by(camera_id=household['camera_id']).all()
+        assert sorted(log.is_known for log in logs) == [False, True]
+        assert results[-1][1]['recognition']['is_known'] is False
+
+    def test_one_door_decision_per_frame(self, household):
+        stranger = np.full(FaceRecognitionService.ENCODING_SIZE, 0.5)
+        frames = [[(10, 60, 60, 10), (10, 150, 60, 100)]]
+        door_opened = {'action': 'door_opened', 'access_granted': True}
+
+        with patch('app.services.door_control_service.DoorControlService.process_recognition',
+                   return_value=door_opened) as process:
+            stream(household['camera_id'], frames, [stranger, household['center']])
+
+        process.assert_called_once()
+        assert process.call_args[0][0]['person_name'] == 'Alice'
+        logs = AccessLog.query.filter_by(camera_id=household['camera_id']).all()
+        assert sorted((log.person_name, log.action) for log in logs) == [('Alice', 'door_opened'), ('Unknown', 'alert_sent')]
+
+    def test_stream_stats_include_tracking(self, household):
+        CameraStreamManager.register_camera_stream(household['camera_id'], 1, track_faces=True)
+        try:
+            stream(household['camera_id'], [[(10, 60, 60, 10)]] * 5, [household['center']])
+            stats = CameraStreamManager.get_active_streams()[0]['face_tracking']
+            assert stats == {'active_tracks': 1, 'faces_seen': 5, 'recognitions': 1}
+        finally:
+            CameraStreamManager.unregister_camera_stream(household['camera_id'])
+        assert household['camera_id'] not in CameraStreamManager.face_trackers
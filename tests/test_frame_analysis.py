@@ -0,0 +1,170 @@
+import pytest
+import cv2
+import numpy as np
+from types import SimpleNamespace
+from unittest.mock import patch
+from app.services.camera_service import CameraService
+from app.services.frame_analysis import FrameAnalysisEngine, FrameContext
+from app.services.ml_service import MLService
+
+def make_frame(seed=0):
+    return np.random.default_rng(seed).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+
+def make_camera(motion=True, objects=True, faces=True):
+    return SimpleNamespace(id=1, motion_enabled=motion, object_detection_enabled=objects,
+                           face_detection_enabled=faces)
+
+@pytest.fixture
+def engine():
+    return FrameAnalysisEngine(CameraService(), MLService())
+
+class TestFrameContext:
+
+    def test_intermediates_are_cached(self):
+        context = FrameContext(make_frame())
+
+        assert context.gray is context.gray
+        assert context.blob() is context.blob()
+        assert context.blob((320, 320)).shape == (1, 3, 320, 320)
+
+    def test_intermediates_match_direct_preprocessing(self):
+        frame = make_frame()
+        context = FrameContext(frame)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        assert np.array_equal(context.gray, gray)
+        assert np.array_equal(context.blob(), cv2.dnn.blobFromImage(frame, 1 / 255.0, (416, 416), swapRB=True, crop=False))
+
+class TestFrameAnalysisEngine:
+
+    def test_grayscale_computed_once_per_frame(self, engine):
+        with patch('app.services.frame_analysis.cv2.cvtColor', wraps=cv2.cvtColor) as cvt:
+            engine.analyze(make_camera(), make_frame())
+
+        assert cvt.call_count == 1
+
+    def test_flags_gate_stages(self, engine):
+        with patch.object(engine.camera_service, 'detect_motion', return_value=True) as motion, \
+             patch.object(engine.ml_service, 'detect_objects', return_value=[]) as objects, \
+             patch.object(engine.ml_service, 'detect_faces', return_value=[]) as faces:
+            results = engine.analyze(make_camera(objects=False), make_frame())
+
+        assert motion.called and faces.called and not objects.called
+        assert results['motion'] == True
+        assert set(results['timings']) == {'motion', 'faces'}
+
+    def test_results_match_individual_detectors(self, engine):
+        frame = make_frame()
+        expected_faces = MLService().detect_faces(frame)
+
+        reference = CameraService()
+        reference.detect_motion(1, make_frame(1))
+        engine.camera_service.detect_motion(1, make_frame(1))
+
+        results = engine.analyze(make_camera(objects=False), frame)
+
+        assert results['faces'] == expected_faces
+        assert results['motion'] == reference.detect_motion(1, frame)
+
+    def test_stage_hooks(self, engine):
+        calls = []
+        engine.add_stage_hook(lambda stage, seconds, context: calls.append((stage, context.camera_id)))
+
+        engine.analyze(make_camera(objects=False), make_frame())
+
+        assert calls == [('motion', 1), ('faces', 1)]
+
+class TestMotionGating:
+
+    @pytest.fixture
+    def app(self):
+        from app import create_app
+        app = create_app('testing')
+        app.config.update(MOTION_GATED_INFERENCE=True, MOTION_GATE_HEARTBEAT=60,
+                          MOTION_GATE_CROP_MAX_AREA=0.5, MOTION_GATE_CROP_PADDING=8)
+        with app.app_context():
+            yield app
+
+    @staticmethod
+    def still_frame():
+        return np.zeros((240, 320, 3), dtype=np.uint8)
+
+    @staticmethod
+    def moving_frame():
+        frame = np.zeros((240, 320, 3), dtype=np.uint8)
+        frame[20:80, 200:260] = 255
+        return frame
+
+    def test_static_scene_skips_inference(self, app, engine):
+        camera = make_camera(motion=False)
+        with patch.object(engine.ml_service, 'detect_faces', return_value=[]) as faces:
+            decisions = [engine.analyze(camera, self.still_frame())['gate']['decision'] for _ in range(4)]
+
+        assert decisions == ['heartbeat', 'skipped', 'skipped', 'skipped']
+        assert faces.call_count == 1
+        assert engine.stats(1) == {'frames': 4, 'inferences': 2, 'skipped': 6, 'cropped': 0}
+
+    def test_heartbeat_runs_full_frame(self, app, engine):
+        app.config['MOTION_GATE_HEARTBEAT'] = 0
+        camera = make_camera(motion=False, objects=False)
+        with patch.object(engine.ml_service, 'detect_faces', return_value=[]) as faces:
+            for _ in range(3):
+                results = engine.analyze(camera, self.still_frame())
+
+        assert results['gate']['decision'] == 'heartbeat'
+        assert faces.call_count == 3
+
+    def test_detectors_run_on_motion_crops(self, app, engine):
+        camera = make_camera(motion=False, objects=False)
+        shapes = []
+
+        def detect_faces(frame, gray=None, **kwargs):
+            shapes.append(frame.shape[:2])
+            return [{'confidence': 0.9, 'bbox': [5, 5, 10, 10]}]
+
+        with patch.object(engine.ml_service, 'detect_faces', side_effect=detect_faces):
+            engine.analyze(camera, self.still_frame())
+            results = engine.analyze(camera, self.moving_frame())
+
+        assert results['motion'] is False
+        assert results['gate'] == {'decision': 'crops', 'crops': 1}
+        assert shapes[0] == (240, 320)
+        assert shapes[1][0] < 240 and shapes[1][1] < 320
+        x, y, _, _ = results['faces'][0]['bbox']
+        assert x > 5 and y > 5
+        assert engine.stats(1)['cropped'] == 1
+
+    def test_gate_reports_motion_only_when_enabled(self, app):
+        reported = {}
+        for motion in (False, True):
+            engine = FrameAnalysisEngine(CameraService(), MLService())
+            camera = make_camera(motion=motion, objects=False)
+            with patch.object(engine.ml_service, 'detect_faces', return_value=[]):
+                engine.analyze(camera, self.still_frame())
+                results = engine.analyze(camera, self.moving_frame())
+            assert results['gate']['decision'] == 'crops'
+            reported[motion] = results['motion']
+
+        assert reported == {False: False, True: True}
+
+    def test_gating_disabled_runs_every_frame(self, app, engine):
+        app.config['MOTION_GATED_INFERENCE'] = False
+        camera = make_camera(motion=False, objects=False)
+        with patch.object(engine.ml_service, 'detect_faces', return_value=[]) as faces:
+            for _ in range(3):
+                results = engine.analyze(camera, self.still_frame())
+
+        assert 'gate' not in results
+        assert faces.call_count == 3
+
+    def test_motion_crops_merge_overlapping_regions(self):
+        from app.services.frame_analysis import motion_crops
+        regions = [
+            {'x': 10, 'y': 10, 'width': 20, 'height': 20},
+            {'x': 35, 'y': 10, 'width': 20, 'height': 20},
+            {'x': 200, 'y': 150, 'width': 10, 'height': 10}
+        ]
+
+        crops = motion_crops(regions, 320, 240, padding=5)
+
+        assert sorted(crops) == [(5, 5, 55, 30), (195, 145, 20, 20)]
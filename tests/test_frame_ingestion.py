@@ -0,0 +1,123 @@
+import base64
+import io
+import threading
+import time
+import pytest
+import numpy as np
+from PIL import Image
+from app import create_app, db
+from app.models import User, Camera
+from app.services.camera_stream_manager import CameraStreamManager
+from app.services.frame_ingestion import FrameIngestion, get_frame_ingestion
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not met in time')
+        time.sleep(0.01)
+
+class TestFrameIngestion:
+
+    def test_slow_analysis_drops_oldest_and_analyses_latest(self):
+        release = threading.Event()
+        seen = []
+
+        def handler(camera_id, frame):
+            seen.append(frame)
+            release.wait(5)
+
+        ingestion = FrameIngestion(handler, workers=1, buffer_size=2)
+        try:
+            ingestion.submit(1, 0)
+            wait_until(lambda: seen == [0])
+
+            accepted = [ingestion.submit(1, frame) for frame in range(1, 6)]
+            assert accepted == [True, True, False, False, False]
+            assert ingestion.stats(1)['queue_depth'] == 2
+
+            release.set()
+            wait_until(lambda: ingestion.stats(1)['processed'] == 2)
+        finally:
+            ingestion.stop()
+
+        assert seen == [0, 5]
+        assert ingestion.stats(1) == {'received': 6, 'dropped': 4, 'processed': 2, 'queue_depth': 0}
+
+    def test_camera_is_analysed_by_one_worker_at_a_time(self):
+        active, overlaps, done = {}, [], []
+        lock = threading.Lock()
+
+        def handler(camera_id, frame):
+            with lock:
+                active[camera_id] = active.get(camera_id, 0) + 1
+                overlaps.append(active[camera_id])
+            time.sleep(0.005)
+            with lock:
+                active[camera_id] -= 1
+                done.append((camera_id, frame))
+
+        ingestion = FrameIngestion(handler, workers=4, buffer_size=1)
+        try:
+            for frame in range(50):
+                for camera_id in (1, 2):
+                    ingestion.submit(camera_id, frame)
+            wait_until(lambda: all(ingestion.stats(c)['queue_depth'] == 0 for c in (1, 2)))
+            wait_until(lambda: not any(active.values()))
+        finally:
+            ingestion.stop()
+
+        assert max(overlaps) == 1
+        for camera_id in (1, 2):
+            frames = [frame for cid, frame in done if cid == camera_id]
+            assert frames == sorted(frames) and frames[-1] == 49
+
+    def test_inline_mode_analyses_synchronously(self):
+        seen = []
+        ingestion = FrameIngestion(lambda camera_id, frame: seen.append((camera_id, frame)), workers=0)
+
+        assert ingestion.submit(3, 'a') is True
+        assert seen == [(3, 'a')]
+        assert ingestion.stats(3) == {'received': 1, 'dropped': 0, 'processed': 1, 'queue_depth': 0}
+
+    def test_discard_clears_camera(self):
+        ingestion = FrameIngestion(lambda camera_id, frame: None, workers=0)
+        ingestion.submit(3, 'a')
+        ingestion.discard(3)
+
+        assert ingestion.stats(3)['received'] == 0
+
+class TestCameraStreamIngestion:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('testing')
+        with app.app_context():
+            db.create_all()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def test_buffered_frame_is_decoded_and_counted(self, app):
+        user = User(username='streamer', email='stream@example.com')
+        user.set_password('Test@123456')
+        db.session.add(user)
+        db.session.flush()
+        camera = Camera(user_id=user.id, name='Phone')
+        db.session.add(camera)
+        db.session.commit()
+
+        buffer = io.BytesIO()
+        Image.fromarray(np.zeros((16, 16, 3), dtype=np.uint8)).save(buffer, format='JPEG')
+        frame = 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+        CameraStreamManager.register_camera_stream(camera.id, user.id)
+        try:
+            get_frame_ingestion().submit(camera.id, frame)
+
+            stream = CameraStreamManager.get_active_streams(user.id)[0]
+            assert stream['frame_count'] == 1
+            assert stream['ingestion']['received'] == 1
+        finally:
+            CameraStreamManager.unregister_camera_stream(camera.id)
+        assert get_frame_ingestion().stats(camera.id)['received'] == 0
@@ -0,0 +1,168 @@
+import pytest
+import cv2
+import numpy as np
+from unittest.mock import patch
+from app.services.camera_stream_manager import CameraStreamManager
+from app.services.frame_relay import FrameRelay, get_frame_relay
+from app.utils.frame_codec import decode_frame
+
+def jpeg(width=1280, height=720):
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    cv2.rectangle(frame, (width // 4, height // 4), (width // 2, height // 2), (40, 200, 90), -1)
+    ok, encoded = cv2.imencode('.jpg', frame)
+    return encoded.tobytes()
+
+class RecordingEmit:
+    """Stands in for socketio.emit; keeps each sent payload and ack callback"""
+
+    def __init__(self):
+        self.sent = []
+
+    def __call__(self, event, data, to, callback=None):
+        self.sent.append((to, data, callback))
+
+    def to(self, sid):
+        return [data for sent_to, data, _ in self.sent if sent_to == sid]
+
+    def ack_all(self):
+        for _, _, callback in self.sent:
+            if callback:
+                callback()
+        self.sent = []
+
+class TestFrameRelay:
+
+    def test_full_quality_passes_frame_through(self):
+        emit = RecordingEmit()
+        relay = FrameRelay(emit=emit)
+        relay.add_viewer(1, 'a')
+        relay.add_viewer(1, 'b')
+        frame = jpeg()
+
+        with patch('app.services.frame_relay.decode_frame') as decode:
+            assert relay.relay(1, frame) == {'full': 2}
+
+        decode.assert_not_called()
+        assert emit.to('a')[0]['frame'] is frame and emit.to('b')[0]['frame'] is frame
+
+    def test_each_tier_is_encoded_once_for_all_viewers(self):
+        emit = RecordingEmit()
+        relay = FrameRelay(emit=emit, sd_width=640, thumb_width=320)
+        for sid in ('sd1', 'sd2', 'sd3'):
+            relay.add_viewer(1, sid, 'sd')
+        relay.add_viewer(1, 'thumb1', 'thumb')
+        relay.add_viewer(1, 'thumb2', 'thumb')
+        frame = jpeg()
+
+        with patch('app.services.frame_relay.cv2.imencode', wraps=cv2.imencode) as encode:
+            assert relay.relay(1, frame) == {'sd': 3, 'thumb': 2}
+
+        assert encode.call_count == 2
+        sd = [data['frame'] for data in emit.to('sd1') + emit.to('sd2') + emit.to('sd3')]
+        assert sd[0] is sd[1] is sd[2]
+        assert emit.to('thumb1')[0]['frame'] is emit.to('thumb2')[0]['frame']
+        assert cv2.imdecode(np.frombuffer(sd[0], np.uint8), cv2.IMREAD_COLOR).shape == (360, 640, 3)
+        thumb = emit.to('thumb1')[0]['frame']
+        assert cv2.imdecode(np.frombuffer(thumb, np.uint8), cv2.IMREAD_COLOR).shape == (180, 320, 3)
+        assert emit.to('thumb1')[0]['quality'] == 'thumb'
+
+    def test_later_frames_decode_at_reduced_scale(self):
+        relay = FrameRelay(emit=RecordingEmit(), thumb_width=320)
+        relay.add_viewer(1, 'a', 'thumb')
+        frame = jpeg(1920, 1080)
+        relay.relay(1, frame)
+
+        with patch('app.services.frame_relay.decode_frame', wraps=decode_frame) as decode:
+            relay.relay(1, frame)
+
+        assert decode.call_args[0][1] == cv2.IMREAD_REDUCED_COLOR_4
+
+    def test_small_source_is_not_reencoded(self):
+        emit = RecordingEmit()
+        relay = FrameRelay(emit=emit, sd_width=640)
+        relay.add_viewer(1, 'a', 'sd')
+        frame = jpeg(320, 240)
+
+        with patch('app.services.frame_relay.cv2.imencode') as encode:
+            relay.relay(1, frame)
+
+        encode.assert_not_called()
+        assert emit.to('a')[0]['frame'] == frame
+
+    def test_slow_viewer_is_skipped_until_it_acknowledges(self):
+        emit = RecordingEmit()
+        relay = FrameRelay(emit=emit, max_in_flight=2)
+        relay.add_viewer(1, 'slow', ack=True)
+        relay.add_viewer(1, 'plain')
+        frame = jpeg(320, 240)
+
+        for _ in range(5):
+            relay.relay(1, frame)
+
+        assert len(emit.to('slow')) == 2
+        assert len(emit.to('plain')) == 5
+        assert relay.stats(1)['tiers']['full']['frames_skipped'] == 3
+
+        emit.ack_all()
+        relay.relay(1, frame)
+        assert len(emit.to('slow')) == 1
+
+    def test_unacknowledged_frames_expire(self):
+        emit = RecordingEmit()
+        relay = FrameRelay(emit=emit, max_in_flight=1, ack_timeout=5.0)
+        relay.add_viewer(1, 'lost', ack=True)
+        frame = jpeg(320, 240)
+
+        with patch('app.services.frame_relay.time.monotonic', side_effect=[0.0, 1.0, 6.5]):
+            relay.relay(1, frame)
+            relay.relay(1, frame)
+            relay.relay(1, frame)
+
+        assert len(emit.to('lost')) == 2
+
+    def test_bandwidth_stats(self):
+        relay = FrameRelay(emit=RecordingEmit(), window=10.0)
+        relay.add_viewer(1, 'a')
+        relay.add_viewer(1, 'b')
+        relay.add_viewer(1, 'c', 'thumb')
+        frame = jpeg(320, 240)
+
+        for _ in range(4):
+            relay.relay(1, frame)
+
+        stats = relay.stats(1)
+        assert stats['viewers'] == 3
+        full = stats['tiers']['full']
+        assert full['viewers'] == 2 and full['frames'] == 4 and full['frames_sent'] == 8
+        assert full['bytes_sent'] == 8 * len(frame)
+        assert full['bytes_per_second'] == round(8 * len(frame) / 10.0, 1)
+        assert stats['bytes_per_second'] == pytest.approx(full['bytes_per_second'] + stats['tiers']['thumb']['bytes_per_second'])
+
+    def test_removed_viewers_get_nothing(self):
+        emit = RecordingEmit()
+        relay = FrameRelay(emit=emit)
+        relay.add_viewer(1, 'a')
+        relay.add_viewer(2, 'a', 'sd')
+
+        relay.remove_viewer('a', 1)
+        assert relay.viewers(1) == 0 and relay.viewers(2) == 1
+        relay.remove_viewer('a')
+
+        assert relay.relay(2, jpeg()) == {}
+        assert emit.sent == []
+
+    def test_unknown_quality(self):
+        with pytest.raises(ValueError):
+            FrameRelay(emit=RecordingEmit()).add_viewer(1, 'a', 'hd')
+
+    def test_active_streams_include_relay_stats(self):
+        relay = get_frame_relay()
+        relay.add_viewer(77, 'viewer-sid', 'sd')
+        CameraStreamManager.register_camera_stream(77, user_id=5)
+        try:
+            stream = CameraStreamManager.get_active_streams(user_id=5)[0]
+            assert stream['relay']['viewers'] == 1
+            assert stream['relay']['tiers']['sd']['frames_sent'] == 0
+        finally:
+            CameraStreamManager.active_streams.pop(77, None)
+            relay.remove_viewer('viewer-sid')
@@ -0,0 +1,156 @@
+import pytest
+from app import create_app, db
+from app.models import User, Camera
+from app.services.detection_roi import invalidate_camera_settings
+from app.services.frame_sampler import (
+    MODE_ACTIVE, MODE_IDLE, MODE_NORMAL, FrameSampler, get_frame_sampler, validate_sampling_setting
+)
+
+def decisions(sampler, camera_id, count, start=0.0, step=0.1):
+    return [sampler.should_analyze(camera_id, now=start + i * step) for i in range(count)]
+
+class TestFrameSampler:
+
+    def test_every_nth_frame(self):
+        sampler = FrameSampler(frame_skip=3, idle_after=0)
+
+        assert decisions(sampler, 1, 7) == [True, False, False, True, False, False, True]
+        assert sampler.stats(1) == {
+            'received': 7, 'analysed': 3, 'skipped': 4, 'analysed_ratio': 0.429, 'mode': MODE_NORMAL
+        }
+
+    def test_motion_raises_rate_while_active(self):
+        sampler = FrameSampler(frame_skip=4, active_frame_skip=1, active_hold=1.0, idle_after=0)
+        sampler.should_analyze(1, now=0.0)
+
+        sampler.report(1, motion=True, now=0.0)
+
+        assert decisions(sampler, 1, 5, start=0.1) == [True] * 5
+        assert sampler.stats(1)['mode'] == MODE_ACTIVE
+        # After the hold period it falls back to every 4th frame
+        assert decisions(sampler, 1, 8, start=2.0) == [False, False, False, True, False, False, False, True]
+
+    def test_face_tracks_count_as_activity(self):
+        sampler = FrameSampler(frame_skip=5, active_frame_skip=2, idle_after=0)
+        sampler.should_analyze(1, now=0.0)
+
+        sampler.report(1, tracking=True, now=0.0)
+
+        assert decisions(sampler, 1, 4, start=0.1) == [False, True, False, True]
+
+    def test_idle_scene_drops_to_heartbeat(self):
+        sampler = FrameSampler(frame_skip=2, idle_interval=1.0, idle_after=5.0)
+        decisions(sampler, 1, 60, step=0.1)
+
+        # 10 fps for 3 more seconds while idle: one frame a second
+        idle = decisions(sampler, 1, 30, start=6.0, step=0.1)
+
+        assert sum(idle) == 3
+        assert sampler.stats(1)['mode'] == MODE_IDLE
+
+    def test_heartbeat_motion_wakes_camera(self):
+        sampler = FrameSampler(frame_skip=2, idle_interval=1.0, idle_after=5.0, active_hold=2.0)
+        sampler.should_analyze(1, now=0.0)
+        assert sampler.should_analyze(1, now=10.0) == True
+
+        sampler.report(1, motion=True, now=10.0)
+
+        assert decisions(sampler, 1, 3, start=10.1) == [True, True, True]
+
+    def test_quiet_reports_do_not_raise_rate(self):
+        sampler = FrameSampler(frame_skip=2, idle_after=0)
+        sampler.should_analyze(1, now=0.0)
+
+        sampler.report(1, motion=False, tracking=False, now=0.0)
+
+        assert decisions(sampler, 1, 2, start=0.1) == [False, True]
+
+    def test_per_camera_overrides(self):
+        overrides = {1: {'frame_skip': 3, 'active_frame_skip': None}, 2: {}}
+        sampler = FrameSampler(frame_skip=2, idle_after=0, camera_settings=overrides.get)
+
+        assert decisions(sampler, 1, 4) == [True, False, False, True]
+        assert decisions(sampler, 2, 4) == [True, False, True, False]
+
+    def test_cameras_are_counted_separately(self):
+        sampler = FrameSampler(frame_skip=2, idle_after=0)
+        decisions(sampler, 1, 4)
+        decisions(sampler, 2, 1)
+
+        sampler.clear_camera(1)
+
+        assert sampler.stats(1)['received'] == 0
+        assert sampler.stats(2)['received'] == 1
+
+    def test_validate_setting(self):
+        assert validate_sampling_setting('frame_skip', 3) == 3
+        assert validate_sampling_setting('frame_skip', None) is None
+        assert validate_sampling_setting('idle_frame_interval', '2.5') == 2.5
+        with pytest.raises(ValueError):
+            validate_sampling_setting('active_frame_skip', 0)
+        with pytest.raises(ValueError):
+            validate_sampling_setting('frame_skip', 1.5)
+        with pytest.raises(ValueError):
+            validate_sampling_setting('idle_frame_interval', -1)
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def auth_client(app):
+    client = app.test_client()
+    user = User(username='sampler', email='sampler@example.com')
+    user.set_password('Test@123456')
+    user.is_verified = True
+    db.session.add(user)
+    db.session.commit()
+    client.post('/auth/login', data={'email': 'sampler@example.com', 'password': 'Test@123456'})
+    return client
+
+@pytest.fixture
+def camera_id(auth_client):
+    user = User.query.filter_by(email='sampler@example.com').first()
+    camera = Camera(user_id=user.id, name='Hall', motion_enabled=True,
+                    object_detection_enabled=False, face_detection_enabled=False)
+    db.session.add(camera)
+    db.session.commit()
+    invalidate_camera_settings(camera.id)
+    get_frame_sampler().clear_camera(camera.id)
+    return camera.id
+
+def jpeg_frame():
+    import cv2
+    import numpy as np
+    ok, encoded = cv2.imencode('.jpg', np.full((48, 64, 3), 128, dtype=np.uint8))
+    return encoded.tobytes()
+
+class TestSamplingRoutes:
+
+    def test_camera_frame_skip_applies_to_process_frame(self, auth_client, camera_id):
+        response = auth_client.put(f'/camera/{camera_id}/update', json={'frame_skip': 3})
+        assert response.get_json()['success'] == True
+
+        skipped = []
+        for _ in range(6):
+            response = auth_client.post(f'/camera/{camera_id}/process-frame',
+                data=jpeg_frame(),
+                content_type='application/octet-stream'
+            )
+            assert response.status_code == 200
+            skipped.append(response.get_json().get('skipped', False))
+
+        assert skipped == [False, True, True, False, True, True]
+        stats = auth_client.get(f'/camera/{camera_id}/stats').get_json()['stats']['sampling']
+        assert stats['received'] == 6 and stats['analysed'] == 2
+
+    def test_invalid_sampling_setting(self, auth_client, camera_id):
+        response = auth_client.put(f'/camera/{camera_id}/update', json={'active_frame_skip': 0})
+
+        assert response.status_code == 400
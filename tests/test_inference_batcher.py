@@ -0,0 +1,151 @@
+import threading
+import time
+import numpy as np
+import pytest
+from app.services.detector_backends import YoloBackend
+from app.services.inference_batcher import BatcherStopped, InferenceBatcher
+from app.services.ml_service import MLService
+from app.services.model_registry import ModelRegistry, YOLO
+
+class FakeYolo(YoloBackend):
+    """YOLO backend without a network: one detection per image, its class set by the image brightness"""
+
+    def __init__(self):
+        super().__init__('fake-yolo', 'fake.weights')
+        self.batch_sizes = []
+
+    def forward(self, blob):
+        self.batch_sizes.append(len(blob))
+        rows = np.zeros((len(blob), 3, 85), dtype=np.float32)
+        for i, image in enumerate(blob):
+            rows[i, 0, :4] = [0.5, 0.5, 0.2, 0.2]
+            rows[i, 0, 5 + int(round(image.mean() * 10))] = 0.9
+        return [rows.reshape(-1, 85)]
+
+def frame_of(value):
+    return np.full((120, 160, 3), value, dtype=np.uint8)
+
+@pytest.fixture
+def fake_yolo(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    yolo = FakeYolo()
+    registry.register(YOLO, lambda: (yolo, 0))
+    return registry, yolo
+
+class TestInferenceBatcher:
+
+    def test_concurrent_items_share_batches(self):
+        batches = []
+
+        def run_batch(items):
+            batches.append(len(items))
+            return [item * 2 for item in items]
+
+        batcher = InferenceBatcher(run_batch, max_batch=4, max_wait=0.1)
+        futures = [batcher.submit(i) for i in range(8)]
+
+        assert [future.result(timeout=2) for future in futures] == [i * 2 for i in range(8)]
+        assert max(batches) == 4 and sum(batches) == 8
+        assert batcher.stats()['items'] == 8
+        batcher.stop()
+
+    def test_lone_item_waits_at_most_max_wait(self):
+        batcher = InferenceBatcher(lambda items: items, max_batch=8, max_wait=0.02)
+
+        start = time.monotonic()
+        assert batcher.submit('frame').result(timeout=2) == 'frame'
+        assert time.monotonic() - start < 0.5
+        batcher.stop()
+
+    def test_failures_reach_every_caller(self):
+        def run_batch(items):
+            raise RuntimeError('forward failed')
+
+        batcher = InferenceBatcher(run_batch, max_batch=2, max_wait=0.05)
+        futures = [batcher.submit(i) for i in range(2)]
+
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result(timeout=2)
+        batcher.stop()
+
+    def test_stop_fails_queued_items(self):
+        started, release = threading.Event(), threading.Event()
+
+        def run_batch(items):
+            started.set()
+            release.wait(2)
+            return items
+
+        batcher = InferenceBatcher(run_batch, max_batch=1, max_wait=0)
+        running = batcher.submit('running')
+        started.wait(2)
+        queued = [batcher.submit(i) for i in range(3)]
+
+        stopper = threading.Thread(target=batcher.stop)
+        stopper.start()
+        release.set()
+        stopper.join(2)
+
+        assert running.result(timeout=2) == 'running'
+        for future in queued:
+            with pytest.raises(BatcherStopped):
+                future.result(timeout=2)
+
+class TestBatchedDetection:
+
+    def test_yolo_split_batch(self):
+        flat = np.arange(2 * 3 * 85, dtype=np.float32).reshape(6, 85)
+        stacked = flat.reshape(2, 3, 85)
+
+        for outputs in ([flat], [stacked]):
+            per_image = FakeYolo().split_batch(outputs, 2)
+            assert np.array_equal(per_image[1][0], stacked[1])
+
+    def test_concurrent_callers_get_their_own_detections(self, fake_yolo):
+        registry, yolo = fake_yolo
+        service = MLService(registry, batch_size=4, batch_wait_ms=100)
+        values = [0, 51, 102, 153]
+        results = {}
+
+        def detect(value):
+            results[value] = service.detect_objects(frame_of(value))
+
+        threads = [threading.Thread(target=detect, args=(value,)) for value in values]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        classes = service._get_coco_classes()
+        for value in values:
+            assert results[value][0]['class'] == classes[int(round(value / 255 * 10))]
+        assert max(yolo.batch_sizes) > 1
+        service.batcher_for().stop()
+
+    def test_detect_objects_batch_runs_one_forward(self, fake_yolo):
+        registry, yolo = fake_yolo
+        service = MLService(registry, batch_size=1)
+
+        results = service.detect_objects_batch([frame_of(0), frame_of(255)])
+
+        assert yolo.batch_sizes == [2]
+        assert [r[0]['class'] for r in results] == ['person', 'fire hydrant']
+        assert results[0][0]['bbox'] == [64, 48, 32, 24]
+
+    def test_stalled_batch_falls_back_to_direct_forward(self, fake_yolo):
+        registry, yolo = fake_yolo
+        service = MLService(registry, batch_size=4)
+        batcher = service.batcher_for()
+        batcher.result_timeout = 0.05
+        stalled = threading.Event()
+        batcher.run_batch = lambda items: stalled.wait(2) and []
+
+        start = time.monotonic()
+        results = service.detect_objects(frame_of(0))
+
+        assert time.monotonic() - start < 1
+        assert results[0]['class'] == 'person'
+        assert yolo.batch_sizes == [1]
+        stalled.set()
+        batcher.stop()
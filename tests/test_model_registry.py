@@ -0,0 +1,67 @@
+import threading
+import time
+import numpy as np
+from app.services.ml_service import MLService
+from app.services.model_registry import ModelRegistry, FACE_CASCADE, YOLO
+
+class TestModelRegistry:
+
+    def test_models_load_once(self, tmp_path):
+        registry = ModelRegistry(str(tmp_path))
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return object(), 1024
+
+        registry.register('slow', loader)
+        loaded = []
+        threads = [threading.Thread(target=lambda: loaded.append(registry.get('slow'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert all(model is loaded[0] for model in loaded)
+        stats = registry.stats()['slow']
+        assert stats['loaded'] and stats['memory_bytes'] == 1024 and stats['load_seconds'] >= 0.05
+
+    def test_face_cascade_is_shared(self, tmp_path):
+        registry = ModelRegistry(str(tmp_path))
+
+        assert registry.get(FACE_CASCADE) is registry.get(FACE_CASCADE)
+        assert registry.stats()[FACE_CASCADE]['memory_bytes'] > 0
+
+    def test_missing_yolo_weights(self, tmp_path):
+        registry = ModelRegistry(str(tmp_path))
+
+        assert registry.get(YOLO) is None
+        assert registry.stats()[YOLO]['loaded'] == False
+
+    def test_failed_load_is_reported(self, tmp_path):
+        registry = ModelRegistry(str(tmp_path))
+
+        def broken():
+            raise RuntimeError('corrupt weights')
+
+        registry.register('broken', broken)
+
+        assert registry.get('broken') is None
+        assert registry.stats()['broken']['error'] == 'corrupt weights'
+
+    def test_warm_up(self, tmp_path):
+        registry = ModelRegistry(str(tmp_path))
+
+        stats = registry.warm_up()
+
+        assert stats[FACE_CASCADE]['warmup_seconds'] is not None
+        assert stats[YOLO]['warmup_seconds'] is None
+
+    def test_ml_services_share_registry_models(self, tmp_path):
+        registry = ModelRegistry(str(tmp_path))
+        first, second = MLService(registry), MLService(registry)
+
+        assert first.face_cascade is second.face_cascade
+        assert first.detect_objects(np.zeros((64, 64, 3), dtype=np.uint8)) == []
@@ -0,0 +1,153 @@
+import pytest
+import time
+import cv2
+import numpy as np
+from unittest.mock import patch
+from app.services.camera_service import CameraService
+from app.services.motion_engine import MotionEngine
+
+def scene(width=1280, height=720, brightness=80, box=None):
+    frame = np.full((height, width, 3), brightness, dtype=np.uint8)
+    if box is not None:
+        x, y, w, h = box
+        frame[y:y + h, x:x + w] = 255
+    return frame
+
+def gray(frame):
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+def legacy_motion(previous, frame, threshold=25, min_area=500):
+    """The two-frame differencing CameraService did before the motion engine"""
+    blurred = cv2.GaussianBlur(gray(frame), (21, 21), 0)
+    if previous is None:
+        return blurred, False
+    thresh = cv2.threshold(cv2.absdiff(previous, blurred), threshold, 255, cv2.THRESH_BINARY)[1]
+    thresh = cv2.dilate(thresh, None, iterations=2)
+    contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return blurred, any(cv2.contourArea(contour) > min_area for contour in contours)
+
+class TestMotionEngine:
+
+    def test_first_frame_has_no_motion(self):
+        engine = MotionEngine()
+
+        assert engine.analyze(1, gray(scene())).motion == False
+
+    def test_moving_object_regions_in_full_resolution(self):
+        engine = MotionEngine(frame_width=320)
+        engine.analyze(1, gray(scene()))
+
+        result = engine.analyze(1, gray(scene(box=(800, 200, 160, 160))))
+
+        assert result.motion == True
+        assert len(result.regions) == 1
+        region = result.regions[0]
+        # Dilation grows the mask by a few working-resolution pixels
+        assert 760 <= region['x'] <= 800 and 160 <= region['y'] <= 200
+        assert 160 <= region['width'] <= 220 and 160 <= region['height'] <= 220
+        assert region['area'] > 160 * 160 * 0.8
+
+    def test_small_changes_below_min_area_are_ignored(self):
+        engine = MotionEngine(min_area=500)
+        engine.analyze(1, gray(scene()))
+
+        assert engine.analyze(1, gray(scene(box=(100, 100, 10, 10)))).motion == False
+
+    def test_lighting_switch_resets_background(self):
+        engine = MotionEngine(max_changed_fraction=0.6)
+        engine.analyze(1, gray(scene(brightness=60)))
+
+        result = engine.analyze(1, gray(scene(brightness=160)))
+
+        assert result.reset == True and result.motion == False
+        assert engine.analyze(1, gray(scene(brightness=160))).motion == False
+
+    def test_gradual_lighting_drift_is_absorbed(self):
+        engine = MotionEngine(learning_rate=0.1)
+
+        results = [engine.analyze(1, gray(scene(brightness=60 + i))).motion for i in range(60)]
+
+        assert not any(results)
+
+    def test_mog2_background_model(self):
+        engine = MotionEngine(model='mog2', learning_rate=0.1)
+        for _ in range(10):
+            engine.analyze(1, gray(scene()))
+
+        assert engine.analyze(1, gray(scene(box=(600, 300, 200, 200)))).motion == True
+
+    def test_unknown_model(self):
+        with pytest.raises(ValueError):
+            MotionEngine(model='knn')
+
+    def test_buffers_are_reused(self):
+        engine = MotionEngine()
+        engine.analyze(1, gray(scene()))
+        state = engine._cameras.get(1)
+        buffers = [state.small, state.blurred, state.mask, state.dilated, state.background]
+        pointers = [buffer.ctypes.data for buffer in buffers]
+
+        for i in range(3):
+            engine.analyze(1, gray(scene(box=(100 * i, 100, 120, 120))))
+
+        assert engine._cameras.get(1) is state
+        assert [buffer.ctypes.data for buffer in buffers] == pointers
+
+    def test_resolution_change_rebuilds_model(self):
+        engine = MotionEngine()
+        engine.analyze(1, gray(scene()))
+
+        assert engine.analyze(1, gray(scene(640, 480))).motion == False
+        assert engine._cameras.get(1).shape == (480, 640)
+
+class TestCameraServiceMotion:
+
+    def test_boolean_and_regions_share_one_analysis(self):
+        service = CameraService(MotionEngine())
+        service.detect_motion(1, scene())
+        frame = scene(box=(400, 300, 200, 200))
+
+        with patch('app.services.motion_engine.cv2.accumulateWeighted',
+                   wraps=cv2.accumulateWeighted) as accumulate:
+            motion = service.detect_motion(1, frame)
+            regions = service.get_motion_regions(1, frame)
+
+        assert accumulate.call_count == 1
+        assert motion == True and len(regions) == 1
+
+    def test_cameras_are_independent(self):
+        service = CameraService(MotionEngine())
+        service.detect_motion(1, scene())
+        service.detect_motion(2, scene(box=(400, 300, 200, 200)))
+
+        assert service.detect_motion(1, scene(box=(400, 300, 200, 200))) == True
+        assert service.detect_motion(2, scene(box=(400, 300, 200, 200))) == False
+
+        service.clear_camera_data(1)
+        assert engine_cameras(service) == [2]
+
+    @pytest.mark.slow
+    def test_faster_than_two_frame_differencing_at_1080p(self):
+        frames = [scene(1920, 1080, box=(100 * i, 400, 200, 200)) for i in range(10)]
+        grays = [gray(frame) for frame in frames]
+        engine = MotionEngine()
+
+        start = time.perf_counter()
+        previous = None
+        for _ in range(3):
+            for frame in frames:
+                previous, _ = legacy_motion(previous, frame)
+        legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(3):
+            for frame, frame_gray in zip(frames, grays):
+                engine.analyze(1, frame_gray, source=frame)
+                # Legacy converted to grayscale inside, so count it here too
+                gray(frame)
+        fast = time.perf_counter() - start
+
+        assert fast < legacy
+
+def engine_cameras(service):
+    return service.motion_engine.cameras()
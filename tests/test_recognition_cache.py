@@ -0,0 +1,85 @@
+import pytest
+import numpy as np
+from unittest.mock import patch
+from app.services.recognition_cache import RecognitionCache, face_crop_hash
+
+LOCATION = (8, 56, 56, 8)
+
+@pytest.fixture
+def frame():
+    return np.random.default_rng(0).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+
+@pytest.fixture
+def clock():
+    with patch('app.services.recognition_cache.time.monotonic', return_value=100.0) as monotonic:
+        yield monotonic
+
+class TestFaceCropHash:
+
+    def test_hash_is_stable_under_sensor_noise(self, frame):
+        noisy = np.clip(frame.astype(int) + np.random.default_rng(1).integers(-2, 3, frame.shape), 0, 255)
+        distance = (face_crop_hash(frame, LOCATION) ^ face_crop_hash(noisy.astype(np.uint8), LOCATION)).bit_count()
+        assert distance <= 4
+
+    def test_different_crops_hash_apart(self, frame):
+        other = np.random.default_rng(2).integers(0, 256, frame.shape, dtype=np.uint8)
+        assert (face_crop_hash(frame, LOCATION) ^ face_crop_hash(other, LOCATION)).bit_count() > 10
+
+class TestRecognitionCache:
+
+    def test_hit_returns_copy_of_result(self, clock):
+        cache = RecognitionCache(ttl=2.0)
+        cache.put(1, 0b1010, {'is_known': True, 'person_id': 7}, cost=0.25)
+
+        result = cache.get(1, 0b1010)
+        result['person_id'] = 99
+
+        assert cache.get(1, 0b1010) == {'is_known': True, 'person_id': 7}
+        assert cache.stats()['hits'] == 2
+        assert cache.stats()['saved_seconds'] == 0.5
+
+    def test_near_duplicate_hash_hits(self, clock):
+        cache = RecognitionCache(ttl=2.0, max_distance=2)
+        cache.put(1, 0b1111, {'is_known': False})
+
+        assert cache.get(1, 0b1100) is not None
+        assert cache.get(1, 0b0000) is None
+
+    def test_exact_lookup_ignores_near_duplicates(self, clock):
+        cache = RecognitionCache(ttl=2.0, max_distance=4)
+        cache.put(1, 0b1111, {'is_known': True, 'is_resident': True})
+
+        assert cache.get(1, 0b1011, max_distance=0) is None
+        assert cache.get(1, 0b1111, max_distance=0) == {'is_known': True, 'is_resident': True}
+
+    def test_entries_expire_after_ttl(self, clock):
+        cache = RecognitionCache(ttl=2.0)
+        cache.put(1, 42, {'is_known': False})
+
+        clock.return_value = 102.5
+        assert cache.get(1, 42) is None
+        assert cache.stats() == {'size': 0, 'hits': 0, 'misses': 1, 'hit_rate': 0.0, 'saved_seconds': 0.0}
+
+    def test_least_recently_used_entry_is_evicted(self, clock):
+        cache = RecognitionCache(ttl=2.0, max_size=2, max_distance=0)
+        cache.put(1, 1, {'n': 1})
+        cache.put(1, 2, {'n': 2})
+        cache.get(1, 1)
+        cache.put(1, 3, {'n': 3})
+
+        assert cache.get(1, 2) is None
+        assert cache.get(1, 1) == {'n': 1}
+
+    def test_clear_one_camera(self, clock):
+        cache = RecognitionCache(ttl=2.0)
+        cache.put(1, 5, {'n': 1})
+        cache.put(2, 5, {'n': 2})
+        cache.clear(1)
+
+        assert cache.get(1, 5) is None
+        assert cache.get(2, 5) == {'n': 2}
+
+    def test_zero_ttl_disables_cache(self):
+        cache = RecognitionCache(ttl=0)
+        cache.put(1, 5, {'n': 1})
+        assert cache.get(1, 5) is None
@@ -0,0 +1,202 @@
+import pytest
+import threading
+import time
+import cv2
+import numpy as np
+from app import create_app, db
+from app.models import User, Camera
+from app.services.stream_ingestion import (
+    STATE_RECONNECTING, STATE_STOPPED, STATE_STREAMING, StreamHealthStore, StreamIngestion, StreamWorker,
+    get_stream_ingestion, run_stream_ingestion
+)
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def video(tmp_path):
+    """20-frame MJPEG AVI at 100 fps with a square moving across it"""
+    path = str(tmp_path / 'door.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 100, (160, 120))
+    for i in range(20):
+        frame = np.full((120, 160, 3), 60, dtype=np.uint8)
+        frame[40:80, i * 6:i * 6 + 40] = 230
+        writer.write(frame)
+    writer.release()
+    return path
+
+class FakeCapture:
+    """VideoCapture stand-in delivering a fixed number of frames per connection"""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def isOpened(self):
+        return self.frames is not None
+
+    def set(self, prop, value):
+        return True
+
+    def get(self, prop):
+        return 0
+
+    def grab(self):
+        if not self.frames:
+            return False
+        self.frames -= 1
+        return True
+
+    def retrieve(self):
+        return True, np.zeros((48, 64, 3), dtype=np.uint8)
+
+    def release(self):
+        pass
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+class TestStreamWorker:
+
+    def test_local_file_is_sampled_and_looped(self, video):
+        frames = []
+        worker = StreamWorker(1, video, lambda camera_id, frame: frames.append(frame.shape),
+                              StreamHealthStore(), sample_fps=0)
+        worker.start()
+        try:
+            assert wait_until(lambda: len(frames) >= 30)
+        finally:
+            worker.stop()
+
+        assert frames[0] == (120, 160, 3)
+        assert worker.health['reconnects'] == 0
+        assert worker.health['state'] == STATE_STOPPED
+
+    def test_sample_rate_limits_decoded_frames(self, video):
+        frames = []
+        worker = StreamWorker(1, video, lambda camera_id, frame: frames.append(time.monotonic()),
+                              StreamHealthStore(), sample_fps=10)
+        worker.start()
+        time.sleep(0.55)
+        worker.stop()
+
+        # The file plays at 100 fps; 10 samples/s over ~0.5 s
+        assert 3 <= len(frames) <= 7
+
+    def test_exponential_backoff_while_unreachable(self):
+        opened = []
+
+        def capture_factory(url):
+            opened.append(time.monotonic())
+            return FakeCapture(None)
+
+        health = StreamHealthStore()
+        worker = StreamWorker(1, 'rtsp://camera.invalid/stream', lambda *args: None, health,
+                              backoff_initial=0.02, backoff_max=0.08, capture_factory=capture_factory)
+        worker.start()
+        try:
+            assert wait_until(lambda: len(opened) >= 6)
+        finally:
+            worker.stop()
+
+        gaps = np.diff(opened)
+        assert gaps[0] >= 0.02 and gaps[1] >= 0.04 and gaps[2] >= 0.08
+        assert gaps[4] < 0.2
+        assert worker.health['reconnects'] >= 5
+        assert worker.health['last_error'] == 'Could not open stream'
+
+    def test_reconnects_and_resets_backoff_after_frames(self):
+        connections = iter([FakeCapture(5), FakeCapture(None), FakeCapture(5)] + [FakeCapture(1000000)] * 10)
+        frames = []
+        worker = StreamWorker(1, 'http://camera.invalid/stream.mjpg', lambda camera_id, frame: frames.append(1),
+                              StreamHealthStore(), sample_fps=0, backoff_initial=0.01, backoff_max=1.0,
+                              capture_factory=lambda url: next(connections))
+        worker.start()
+        try:
+            assert wait_until(lambda: len(frames) > 10)
+            assert wait_until(lambda: worker.health['state'] == STATE_STREAMING)
+        finally:
+            worker.stop()
+
+        assert worker.health['reconnects'] == 3
+
+class TestStreamHealthStore:
+
+    def test_falls_back_to_process_without_redis(self):
+        store = StreamHealthStore('redis://127.0.0.1:1/0')
+
+        store.set(3, {'state': STATE_RECONNECTING})
+
+        assert store.get(3) == {'state': STATE_RECONNECTING}
+        store.delete(3)
+        assert store.get(3) is None
+
+class TestStreamIngestion:
+
+    def test_pulled_frames_are_analysed(self, app, video):
+        user = User(username='streamtest', email='stream@example.com')
+        user.set_password('Test@123456')
+        db.session.add(user)
+        db.session.flush()
+        camera = Camera(user_id=user.id, name='Gate', stream_url=video, motion_enabled=True,
+                        object_detection_enabled=False, face_detection_enabled=False)
+        idle = Camera(user_id=user.id, name='Push only')
+        db.session.add_all([camera, idle])
+        db.session.commit()
+        camera_id = camera.id
+
+        ingestion = StreamIngestion(app=app, sample_fps=0, analysis_workers=0)
+        try:
+            ingestion.sync()
+            assert ingestion.cameras() == [camera_id]
+
+            def analysed():
+                db.session.expire_all()
+                return db.session.get(Camera, camera_id).last_detection is not None
+
+            assert wait_until(analysed)
+            assert ingestion.status(camera_id)['frames'] > 0
+
+            camera = db.session.get(Camera, camera_id)
+            camera.is_active = False
+            db.session.commit()
+            ingestion.refresh_camera(camera)
+            assert ingestion.cameras() == []
+        finally:
+            ingestion.stop()
+
+    def test_dedicated_process_picks_up_camera_changes(self, app, video):
+        user = User(username='streamtest', email='stream@example.com')
+        user.set_password('Test@123456')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+        stop = threading.Event()
+        runner = threading.Thread(target=run_stream_ingestion, args=(app, stop, 0.05))
+        runner.start()
+        try:
+            assert wait_until(lambda: get_stream_ingestion() is not None)
+            assert get_stream_ingestion().cameras() == []
+
+            camera = Camera(user_id=user_id, name='Added later', stream_url=video, motion_enabled=False,
+                            object_detection_enabled=False, face_detection_enabled=False)
+            db.session.add(camera)
+            db.session.commit()
+            camera_id = camera.id
+
+            assert wait_until(lambda: get_stream_ingestion().cameras() == [camera_id])
+        finally:
+            stop.set()
+            runner.join(5)
+
+        assert get_stream_ingestion() is None